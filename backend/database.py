@@ -37,6 +37,13 @@ def _migrate_schema():
         cols = {row[1] for row in conn.execute(text("PRAGMA table_info(photos)"))}
         if "duration" not in cols:
             conn.execute(text("ALTER TABLE photos ADD COLUMN duration REAL"))
+        if "fingerprint" not in cols:
+            conn.execute(text("ALTER TABLE photos ADD COLUMN fingerprint TEXT"))
+        if "placeholder" not in cols:
+            conn.execute(text("ALTER TABLE photos ADD COLUMN placeholder TEXT"))
+        conn.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_photos_fingerprint ON photos (fingerprint)"
+        ))
 
 
 def init_db():
@@ -48,6 +55,7 @@ def init_db():
     try:
         from datetime import datetime
         from models.setting import Setting
+        from models.scan_directory import ScanDirectory
 
         supported_ext = ",".join(sorted(SUPPORTED_EXTENSIONS))
         defaults = {
@@ -55,6 +63,12 @@ def init_db():
             "extensions": supported_ext,
             "thumbnail_size": "300",
             "screenshot_folder": "",
+            "scan_workers": "0",
+            "watch_enabled": "0",
+            "thumbnail_pregenerate": "0",
+            "thumbnail_cache_mb": "0",
+            "thumbnail_format": "webp",
+            "decode_memory_mb": "1024",
         }
         for key, value in defaults.items():
             existing = db.query(Setting).filter(Setting.key == key).first()
@@ -65,6 +79,9 @@ def init_db():
                 # so keep the stored value in sync with the supported set.
                 existing.value = supported_ext
                 existing.updated_at = datetime.now().isoformat()
+                # Directories recorded under the old set may hold newly supported
+                # files, so quick rescans must list everything again.
+                db.query(ScanDirectory).delete()
         db.commit()
     finally:
         db.close()
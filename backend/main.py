@@ -47,6 +47,18 @@ if os.path.isdir(frontend_dist):
 @app.on_event("startup")
 def startup():
     init_db()
+    scan.restart_watcher()
+    images.configure_thumbnail_cache()
+    images.configure_decode_budget()
+
+
+@app.on_event("shutdown")
+def shutdown():
+    scan.watcher.stop()
+    images.warmer.stop()
+    images.render_queue.shutdown()
+    images.evictor.stop()
+    images.store.close()
 
 
 if __name__ == "__main__":
@@ -1,5 +1,9 @@
 from models.photo import Photo
 from models.setting import Setting
 from models.favorite_combination import FavoriteCombination
+from models.scan_checkpoint import ScanCheckpoint
+from models.scan_directory import ScanDirectory
+from models.scan_failure import ScanFailure
+from models.scan_report import ScanReport
 
-__all__ = ["Photo", "Setting", "FavoriteCombination"]
+__all__ = ["Photo", "Setting", "FavoriteCombination", "ScanCheckpoint", "ScanDirectory", "ScanFailure", "ScanReport"]
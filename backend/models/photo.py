@@ -20,6 +20,8 @@ class Photo(Base):
     is_favorite = Column(Integer, nullable=False, default=0)
     thumbnail_path = Column(Text, nullable=True)
     scanned_at = Column(Text, nullable=False)
+    fingerprint = Column(Text, nullable=True)  # see services.fingerprint
+    placeholder = Column(Text, nullable=True)  # data: URI; see services.placeholder
 
     __table_args__ = (
         Index("ix_photos_file_path", "file_path"),
@@ -28,4 +30,5 @@ class Photo(Base):
         Index("ix_photos_modified_at", "modified_at"),
         Index("ix_photos_taken_at", "taken_at"),
         Index("ix_photos_file_name", "file_name"),
+        Index("ix_photos_fingerprint", "fingerprint"),
     )
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, Text
+
+from database import Base
+
+
+class ScanCheckpoint(Base):
+    """Progress of the current (or interrupted) scan_folder run; at most one row.
+
+    Directories whose files are all committed are stamped in ScanDirectory
+    with scanned_at == started_at, and the paths seen so far are kept in the
+    scan_seen table, so an interrupted scan can be resumed.
+    """
+
+    __tablename__ = "scan_checkpoint"
+
+    id = Column(Integer, primary_key=True)
+    mode = Column(Text, nullable=False)  # "full" or "quick"
+    target_folders = Column(Text, nullable=True)  # JSON list; NULL for the whole root
+    state = Column(Text, nullable=False)  # "running" or "cancelled"
+    started_at = Column(Text, nullable=False)
+    updated_at = Column(Text, nullable=False)
+    total = Column(Integer, nullable=False, default=0)  # files found by the walk so far
+    processed = Column(Integer, nullable=False, default=0)
+    dirs_done = Column(Integer, nullable=False, default=0)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, Float, Text
+
+from database import Base
+
+
+class ScanDirectory(Base):
+    """Directory listing state recorded by the last scan that walked it.
+
+    Quick rescans skip the files of directories whose mtime and entry count
+    still match, so the index must be cleared whenever photo rows are removed
+    behind the scanner's back (see services.scanner.clear_dir_index).
+    """
+
+    __tablename__ = "scan_directories"
+
+    path = Column(Text, primary_key=True)  # normcase'd, without the \\?\ prefix
+    mtime = Column(Float, nullable=False)
+    entry_count = Column(Integer, nullable=False)
+    scanned_at = Column(Text, nullable=False)
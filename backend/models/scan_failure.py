@@ -0,0 +1,23 @@
+from sqlalchemy import Column, Integer, Text
+
+from database import Base
+
+
+class ScanFailure(Base):
+    """A file the scanner could not read, and when to try it again.
+
+    Entries apply only while the file's modified_at and file_size still match;
+    see services.failures for the backoff schedule.
+    """
+
+    __tablename__ = "scan_failures"
+
+    file_path = Column(Text, primary_key=True)  # without the \\?\ prefix
+    modified_at = Column(Text, nullable=False)
+    file_size = Column(Integer, nullable=False)
+    error_class = Column(Text, nullable=False)
+    message = Column(Text, nullable=True)
+    attempts = Column(Integer, nullable=False, default=1)
+    first_failed_at = Column(Text, nullable=False)
+    last_failed_at = Column(Text, nullable=False)
+    retry_after = Column(Text, nullable=False)
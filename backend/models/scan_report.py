@@ -0,0 +1,22 @@
+from sqlalchemy import Column, Integer, Text
+
+from database import Base
+
+
+class ScanReport(Base):
+    """Summary and per-stage timings of a finished scan (see services.scan_stats)."""
+
+    __tablename__ = "scan_reports"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    mode = Column(Text, nullable=False)  # "full", "quick" or "partial"
+    started_at = Column(Text, nullable=False)
+    finished_at = Column(Text, nullable=False)
+    total = Column(Integer, nullable=False, default=0)
+    unchanged = Column(Integer, nullable=False, default=0)
+    written = Column(Integer, nullable=False, default=0)
+    moved = Column(Integer, nullable=False, default=0)
+    skipped = Column(Integer, nullable=False, default=0)
+    removed = Column(Integer, nullable=False, default=0)
+    error = Column(Text, nullable=True)
+    stats = Column(Text, nullable=False)  # JSON: ScanStats.snapshot()
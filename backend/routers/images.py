@@ -1,33 +1,122 @@
+import asyncio
 import os
+import secrets
+import stat
 import subprocess
 import sys
+from concurrent.futures import Future
+from email.utils import formatdate, parsedate_to_datetime
+from functools import partial
+from typing import Callable, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse, Response
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
 from config import is_video_extension
-from database import get_db
+from database import get_db, SessionLocal
 from models.photo import Photo
 from models.setting import Setting
-from services.thumbnail import generate_thumbnail
-from services.video import generate_video_thumbnail
+from schemas.setting import SettingsResponse
+from services.decode_budget import decode_budget
+from services.placeholder import placeholder_from_thumbnail, save_placeholders
+from services.render_queue import PRIORITIES, PRIORITY_HEADER, PRIORITY_VISIBLE, render_queue
+from services.thumbnail import (
+    FORMATS, PYRAMID_SIZES, display_etag, display_level, generate_display, generate_rendition,
+    generate_thumbnail, load_display, load_rendition, load_thumbnail, negotiate_format,
+    preferred_format, pyramid_level, source_token, source_version, thumbnail_etag,
+)
+from services.thumbnail_warmer import interactive_request, warm_format, warm_status, warmer
+from services.thumbstore import evictor, store
+from services.video import generate_video_rendition, generate_video_thumbnail
 from services.pathutil import long_path
 
 router = APIRouter()
 
+# For URLs whose ``v`` matches the current version: their content never changes.
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+
+# How often a request waiting on a queued render checks for a disconnect.
+DISCONNECT_POLL_SECONDS = 0.25
+# Logged for requests abandoned by the client (nginx's convention); never seen by it.
+CLIENT_CLOSED_REQUEST = 499
+
+# Most photos one batch thumbnail request may name (a grid page is up to 200);
+# also keeps the URL within request-line limits.
+MAX_BATCH_THUMBNAILS = 200
+
+
+def _not_modified(request: Request, etag: str, mtime: Optional[float] = None) -> bool:
+    """Evaluate If-None-Match (or, without it, If-Modified-Since) against the current validators."""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or etag in tags
+    since = request.headers.get("if-modified-since")
+    if since and mtime is not None:
+        try:
+            return int(mtime) <= parsedate_to_datetime(since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def _megabytes_setting(key: str) -> int:
+    """A ``*_mb`` setting in bytes; its default if unset or not a whole number."""
+    db = SessionLocal()
+    try:
+        setting = db.query(Setting).filter(Setting.key == key).first()
+    finally:
+        db.close()
+    value = setting.value.strip() if setting else ""
+    if not value.isdigit():
+        value = SettingsResponse.model_fields[key].default
+    return int(value) * 1024 * 1024
+
+
+def configure_thumbnail_cache():
+    """Apply the thumbnail_cache_mb disk budget (0 = unlimited) and start the evictor."""
+    store.budget_bytes = _megabytes_setting("thumbnail_cache_mb")
+    evictor.start()
+    store.over_budget.set()
+
+
+def configure_decode_budget():
+    """Apply the decode_memory_mb limit on pixel memory in flight (0 = unlimited)."""
+    decode_budget.limit_bytes = _megabytes_setting("decode_memory_mb")
+
 
 @router.get("/images/{photo_id}/full")
-def get_full_image(photo_id: int, db: Session = Depends(get_db)):
+def get_full_image(photo_id: int, request: Request, v: Optional[str] = None,
+                   db: Session = Depends(get_db)):
+    """Serve the original file.
+
+    Validated by an ETag and Last-Modified from the file's mtime and size;
+    cached as immutable when ``v`` matches the photo's recorded modified_at.
+    """
     photo = db.query(Photo).filter(Photo.id == photo_id).first()
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
 
     fpath = long_path(photo.file_path)
-    if not os.path.isfile(fpath):
+    try:
+        st = os.stat(fpath)
+    except OSError:
+        st = None
+    if st is None or not stat.S_ISREG(st.st_mode):
         raise HTTPException(status_code=404, detail="Image file not found on disk")
 
+    etag = f'"{st.st_mtime_ns:x}-{st.st_size:x}"'
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE if v and v == photo.modified_at else "no-cache",
+        "ETag": etag,
+        "Last-Modified": formatdate(st.st_mtime, usegmt=True),
+    }
+    if _not_modified(request, etag, st.st_mtime):
+        return Response(status_code=304, headers=headers)
+
     media_type_map = {
         "jpg": "image/jpeg",
         "jpeg": "image/jpeg",
@@ -49,44 +138,294 @@ def get_full_image(photo_id: int, db: Session = Depends(get_db)):
     return FileResponse(
         fpath,
         media_type=media_type,
-        headers={"Cache-Control": "no-cache"},
+        headers=headers,
+        stat_result=st,
     )
 
 
+def _lookup_photo(photo_id: int) -> tuple[Optional[Photo], int, str]:
+    """The photo, the thumbnail_size setting and the preferred rendition format."""
+    db = SessionLocal()
+    try:
+        photo = db.query(Photo).filter(Photo.id == photo_id).first()
+        settings = dict(db.query(Setting.key, Setting.value).filter(
+            Setting.key.in_(("thumbnail_size", "thumbnail_format"))
+        ).all())
+        max_size = int(settings.get("thumbnail_size", 300))
+        return photo, max_size, preferred_format(settings.get("thumbnail_format"))
+    finally:
+        db.close()
+
+
+def _cached_thumbnail(fpath: str, photo_id: int, source: str, size: Optional[int],
+                      max_size: int, fmt: str) -> Optional[bytes]:
+    if not os.path.isfile(fpath):
+        raise HTTPException(status_code=404, detail="Image file not found on disk")
+    if size is not None:
+        return load_rendition(photo_id, source, pyramid_level(size), fmt)
+    return load_thumbnail(photo_id, source, max_size)
+
+
+def _save_placeholder(photo_id: int, source: str, fmt: str):
+    """Make the photo's placeholder from the pyramid just rendered for it."""
+    smallest = load_rendition(photo_id, source, PYRAMID_SIZES[0], fmt)
+    placeholder = placeholder_from_thumbnail(smallest) if smallest is not None else None
+    if placeholder is not None:
+        save_placeholders({photo_id: placeholder})
+
+
+def _render_thumbnail(photo: Photo, fpath: str, source: str, size: Optional[int],
+                      max_size: int, fmt: str) -> bytes:
+    video = is_video_extension(photo.extension)
+    if size is not None:
+        if video:
+            data = generate_video_rendition(photo.id, photo.file_path, source, size, fmt=fmt)
+        else:
+            data = generate_rendition(photo.id, fpath, source, size, fmt)
+        if data and photo.placeholder is None:
+            _save_placeholder(photo.id, source, fmt)
+    elif video:
+        # Poster frame via ffmpeg (uses the clean path; ffmpeg dislikes \\?\ prefixes).
+        data = generate_video_thumbnail(photo.id, photo.file_path, source, max_size)
+    else:
+        return generate_thumbnail(photo.id, fpath, source, max_size)
+    if video and not data:
+        # No poster frame (no ffmpeg, or an unreadable clip): nothing to show.
+        raise HTTPException(status_code=404, detail="No thumbnail for this video")
+    return data
+
+
+async def _await_render(request: Request, future: Future) -> Optional[bytes]:
+    """Wait for a queued render; None (with the job cancelled if it hasn't
+    started) once the client has disconnected."""
+    waiter = asyncio.wrap_future(future)
+    while True:
+        done, _ = await asyncio.wait({waiter}, timeout=DISCONNECT_POLL_SECONDS)
+        if done:
+            return waiter.result()
+        if await request.is_disconnected():
+            future.cancel()
+            return None
+
+
+async def _serve_rendition(request: Request, probe: Callable[[], Optional[bytes]],
+                           render: Callable[[], bytes], priority: str, headers: dict,
+                           media_type: str, what: str) -> Response:
+    """Serve ``probe()``'s cached bytes, or else ``render()`` on the render queue."""
+    data = await run_in_threadpool(probe)
+    if data is None:
+        # Background pre-generation holds back while the user is waiting on this.
+        with interactive_request():
+            future = render_queue.submit(render, priority=PRIORITIES.get(priority, PRIORITY_VISIBLE))
+            data = await _await_render(request, future)
+        if data is None:
+            return Response(status_code=CLIENT_CLOSED_REQUEST)
+    if not data:
+        raise HTTPException(status_code=500, detail=f"Failed to generate {what}")
+    return Response(data, media_type=media_type, headers=headers)
+
+
 @router.get("/images/{photo_id}/thumbnail")
-def get_thumbnail(photo_id: int, db: Session = Depends(get_db)):
-    photo = db.query(Photo).filter(Photo.id == photo_id).first()
+async def get_thumbnail(photo_id: int, request: Request, size: Optional[int] = Query(None, ge=1),
+                        v: Optional[str] = None):
+    """Serve a cached thumbnail.
+
+    With ``size``, the smallest rendition whose longest edge is at least
+    ``size`` pixels (see thumbnail.PYRAMID_SIZES); without it, the
+    ``thumbnail_size`` setting's thumbnail. A rendition URL whose ``v`` is the
+    photo's current source_token() is cached as immutable; anything else is
+    revalidated against the ETag.
+
+    Renditions are encoded in the thumbnail_format setting's format when the
+    Accept header names it (else a fallback, down to JPEG); the legacy
+    thumbnail is always JPEG. Misses are rendered on the render queue,
+    ``visible`` requests ahead of ones sent with an X-Render-Priority:
+    prefetch header; a queued render is dropped if the client disconnects.
+    """
+    photo, max_size, preferred = await run_in_threadpool(_lookup_photo, photo_id)
     if not photo:
         raise HTTPException(status_code=404, detail="Photo not found")
+    source = source_version(photo.modified_at, photo.file_size)
+    fmt = negotiate_format(request.headers.get("accept"), preferred) if size is not None else "jpeg"
+
+    etag = thumbnail_etag(photo.id, source, size, max_size, fmt)
+    # Without size the content also depends on the thumbnail_size setting,
+    # which v doesn't cover.
+    immutable = size is not None and v == source_token(source)
+    headers = {"Cache-Control": IMMUTABLE_CACHE if immutable else "no-cache", "ETag": etag}
+    if size is not None:
+        headers["Vary"] = "Accept"
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
 
     fpath = long_path(photo.file_path)
+    return await _serve_rendition(
+        request,
+        partial(_cached_thumbnail, fpath, photo.id, source, size, max_size, fmt),
+        partial(_render_thumbnail, photo, fpath, source, size, max_size, fmt),
+        request.headers.get(PRIORITY_HEADER, "visible"), headers, FORMATS[fmt][2], "thumbnail",
+    )
+
+
+def _cached_display(fpath: str, photo_id: int, source: str, level: int,
+                    fmt: str) -> Optional[bytes]:
     if not os.path.isfile(fpath):
         raise HTTPException(status_code=404, detail="Image file not found on disk")
+    return load_display(photo_id, source, level, fmt)
 
-    # Get thumbnail size setting
-    setting = db.query(Setting).filter(Setting.key == "thumbnail_size").first()
-    max_size = int(setting.value) if setting else 300
 
+@router.get("/images/{photo_id}/display")
+async def get_display(photo_id: int, request: Request, w: int = Query(1920, ge=1),
+                      h: int = Query(1080, ge=1), v: Optional[str] = None):
+    """Serve the photo sized for a ``w`` x ``h`` device-pixel screen and
+    turned upright, for the viewer (``/full`` stays the original, for zoom).
+
+    Renditions come in the fixed thumbnail.DISPLAY_SIZES, so nearby screen
+    sizes share a cache entry. Format negotiation, caching headers and
+    queueing are as for thumbnail renditions.
+    """
+    photo, _, preferred = await run_in_threadpool(_lookup_photo, photo_id)
+    if not photo:
+        raise HTTPException(status_code=404, detail="Photo not found")
     if is_video_extension(photo.extension):
-        # Poster frame via ffmpeg (uses the clean path; ffmpeg dislikes \\?\ prefixes).
-        thumb_path = generate_video_thumbnail(photo.id, photo.file_path, max_size)
-    else:
-        thumb_path = generate_thumbnail(photo.id, fpath, max_size)
-    if not thumb_path or not os.path.isfile(thumb_path):
-        raise HTTPException(status_code=500, detail="Failed to generate thumbnail")
+        raise HTTPException(status_code=400, detail="Display images are only available for photos")
+    source = source_version(photo.modified_at, photo.file_size)
+    level = display_level(w, h)
+    fmt = negotiate_format(request.headers.get("accept"), preferred)
 
-    # Update photo thumbnail_path if not set
-    if not photo.thumbnail_path:
-        photo.thumbnail_path = thumb_path
-        db.commit()
+    etag = display_etag(photo.id, source, level, fmt)
+    headers = {
+        "Cache-Control": IMMUTABLE_CACHE if v == source_token(source) else "no-cache",
+        "ETag": etag,
+        "Vary": "Accept",
+    }
+    if _not_modified(request, etag):
+        return Response(status_code=304, headers=headers)
 
-    return FileResponse(
-        thumb_path,
-        media_type="image/jpeg",
-        headers={"Cache-Control": "no-cache"},
+    fpath = long_path(photo.file_path)
+    return await _serve_rendition(
+        request,
+        partial(_cached_display, fpath, photo.id, source, level, fmt),
+        partial(generate_display, photo.id, fpath, source, level, fmt),
+        request.headers.get(PRIORITY_HEADER, "visible"), headers, FORMATS[fmt][2], "display image",
     )
 
 
+def _batch_thumbnails(versions: dict[int, str], size: int,
+                      accept: Optional[str]) -> tuple[list[tuple[int, bytes]], str, bool]:
+    """(id, rendition) for each photo in ``versions`` whose rendition serving
+    ``size`` is cached, the negotiated format, and whether every photo exists
+    with the given source_token()."""
+    db = SessionLocal()
+    try:
+        rows = db.query(Photo.id, Photo.modified_at, Photo.file_size).filter(
+            Photo.id.in_(versions)
+        ).all()
+        fmt = negotiate_format(accept, warm_format(db))
+    finally:
+        db.close()
+    level = pyramid_level(size)
+    parts = []
+    current = len(rows) == len(versions)
+    for pid, modified_at, file_size in rows:
+        source = source_version(modified_at, file_size)
+        current = current and versions[pid] == source_token(source)
+        data = load_rendition(pid, source, level, fmt)
+        if data is not None:
+            parts.append((pid, data))
+    return parts, fmt, current
+
+
+def _parse_batch_items(items: str) -> dict[int, str]:
+    """{id: v} from ``id:v,id:v,...``."""
+    versions = {}
+    for item in filter(None, items.split(",")):
+        pid, _, v = item.partition(":")
+        if not pid.isdigit():
+            raise HTTPException(status_code=400, detail=f"Invalid batch item: {item}")
+        versions[int(pid)] = v
+    return versions
+
+
+@router.get("/thumbnails/batch")
+async def get_thumbnail_batch(request: Request, items: str = Query(..., min_length=1),
+                              size: int = Query(..., ge=1)):
+    """Cached thumbnail renditions for a page of photos in one response.
+
+    ``items`` lists the photos as ``id:v`` pairs, ``v`` being the version
+    token from the photo's thumbnail_url. The body is multipart/form-data
+    (which browsers parse with Response.formData()): one part per photo,
+    named by its id, holding the rendition ``/images/{id}/thumbnail?size=``
+    would serve, in the format negotiated from the Accept header. Photos
+    whose rendition isn't cached (or that don't exist) are left out, and the
+    client fetches those one by one. Nothing is rendered and originals
+    aren't checked on disk.
+
+    Like a versioned thumbnail URL, the response is cached as immutable when
+    every ``v`` is current and every photo was included; the URL then names
+    exactly the bytes it returns. Otherwise it isn't stored, so a later
+    request picks up renditions rendered in the meantime.
+    """
+    versions = _parse_batch_items(items)
+    if len(versions) > MAX_BATCH_THUMBNAILS:
+        raise HTTPException(status_code=400,
+                            detail=f"At most {MAX_BATCH_THUMBNAILS} photos per batch")
+    parts, fmt, current = await run_in_threadpool(
+        _batch_thumbnails, versions, size, request.headers.get("accept"))
+
+    boundary = secrets.token_hex(16)
+    ext, media_type = fmt.replace("jpeg", "jpg"), FORMATS[fmt][2]
+    chunks = []
+    for pid, data in parts:
+        chunks += [
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{pid}"; '
+            f'filename="{pid}.{ext}"\r\nContent-Type: {media_type}\r\n\r\n'.encode("ascii"),
+            data, b"\r\n",
+        ]
+    chunks.append(f"--{boundary}--\r\n".encode("ascii"))
+    immutable = current and len(parts) == len(versions)
+    headers = {"Cache-Control": IMMUTABLE_CACHE if immutable else "no-store", "Vary": "Accept"}
+    return Response(b"".join(chunks), media_type=f"multipart/form-data; boundary={boundary}",
+                    headers=headers)
+
+
+@router.get("/thumbnails/warm-status")
+def get_warm_status():
+    return warm_status
+
+
+@router.post("/thumbnails/warm")
+def start_warm():
+    """Pre-generate every missing thumbnail in the background."""
+    if not warmer.start():
+        return {"message": "Thumbnail pre-generation already in progress"}
+    return {"message": "Thumbnail pre-generation started"}
+
+
+@router.post("/thumbnails/warm/cancel")
+def cancel_warm():
+    warmer.stop()
+    return {"message": "Thumbnail pre-generation stopped"}
+
+
+@router.get("/thumbnails/store")
+def get_store_stats():
+    """Cache size, budget, hit rate and eviction counters."""
+    return store.stats()
+
+
+@router.get("/thumbnails/decode-budget")
+def get_decode_budget():
+    """Pixel memory held by in-flight decodes against the decode_memory_mb limit."""
+    return decode_budget.stats()
+
+
+@router.post("/thumbnails/compact")
+def compact_store():
+    """Rewrite mostly-dead pack segments and report the space reclaimed."""
+    return store.compact()
+
+
 @router.post("/images/{photo_id}/reveal")
 def reveal_in_explorer(photo_id: int, db: Session = Depends(get_db)):
     """Open the file's location in the OS file manager, selecting the file."""
@@ -10,13 +10,23 @@ from config import VIDEO_EXTENSIONS
 from database import get_db
 from models.photo import Photo
 from schemas.photo import PhotoResponse, PhotoListResponse, NeighborsResponse
+from services.thumbnail import source_token, source_version
 
 router = APIRouter()
 
 
+def display_url(photo: Optional[Photo]) -> Optional[str]:
+    """Viewer image URL (the client adds w and h); None for videos."""
+    if photo is None or photo.extension.lower() in VIDEO_EXTENSIONS:
+        return None
+    v = source_token(source_version(photo.modified_at, photo.file_size))
+    return f"/api/images/{photo.id}/display?v={v}"
+
+
 def photo_to_response(photo: Photo) -> PhotoResponse:
-    # Use scanned_at as cache buster to avoid stale browser cache after DB reset
-    v = photo.scanned_at or ""
+    # Versioned by the source file (mtime and size): the thumbnail endpoint
+    # lets browsers cache a URL whose v is current forever.
+    v = source_token(source_version(photo.modified_at, photo.file_size))
     return PhotoResponse(
         id=photo.id,
         file_path=photo.file_path,
@@ -31,6 +41,8 @@ def photo_to_response(photo: Photo) -> PhotoResponse:
         taken_at=photo.taken_at,
         is_favorite=bool(photo.is_favorite),
         thumbnail_url=f"/api/images/{photo.id}/thumbnail?v={v}",
+        display_url=display_url(photo),
+        placeholder=photo.placeholder,
     )
 
 
@@ -185,4 +197,6 @@ def get_neighbors(
     return NeighborsResponse(
         prev_id=prev_photo.id if prev_photo else None,
         next_id=next_photo.id if next_photo else None,
+        prev_display_url=display_url(prev_photo),
+        next_display_url=display_url(next_photo),
     )
@@ -1,46 +1,110 @@
 import json
+import logging
 import os
 
-from fastapi import APIRouter, BackgroundTasks, Depends
+from fastapi import APIRouter, BackgroundTasks, Depends, Query
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
 
-from config import SUPPORTED_EXTENSIONS, THUMBNAIL_DIR
+from config import SUPPORTED_EXTENSIONS
 from database import get_db, SessionLocal
 from models.setting import Setting
 from models.photo import Photo
-from services.scanner import scan_folder, scan_status
+from services.failures import clear_failures, list_failures
+from services.scanner import (
+    SCAN_HISTORY_LIMIT, checkpoint_info, clear_dir_index, request_cancel, scan_folder,
+    scan_history, scan_status, status_payload, sync_paths,
+)
+from services.thumbnail import discard_thumbnails
+from services.thumbnail_warmer import warmer
+from services.thumbstore import store
+from services.watcher import FolderWatcher, watch_status
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
 DEFAULT_EXTENSIONS = ",".join(sorted(SUPPORTED_EXTENSIONS))
 
 
-def run_scan():
-    db = SessionLocal()
+def _scan_workers(settings: dict) -> int:
+    """Metadata worker count from settings; 0 (the default) means one per CPU."""
     try:
-        settings = {s.key: s.value for s in db.query(Setting).all()}
-        root_folder = settings.get("root_folder", "")
-        extensions_str = settings.get("extensions", DEFAULT_EXTENSIONS)
-        extensions = {e.strip().lower() for e in extensions_str.split(",") if e.strip()}
-        excluded_str = settings.get("excluded_folders", "[]")
-        excluded_folders = set(json.loads(excluded_str))
+        return int(settings.get("scan_workers", "0") or 0)
+    except ValueError:
+        return 0
+
+
+def _load_scan_settings(db: Session) -> tuple[str, set[str], set[str], int]:
+    """Return (root_folder, extensions, excluded_folders, workers) from settings."""
+    settings = {s.key: s.value for s in db.query(Setting).all()}
+    root_folder = settings.get("root_folder", "")
+    extensions_str = settings.get("extensions", DEFAULT_EXTENSIONS)
+    extensions = {e.strip().lower() for e in extensions_str.split(",") if e.strip()}
+    excluded_str = settings.get("excluded_folders", "[]")
+    excluded_folders = set(json.loads(excluded_str))
+    return root_folder, extensions, excluded_folders, _scan_workers(settings)
+
+
+def _start_thumbnail_warmer(db: Session):
+    """Kick off thumbnail pre-generation after a completed scan, if enabled."""
+    enabled = db.query(Setting).filter(Setting.key == "thumbnail_pregenerate").first()
+    if enabled is None or enabled.value != "1" or scan_status["cancelled"] or scan_status["error"]:
+        return
+    warmer.start()
+
 
+def run_scan(quick: bool = False, resume: bool = False):
+    db = SessionLocal()
+    try:
+        root_folder, extensions, excluded_folders, workers = _load_scan_settings(db)
         if root_folder:
-            scan_folder(root_folder, extensions, db, excluded_folders)
+            scan_folder(root_folder, extensions, db, excluded_folders,
+                        workers=workers, quick=quick, resume=resume)
+            _start_thumbnail_warmer(db)
+        else:
+            scan_status["is_scanning"] = False
     finally:
         db.close()
 
 
 @router.post("/scan")
-def start_scan(background_tasks: BackgroundTasks):
+def start_scan(background_tasks: BackgroundTasks, mode: str = Query("full")):
+    """Start a library scan.
+
+    mode="quick" skips directories whose listing is unchanged since the last
+    scan; mode="full" (default) re-verifies every file's mtime and size.
+    """
     if scan_status["is_scanning"]:
         return {"message": "Scan already in progress"}
     scan_status["is_scanning"] = True
-    background_tasks.add_task(run_scan)
+    background_tasks.add_task(run_scan, mode == "quick")
     return {"message": "Scan started"}
 
 
+@router.post("/scan/resume")
+def resume_scan(background_tasks: BackgroundTasks, db: Session = Depends(get_db)):
+    """Continue an interrupted or cancelled scan from its checkpoint."""
+    if scan_status["is_scanning"]:
+        return {"message": "Scan already in progress"}
+    if checkpoint_info(db) is None:
+        return {"message": "No scan to resume"}
+    scan_status["is_scanning"] = True
+    background_tasks.add_task(run_scan, resume=True)
+    return {"message": "Scan resumed"}
+
+
+@router.post("/scan/cancel")
+def cancel_scan():
+    """Stop the running scan once the files already in flight are committed.
+
+    The scan's checkpoint is kept, so it can be resumed later.
+    """
+    if not request_cancel():
+        return {"message": "No scan in progress"}
+    return {"message": "Cancelling scan"}
+
+
 class PartialScanRequest(BaseModel):
     folders: list[str]
 
@@ -48,15 +112,11 @@ class PartialScanRequest(BaseModel):
 def run_partial_scan(folders: list[str]):
     db = SessionLocal()
     try:
-        settings = {s.key: s.value for s in db.query(Setting).all()}
-        root_folder = settings.get("root_folder", "")
-        extensions_str = settings.get("extensions", DEFAULT_EXTENSIONS)
-        extensions = {e.strip().lower() for e in extensions_str.split(",") if e.strip()}
-        excluded_str = settings.get("excluded_folders", "[]")
-        excluded_folders = set(json.loads(excluded_str))
-
+        root_folder, extensions, excluded_folders, workers = _load_scan_settings(db)
         if root_folder:
-            scan_folder(root_folder, extensions, db, excluded_folders, target_folders=folders)
+            scan_folder(root_folder, extensions, db, excluded_folders,
+                        target_folders=folders, workers=workers)
+            _start_thumbnail_warmer(db)
     finally:
         db.close()
 
@@ -114,16 +174,13 @@ def run_delete(folders: list[str]):
 
         for i in range(0, len(ids), 200):
             chunk = ids[i:i + 200]
-            for pid in chunk:
-                thumb = os.path.join(THUMBNAIL_DIR, f"{pid}.jpg")
-                try:
-                    if os.path.isfile(thumb):
-                        os.remove(thumb)
-                except OSError:
-                    pass
+            discard_thumbnails(chunk)
             db.query(Photo).filter(Photo.id.in_(chunk)).delete(synchronize_session=False)
             db.commit()
             delete_status["processed"] = min(i + 200, len(ids))
+        clear_dir_index(db, folders)
+        db.commit()
+        store.compact()
     except Exception as e:
         delete_status["error"] = str(e)
         try:
@@ -155,5 +212,74 @@ def get_delete_status():
 
 
 @router.get("/scan/status")
-def get_scan_status():
-    return scan_status
+def get_scan_status(db: Session = Depends(get_db)):
+    """Scan progress, per-stage timings of the running (or last) scan, and
+    the interrupted scan that can be resumed, if any."""
+    return status_payload(db)
+
+
+@router.get("/scan/history")
+def get_scan_history(
+    limit: int = Query(SCAN_HISTORY_LIMIT, ge=1, le=SCAN_HISTORY_LIMIT),
+    db: Session = Depends(get_db),
+):
+    """Reports of the most recent scans, newest first."""
+    return scan_history(db, limit)
+
+
+@router.get("/scan/failures")
+def get_scan_failures(
+    limit: int = Query(500, ge=1, le=5000),
+    offset: int = Query(0, ge=0),
+    db: Session = Depends(get_db),
+):
+    """Files the scanner could not read, most recent first, with their retry schedule."""
+    return list_failures(db, limit, offset)
+
+
+@router.delete("/scan/failures")
+def reset_scan_failures(db: Session = Depends(get_db)):
+    """Forget recorded failures so the next scan retries those files immediately."""
+    clear_failures(db)
+    db.commit()
+    return {"message": "Scan failures cleared"}
+
+
+def run_watch_batch(paths: set[str], shallow_dirs: set[str]) -> bool:
+    """Apply one batch of watcher events; False if a scan is running (retry later)."""
+    db = SessionLocal()
+    try:
+        root_folder, extensions, excluded_folders, workers = _load_scan_settings(db)
+        if not root_folder:
+            return True
+        result = sync_paths(db, root_folder, extensions, excluded_folders,
+                            paths, shallow_dirs, workers=workers)
+        if result is None:
+            return False
+        logger.info("Watch batch of %d path(s) applied: %s", len(paths) + len(shallow_dirs), result)
+        return True
+    finally:
+        db.close()
+
+
+watcher = FolderWatcher(run_watch_batch)
+
+
+def restart_watcher():
+    """(Re)start the folder watcher to match the watch_enabled / root_folder settings."""
+    db = SessionLocal()
+    try:
+        root_folder, _, excluded_folders, _ = _load_scan_settings(db)
+        enabled = db.query(Setting).filter(Setting.key == "watch_enabled").first()
+        enabled = enabled is not None and enabled.value == "1"
+    finally:
+        db.close()
+
+    watcher.stop()
+    if enabled and root_folder:
+        watcher.start(root_folder, excluded_folders)
+
+
+@router.get("/scan/watch-status")
+def get_watch_status():
+    return watch_status
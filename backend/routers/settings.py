@@ -1,6 +1,5 @@
 import json
 import os
-import shutil
 from datetime import datetime
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -10,7 +9,13 @@ from database import get_db, Base, engine, SessionLocal, init_db
 from models.setting import Setting
 from models.photo import Photo
 from schemas.setting import SettingsResponse, SettingsUpdate, ExcludedFoldersResponse, ExcludedFoldersUpdate
-from config import THUMBNAIL_DIR
+from services.failures import clear_failures
+from services.scanner import clear_dir_index, discard_checkpoint
+from services.thumbnail import FORMATS
+from services.thumbnail_warmer import warmer
+from services.thumbstore import store
+from routers.scan import restart_watcher
+from routers.images import configure_decode_budget, configure_thumbnail_cache
 
 router = APIRouter()
 
@@ -36,6 +41,15 @@ def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
         if not os.path.isdir(data.screenshot_folder.strip()):
             raise HTTPException(status_code=400, detail="Folder not found")
 
+    if data.thumbnail_format is not None and data.thumbnail_format not in FORMATS:
+        raise HTTPException(status_code=400, detail="Unsupported thumbnail format")
+
+    for key in ("thumbnail_cache_mb", "decode_memory_mb"):
+        value = getattr(data, key)
+        if value is not None and not value.strip().isdigit():
+            raise HTTPException(status_code=400,
+                                detail=f"{key} must be a whole number of megabytes (0 = unlimited)")
+
     now = datetime.now().isoformat()
 
     # Clear excluded folders when root_folder changes
@@ -46,6 +60,8 @@ def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
             if ef:
                 ef.value = "[]"
                 ef.updated_at = now
+            # An interrupted scan of the old root can't be resumed against the new one.
+            discard_checkpoint(db)
 
     update_data = data.model_dump(exclude_none=True)
     for key, value in update_data.items():
@@ -56,26 +72,32 @@ def update_settings(data: SettingsUpdate, db: Session = Depends(get_db)):
         else:
             db.add(Setting(key=key, value=value, updated_at=now))
     db.commit()
+    if "watch_enabled" in update_data or "root_folder" in update_data:
+        restart_watcher()
+    if "thumbnail_cache_mb" in update_data:
+        configure_thumbnail_cache()
+    if "decode_memory_mb" in update_data:
+        configure_decode_budget()
     d = get_settings_dict(db)
     return SettingsResponse(**d)
 
 
 @router.post("/settings/clear-cache")
 def clear_cache():
-    if os.path.isdir(THUMBNAIL_DIR):
-        shutil.rmtree(THUMBNAIL_DIR)
-        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    store.clear()
     return {"message": "Thumbnail cache cleared"}
 
 
 @router.post("/settings/reset-db")
 def reset_db(db: Session = Depends(get_db)):
     """Delete all photo records and thumbnail cache, preserving settings."""
-    if os.path.isdir(THUMBNAIL_DIR):
-        shutil.rmtree(THUMBNAIL_DIR)
-        os.makedirs(THUMBNAIL_DIR, exist_ok=True)
+    warmer.stop()
+    store.clear()
 
     db.query(Photo).delete()
+    clear_dir_index(db)
+    clear_failures(db)
+    discard_checkpoint(db)
     db.commit()
     return {"message": "Database reset complete"}
 
@@ -131,6 +153,8 @@ def update_excluded_folders(data: ExcludedFoldersUpdate, db: Session = Depends(g
         norm_folder = os.path.normpath(folder)
         prefix = norm_folder + os.sep
         db.query(Photo).filter(Photo.file_path.like(prefix + "%")).delete(synchronize_session=False)
+    clear_dir_index(db, excluded)
     db.commit()
+    restart_watcher()
 
     return ExcludedFoldersResponse(excluded_folders=excluded)
@@ -16,6 +16,8 @@ class PhotoResponse(BaseModel):
     taken_at: Optional[str] = None
     is_favorite: bool
     thumbnail_url: str
+    display_url: Optional[str] = None
+    placeholder: Optional[str] = None  # tiny data: URI to show until the thumbnail loads
 
     model_config = {"from_attributes": True}
 
@@ -31,6 +33,8 @@ class PhotoListResponse(BaseModel):
 class NeighborsResponse(BaseModel):
     prev_id: Optional[int] = None
     next_id: Optional[int] = None
+    prev_display_url: Optional[str] = None
+    next_display_url: Optional[str] = None
 
 
 class FavoriteRequest(BaseModel):
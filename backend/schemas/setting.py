@@ -7,6 +7,12 @@ class SettingsResponse(BaseModel):
     extensions: str = "jpg,jpeg,png,webp"
     thumbnail_size: str = "300"
     screenshot_folder: str = ""
+    scan_workers: str = "0"
+    watch_enabled: str = "0"
+    thumbnail_pregenerate: str = "0"
+    thumbnail_cache_mb: str = "0"
+    thumbnail_format: str = "webp"
+    decode_memory_mb: str = "1024"
 
 
 class SettingsUpdate(BaseModel):
@@ -14,6 +20,12 @@ class SettingsUpdate(BaseModel):
     extensions: Optional[str] = None
     thumbnail_size: Optional[str] = None
     screenshot_folder: Optional[str] = None
+    scan_workers: Optional[str] = None
+    watch_enabled: Optional[str] = None
+    thumbnail_pregenerate: Optional[str] = None
+    thumbnail_cache_mb: Optional[str] = None
+    thumbnail_format: Optional[str] = None
+    decode_memory_mb: Optional[str] = None
 
 
 class ExcludedFoldersResponse(BaseModel):
@@ -0,0 +1,363 @@
+"""Minimal readers for video container headers (ISO-BMFF and Matroska/WebM).
+
+Only the atoms/elements needed for width, height and duration are read, with
+a handful of small seeks and reads, so probing a clip costs a few
+milliseconds instead of an ffmpeg process launch. Anything unexpected makes
+the reader return None and the caller falls back to ffmpeg.
+"""
+import os
+import struct
+import logging
+from typing import BinaryIO, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Header payloads (moov, Info, Tracks, SeekHead) larger than this are not
+# read; ffmpeg handles such files instead.
+MAX_HEADER_BYTES = 32 * 1024 * 1024
+
+VideoInfo = tuple[Optional[int], Optional[int], Optional[float]]
+
+
+# ---------------------------------------------------------------------------
+# ISO base media (mp4, mov, m4v)
+# ---------------------------------------------------------------------------
+
+_ISO_TOP_LEVEL = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot", b"uuid",
+                  b"moof", b"mfra", b"sidx", b"styp", b"meta", b"pdin"}
+
+
+def _iter_boxes(data: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[tuple[bytes, int, int]]:
+    """Yield (type, payload_start, payload_end) for the boxes in data[start:end]."""
+    end = len(data) if end is None else end
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", data, pos)
+        header = 8
+        if size == 1:
+            if pos + 16 > end:
+                return
+            size = struct.unpack_from(">Q", data, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            return
+        yield kind, pos + header, pos + size
+        pos += size
+
+
+def _find_moov(f: BinaryIO, file_size: int) -> Optional[bytes]:
+    """Walk the top-level boxes by seeking and return the moov payload."""
+    pos = 0
+    while pos + 8 <= file_size:
+        f.seek(pos)
+        head = f.read(16)
+        if len(head) < 8:
+            return None
+        size, kind = struct.unpack_from(">I4s", head)
+        header = 8
+        if size == 1:
+            if len(head) < 16:
+                return None
+            size = struct.unpack_from(">Q", head, 8)[0]
+            header = 16
+        elif size == 0:
+            size = file_size - pos
+        if pos == 0 and kind != b"ftyp" and kind not in _ISO_TOP_LEVEL:
+            return None  # not an ISO-BMFF file
+        if size < header:
+            return None
+        if kind == b"moov":
+            if size - header > MAX_HEADER_BYTES:
+                return None
+            f.seek(pos + header)
+            data = f.read(size - header)
+            return data if len(data) == size - header else None
+        pos += size
+    return None
+
+
+def _parse_mvhd(data: bytes, start: int, end: int) -> tuple[int, int]:
+    """Return (timescale, duration) from a movie header box."""
+    if data[start] == 1:
+        if start + 32 > end:
+            return 0, 0
+        return struct.unpack_from(">IQ", data, start + 20)
+    if start + 20 > end:
+        return 0, 0
+    return struct.unpack_from(">II", data, start + 12)
+
+
+def _parse_mehd(data: bytes, start: int, end: int) -> int:
+    """Return the fragment duration from a movie extends header box."""
+    if data[start] == 1:
+        return struct.unpack_from(">Q", data, start + 4)[0] if start + 12 <= end else 0
+    return struct.unpack_from(">I", data, start + 4)[0] if start + 8 <= end else 0
+
+
+def _tkhd_size(data: bytes, start: int, end: int) -> tuple[Optional[int], Optional[int]]:
+    # Width and height are the last two 16.16 fixed-point fields.
+    if end - start < 84:
+        return None, None
+    w, h = struct.unpack_from(">II", data, end - 8)
+    return (w >> 16) or None, (h >> 16) or None
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> tuple[Optional[int], Optional[int]]:
+    """Return the coded (width, height) of a video track, or (None, None)."""
+    tkhd_w = tkhd_h = None
+    handler = None
+    entry_w = entry_h = None
+    for kind, s, e in _iter_boxes(data, start, end):
+        if kind == b"tkhd":
+            tkhd_w, tkhd_h = _tkhd_size(data, s, e)
+        elif kind == b"mdia":
+            for mkind, ms, me in _iter_boxes(data, s, e):
+                if mkind == b"hdlr" and ms + 12 <= me:
+                    handler = data[ms + 8:ms + 12]
+                elif mkind == b"minf":
+                    entry_w, entry_h = _sample_entry_size(data, ms, me)
+    if handler != b"vide":
+        return None, None
+    # The visual sample entry holds the coded size (what ffmpeg reports);
+    # tkhd's presentation size is the fallback.
+    if entry_w and entry_h:
+        return entry_w, entry_h
+    return tkhd_w, tkhd_h
+
+
+def _sample_entry_size(data: bytes, start: int, end: int) -> tuple[Optional[int], Optional[int]]:
+    for kind, s, e in _iter_boxes(data, start, end):
+        if kind != b"stbl":
+            continue
+        for skind, ss, se in _iter_boxes(data, s, e):
+            # stsd: version/flags (4), entry_count (4), then the first sample
+            # entry; width/height sit 24 bytes into a VisualSampleEntry body.
+            if skind == b"stsd" and ss + 8 + 36 <= se:
+                w, h = struct.unpack_from(">HH", data, ss + 8 + 32)
+                return w or None, h or None
+    return None, None
+
+
+def _read_iso(f: BinaryIO, file_size: int) -> Optional[VideoInfo]:
+    moov = _find_moov(f, file_size)
+    if moov is None:
+        return None
+    timescale = duration = fragment_duration = 0
+    width = height = None
+    for kind, s, e in _iter_boxes(moov):
+        if kind == b"mvhd":
+            timescale, duration = _parse_mvhd(moov, s, e)
+        elif kind == b"trak" and width is None:
+            width, height = _parse_trak(moov, s, e)
+        elif kind == b"mvex":
+            for xkind, xs, xe in _iter_boxes(moov, s, e):
+                if xkind == b"mehd":
+                    fragment_duration = _parse_mehd(moov, xs, xe)
+    if duration in (0, 0xFFFFFFFF, 0xFFFFFFFFFFFFFFFF):
+        # Fragmented MP4: the movie header covers only the (empty) initial
+        # segment; mehd, when present, holds the full duration.
+        duration = fragment_duration
+    seconds = duration / timescale if timescale and duration else None
+    return width, height, seconds
+
+
+# ---------------------------------------------------------------------------
+# Matroska / WebM
+# ---------------------------------------------------------------------------
+
+_EBML = 0x1A45DFA3
+_SEGMENT = 0x18538067
+_SEEK_HEAD = 0x114D9B74
+_SEEK = 0x4DBB
+_SEEK_ID = 0x53AB
+_SEEK_POSITION = 0x53AC
+_INFO = 0x1549A966
+_TIMECODE_SCALE = 0x2AD7B1
+_DURATION = 0x4489
+_TRACKS = 0x1654AE6B
+_TRACK_ENTRY = 0xAE
+_TRACK_TYPE = 0x83
+_VIDEO = 0xE0
+_PIXEL_WIDTH = 0xB0
+_PIXEL_HEIGHT = 0xBA
+_CLUSTER = 0x1F43B675
+
+_UNKNOWN_SIZE = -1
+
+
+def _vint(buf: bytes, pos: int, keep_marker: bool) -> tuple[int, int]:
+    """Decode an EBML variable-length integer; return (value, next_pos)."""
+    first = buf[pos]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        mask >>= 1
+        length += 1
+    if length > 8 or pos + length > len(buf):
+        raise ValueError("bad EBML vint")
+    value = first if keep_marker else first & (mask - 1)
+    all_ones = (first & (mask - 1)) == mask - 1
+    for b in buf[pos + 1:pos + length]:
+        value = (value << 8) | b
+        all_ones = all_ones and b == 0xFF
+    if not keep_marker and all_ones:
+        return _UNKNOWN_SIZE, pos + length
+    return value, pos + length
+
+
+def _iter_elements(buf: bytes, start: int = 0, end: Optional[int] = None) -> Iterator[tuple[int, int, int]]:
+    """Yield (id, payload_start, payload_end) for the elements in buf[start:end]."""
+    end = len(buf) if end is None else end
+    pos = start
+    while pos < end:
+        eid, pos = _vint(buf, pos, keep_marker=True)
+        size, pos = _vint(buf, pos, keep_marker=False)
+        if size == _UNKNOWN_SIZE or pos + size > end:
+            return
+        yield eid, pos, pos + size
+        pos += size
+
+
+def _uint(buf: bytes, start: int, end: int) -> int:
+    return int.from_bytes(buf[start:end], "big")
+
+
+def _read_element_header(f: BinaryIO, pos: int) -> Optional[tuple[int, int, int]]:
+    """Return (id, size, payload_pos) for the element at ``pos``, or None at EOF."""
+    f.seek(pos)
+    head = f.read(12)
+    if not head:
+        return None
+    eid, p = _vint(head, 0, keep_marker=True)
+    size, p = _vint(head, p, keep_marker=False)
+    return eid, size, pos + p
+
+
+def _read_payload(f: BinaryIO, pos: int, size: int) -> Optional[bytes]:
+    if size == _UNKNOWN_SIZE or size > MAX_HEADER_BYTES:
+        return None
+    f.seek(pos)
+    data = f.read(size)
+    return data if len(data) == size else None
+
+
+def _parse_info(buf: bytes) -> Optional[float]:
+    scale = 1_000_000
+    raw = None
+    for eid, s, e in _iter_elements(buf):
+        if eid == _TIMECODE_SCALE:
+            scale = _uint(buf, s, e) or scale
+        elif eid == _DURATION:
+            if e - s == 4:
+                raw = struct.unpack_from(">f", buf, s)[0]
+            elif e - s == 8:
+                raw = struct.unpack_from(">d", buf, s)[0]
+    if not raw or raw <= 0:
+        return None
+    return raw * scale / 1e9
+
+
+def _parse_tracks(buf: bytes) -> tuple[Optional[int], Optional[int]]:
+    for eid, s, e in _iter_elements(buf):
+        if eid != _TRACK_ENTRY:
+            continue
+        track_type = None
+        width = height = None
+        for tid, ts, te in _iter_elements(buf, s, e):
+            if tid == _TRACK_TYPE:
+                track_type = _uint(buf, ts, te)
+            elif tid == _VIDEO:
+                for vid, vs, ve in _iter_elements(buf, ts, te):
+                    if vid == _PIXEL_WIDTH:
+                        width = _uint(buf, vs, ve)
+                    elif vid == _PIXEL_HEIGHT:
+                        height = _uint(buf, vs, ve)
+        if track_type == 1:
+            return width or None, height or None
+    return None, None
+
+
+def _read_matroska(f: BinaryIO, file_size: int) -> Optional[VideoInfo]:
+    header = _read_element_header(f, 0)
+    if header is None or header[0] != _EBML or header[1] == _UNKNOWN_SIZE:
+        return None
+    segment = _read_element_header(f, header[2] + header[1])
+    if segment is None or segment[0] != _SEGMENT:
+        return None
+    seg_data = segment[2]
+    seg_end = file_size if segment[1] == _UNKNOWN_SIZE else min(file_size, seg_data + segment[1])
+
+    info = tracks = None
+    seek_targets: dict[int, int] = {}
+    pos = seg_data
+    # Walk the segment's children until Info and Tracks are found. They
+    # normally precede the first Cluster; if not, the SeekHead says where.
+    while pos < seg_end and (info is None or tracks is None):
+        element = _read_element_header(f, pos)
+        if element is None:
+            break
+        eid, size, payload = element
+        if eid == _CLUSTER or size == _UNKNOWN_SIZE:
+            break
+        if eid in (_INFO, _TRACKS, _SEEK_HEAD):
+            data = _read_payload(f, payload, size)
+            if data is None:
+                return None
+            if eid == _INFO:
+                info = data
+            elif eid == _TRACKS:
+                tracks = data
+            else:
+                for sid, ss, se in _iter_elements(data):
+                    if sid != _SEEK:
+                        continue
+                    target = offset = None
+                    for kid, ks, ke in _iter_elements(data, ss, se):
+                        if kid == _SEEK_ID:
+                            target = _uint(data, ks, ke)
+                        elif kid == _SEEK_POSITION:
+                            offset = _uint(data, ks, ke)
+                    if target is not None and offset is not None:
+                        seek_targets.setdefault(target, seg_data + offset)
+        pos = payload + size
+
+    for eid in (_INFO, _TRACKS):
+        if (info if eid == _INFO else tracks) is not None or eid not in seek_targets:
+            continue
+        element = _read_element_header(f, seek_targets[eid])
+        if element is None or element[0] != eid:
+            continue
+        data = _read_payload(f, element[2], element[1])
+        if eid == _INFO:
+            info = data
+        else:
+            tracks = data
+
+    if info is None and tracks is None:
+        return None
+    duration = _parse_info(info) if info is not None else None
+    width, height = _parse_tracks(tracks) if tracks is not None else (None, None)
+    return width, height, duration
+
+
+def read_container_info(file_path: str) -> Optional[VideoInfo]:
+    """Return (width, height, duration_seconds) from the container headers.
+
+    Returns None if the file is not a recognised container or its headers
+    cannot be parsed; individual fields may also be None.
+    """
+    try:
+        with open(file_path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+            magic = f.read(8)
+            if len(magic) < 8:
+                return None
+            if magic[:4] == b"\x1a\x45\xdf\xa3":
+                return _read_matroska(f, file_size)
+            if magic[4:8] in _ISO_TOP_LEVEL:
+                return _read_iso(f, file_size)
+    except (OSError, ValueError, struct.error, IndexError) as e:
+        logger.debug("Cannot parse container of %s: %s", file_path, e)
+    return None
@@ -0,0 +1,122 @@
+import logging
+import threading
+from collections import deque
+from contextlib import contextmanager
+
+from PIL import Image
+
+from services.pathutil import long_path
+
+logger = logging.getLogger(__name__)
+
+# Bytes per pixel of Pillow's in-memory storage, by mode; everything not
+# listed (RGB included, which is padded) takes 4.
+_PIXEL_BYTES = {"1": 1, "L": 1, "P": 1, "I;16": 2, "I;16L": 2, "I;16B": 2, "I;16N": 2}
+
+
+def draft_box(size: tuple[int, int], longest: int) -> tuple[int, int]:
+    """``size`` scaled so its longer edge is ``longest``: the box to pass to
+    Image.draft(), which only scales down while both edges stay at least
+    that large."""
+    scale = min(1.0, longest / max(size))
+    return max(1, int(size[0] * scale)), max(1, int(size[1] * scale))
+
+
+def estimate_decode_bytes(file_path: str, draft_longest: int) -> int:
+    """Peak pixel memory of a render that drafts ``file_path`` to
+    ``draft_longest`` pixels, estimated from its header alone.
+
+    Accounts for JPEG draft scaling (the smallest DCT scale keeping the
+    longer edge at least ``draft_longest``) and for the RGB copy made of
+    non-RGB sources.
+    """
+    with Image.open(long_path(file_path)) as img:
+        img.draft("RGB", draft_box(img.size, draft_longest))
+        pixels = img.width * img.height
+        per_pixel = _PIXEL_BYTES.get(img.mode, 4) + (0 if img.mode == "RGB" else 4)
+    return pixels * per_pixel
+
+
+class DecodeBudget:
+    """Bytes of decoded pixels allowed in flight at once, shared by on-demand
+    renders and the warmer.
+
+    Decodes are admitted first come, first served. One estimated larger than
+    the whole budget is only admitted while nothing else is decoding, so huge
+    images run one at a time. A limit of 0 means unlimited.
+    """
+
+    def __init__(self, limit_bytes: int = 0):
+        self._cond = threading.Condition()
+        self._limit = limit_bytes
+        self._in_use = 0
+        self._active = 0
+        self._waiting: deque[object] = deque()
+
+    @property
+    def limit_bytes(self) -> int:
+        return self._limit
+
+    @limit_bytes.setter
+    def limit_bytes(self, value: int):
+        with self._cond:
+            self._limit = max(0, value)
+            self._cond.notify_all()
+
+    def _fits(self, nbytes: int) -> bool:
+        return self._limit <= 0 or self._active == 0 or self._in_use + nbytes <= self._limit
+
+    def _take(self, nbytes: int):
+        self._in_use += nbytes
+        self._active += 1
+
+    def acquire(self, nbytes: int):
+        """Wait until ``nbytes`` fit in the budget and take them."""
+        ticket = object()
+        with self._cond:
+            if self._limit > 0 and nbytes > self._limit:
+                logger.info("Decode of ~%d MB exceeds the %d MB budget; running it alone",
+                            nbytes >> 20, self._limit >> 20)
+            self._waiting.append(ticket)
+            try:
+                while self._waiting[0] is not ticket or not self._fits(nbytes):
+                    self._cond.wait()
+            finally:
+                self._waiting.remove(ticket)
+                # The next in line may fit too (or be first now).
+                self._cond.notify_all()
+            self._take(nbytes)
+
+    def try_acquire(self, nbytes: int) -> bool:
+        """Take ``nbytes`` if nobody is waiting and they fit now."""
+        with self._cond:
+            if self._waiting or not self._fits(nbytes):
+                return False
+            self._take(nbytes)
+            return True
+
+    def release(self, nbytes: int):
+        with self._cond:
+            self._in_use -= nbytes
+            self._active -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def reserve(self, nbytes: int):
+        self.acquire(nbytes)
+        try:
+            yield
+        finally:
+            self.release(nbytes)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "limit_bytes": self._limit,
+                "in_use_bytes": self._in_use,
+                "active": self._active,
+                "waiting": len(self._waiting),
+            }
+
+
+decode_budget = DecodeBudget()
@@ -8,37 +8,48 @@ from services.pathutil import long_path
 logger = logging.getLogger(__name__)
 
 
+def read_image_info(file_path: str) -> tuple[Optional[int], Optional[int], Optional[str]]:
+    """Like extract_image_info, but raises if the file cannot be opened at all."""
+    width: Optional[int] = None
+    height: Optional[int] = None
+    taken_at: Optional[str] = None
+
+    with Image.open(long_path(file_path)) as img:
+        try:
+            width, height = img.size
+        except Exception as e:
+            logger.warning("Failed to get dimensions for %s: %s", file_path, e)
+
+        try:
+            # PNG's getexif() decodes the whole image to reach an eXIf chunk
+            # stored after the pixel data; only one ahead of it is used.
+            if img.format == "PNG" and "exif" not in img.info:
+                exif_data = None
+            else:
+                exif_data = img.getexif()
+            if exif_data:
+                # DateTimeOriginal (36867) or DateTime (306)
+                date_str = exif_data.get(36867) or exif_data.get(306)
+                if date_str:
+                    dt = datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
+                    taken_at = dt.isoformat()
+        except Exception as e:
+            logger.warning("Failed to extract EXIF for %s: %s", file_path, e)
+
+    return width, height, taken_at
+
+
 def extract_image_info(file_path: str) -> tuple[Optional[int], Optional[int], Optional[str]]:
     """Open the image once and return (width, height, taken_at).
 
     Returns (None, None, None) if the file cannot be opened at all.
     Dimensions may succeed even if EXIF fails, and vice versa.
     """
-    width: Optional[int] = None
-    height: Optional[int] = None
-    taken_at: Optional[str] = None
-
     try:
-        with Image.open(long_path(file_path)) as img:
-            try:
-                width, height = img.size
-            except Exception as e:
-                logger.warning("Failed to get dimensions for %s: %s", file_path, e)
-
-            try:
-                exif_data = img.getexif()
-                if exif_data:
-                    # DateTimeOriginal (36867) or DateTime (306)
-                    date_str = exif_data.get(36867) or exif_data.get(306)
-                    if date_str:
-                        dt = datetime.strptime(date_str, "%Y:%m:%d %H:%M:%S")
-                        taken_at = dt.isoformat()
-            except Exception as e:
-                logger.warning("Failed to extract EXIF for %s: %s", file_path, e)
+        return read_image_info(file_path)
     except Exception as e:
         logger.warning("Failed to open image %s: %s", file_path, e)
-
-    return width, height, taken_at
+        return None, None, None
 
 
 # Keep old functions for backward compatibility (used by thumbnail etc.)
@@ -0,0 +1,151 @@
+import os
+import logging
+from datetime import datetime, timedelta
+from typing import Callable, NamedTuple
+
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session
+
+from models.scan_failure import ScanFailure
+from services.pathutil import long_path
+
+logger = logging.getLogger(__name__)
+
+# A file that failed is left alone for RETRY_BASE after its first failure,
+# doubling after each further failure up to RETRY_MAX. Any change to its
+# mtime or size makes it eligible again straight away.
+RETRY_BASE = timedelta(hours=1)
+RETRY_MAX = timedelta(days=30)
+
+_COLUMNS = ("modified_at", "file_size", "error_class", "message", "attempts",
+            "last_failed_at", "retry_after")
+_UPSERT_STMT = sqlite_insert(ScanFailure.__table__)
+_UPSERT_STMT = _UPSERT_STMT.on_conflict_do_update(
+    index_elements=["file_path"],
+    set_={c: _UPSERT_STMT.excluded[c] for c in _COLUMNS},
+)
+
+
+def retry_delay(attempts: int) -> timedelta:
+    """Backoff before the next attempt after ``attempts`` consecutive failures."""
+    if attempts <= 1:
+        return RETRY_BASE
+    return min(RETRY_BASE * (2 ** min(attempts - 1, 32)), RETRY_MAX)
+
+
+class _Entry(NamedTuple):
+    modified_at: str
+    file_size: int
+    attempts: int
+    first_failed_at: str
+    retry_after: str
+
+
+class FailureCache:
+    """The scan_failures table, loaded once per scan and written in batches.
+
+    Keys are normcase'd clean paths. Call flush() to write pending changes;
+    it does not commit.
+    """
+
+    def __init__(self, db: Session, now: datetime | None = None):
+        self.now = now or datetime.now()
+        self._now_iso = self.now.isoformat()
+        self._entries: dict[str, _Entry] = {}
+        self._paths: dict[str, str] = {}  # normcase'd -> stored path
+        for row in db.query(
+            ScanFailure.file_path, ScanFailure.modified_at, ScanFailure.file_size,
+            ScanFailure.attempts, ScanFailure.first_failed_at, ScanFailure.retry_after,
+        ):
+            key = os.path.normcase(row[0])
+            self._entries[key] = _Entry(*row[1:])
+            self._paths[key] = row[0]
+        self._upserts: dict[str, dict] = {}
+        self._clears: dict[str, str] = {}  # normcase'd -> stored path
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def backing_off(self, clean_file_path: str, modified_at: str, file_size: int) -> bool:
+        """True if this exact file version failed and its retry time hasn't come."""
+        if not self._entries:
+            return False
+        entry = self._entries.get(os.path.normcase(clean_file_path))
+        return (entry is not None and entry.modified_at == modified_at
+                and entry.file_size == file_size and entry.retry_after > self._now_iso)
+
+    def record(self, clean_file_path: str, modified_at: str, file_size: int,
+               error_class: str, message: str | None = None):
+        key = os.path.normcase(clean_file_path)
+        previous = self._entries.get(key)
+        if previous and previous.modified_at == modified_at and previous.file_size == file_size:
+            attempts, first = previous.attempts + 1, previous.first_failed_at
+        else:
+            attempts, first = 1, self._now_iso
+        retry_after = (self.now + retry_delay(attempts)).isoformat()
+        self._entries[key] = _Entry(modified_at, file_size, attempts, first, retry_after)
+        self._paths[key] = clean_file_path
+        self._clears.pop(key, None)
+        self._upserts[key] = {
+            "file_path": clean_file_path,
+            "modified_at": modified_at,
+            "file_size": file_size,
+            "error_class": error_class,
+            "message": (message or "")[:500] or None,
+            "attempts": attempts,
+            "first_failed_at": first,
+            "last_failed_at": self._now_iso,
+            "retry_after": retry_after,
+        }
+
+    def clear(self, clean_file_path: str):
+        """Forget a file (it was read successfully, or is gone)."""
+        key = os.path.normcase(clean_file_path)
+        if key in self._entries:
+            del self._entries[key]
+            self._upserts.pop(key, None)
+            self._clears[key] = self._paths.pop(key)
+
+    def prune_missing(self, is_relevant: Callable[[str], bool] = lambda _: True):
+        """Clear entries (for which ``is_relevant(key)`` holds) whose file no longer exists."""
+        for key, path in list(self._paths.items()):
+            if is_relevant(key) and not os.path.exists(long_path(path)):
+                self.clear(path)
+
+    def flush(self, db: Session):
+        if self._upserts:
+            db.execute(_UPSERT_STMT, list(self._upserts.values()))
+            self._upserts = {}
+        if self._clears:
+            paths = list(self._clears.values())
+            for i in range(0, len(paths), 500):
+                db.query(ScanFailure).filter(
+                    ScanFailure.file_path.in_(paths[i:i + 500])
+                ).delete(synchronize_session=False)
+            self._clears = {}
+
+
+def list_failures(db: Session, limit: int = 500, offset: int = 0) -> dict:
+    query = db.query(ScanFailure)
+    total = query.count()
+    rows = query.order_by(ScanFailure.last_failed_at.desc()).offset(offset).limit(limit).all()
+    return {
+        "total": total,
+        "items": [
+            {
+                "file_path": r.file_path,
+                "error_class": r.error_class,
+                "message": r.message,
+                "attempts": r.attempts,
+                "first_failed_at": r.first_failed_at,
+                "last_failed_at": r.last_failed_at,
+                "retry_after": r.retry_after,
+            }
+            for r in rows
+        ],
+    }
+
+
+def clear_failures(db: Session):
+    """Forget every recorded failure so the next scan retries those files. Does not commit."""
+    db.query(ScanFailure).delete()
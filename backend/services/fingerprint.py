@@ -0,0 +1,22 @@
+import os
+import hashlib
+
+# Bytes hashed from each end of the file.
+FINGERPRINT_BLOCK = 64 * 1024
+
+
+def file_fingerprint(path: str) -> str:
+    """Cheap content fingerprint: the size plus a hash of the head and tail blocks.
+
+    Reads at most two blocks, so it is affordable for every new file in a scan.
+    It identifies the same file after a move or rename; it is not a full
+    content hash and is not meant to prove two files are identical.
+    """
+    with open(path, "rb") as f:
+        size = os.fstat(f.fileno()).st_size
+        h = hashlib.blake2b(digest_size=16)
+        h.update(f.read(FINGERPRINT_BLOCK))
+        if size > FINGERPRINT_BLOCK:
+            f.seek(max(FINGERPRINT_BLOCK, size - FINGERPRINT_BLOCK))
+            h.update(f.read(FINGERPRINT_BLOCK))
+    return f"{size}:{h.hexdigest()}"
@@ -0,0 +1,177 @@
+"""Reader for the previews cameras embed in JPEG files.
+
+Most cameras store a small (typically 160px) thumbnail in the EXIF APP1
+segment, and many also store a screen-sized preview as a second image
+referenced from a Multi-Picture Format (MPF) APP2 segment. Only the marker
+segments in front of the frame header and the chosen preview are read, so
+taking a preview costs a few small reads instead of decoding a 24-45 MP
+frame. Anything unexpected makes the reader return None and the caller
+decodes the image itself.
+"""
+import io
+import struct
+import logging
+from typing import BinaryIO, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+# Marker segments are only walked this far into the file.
+MAX_HEADER_BYTES = 1024 * 1024
+# Previews larger than this are not read.
+MAX_PREVIEW_BYTES = 8 * 1024 * 1024
+# How far (relatively) a preview's aspect ratio may differ from the frame's;
+# rejects e.g. letterboxed 4:3 thumbnails of 3:2 frames.
+ASPECT_TOLERANCE = 0.02
+
+_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+_SOS = 0xDA
+_APP1 = 0xE1
+_APP2 = 0xE2
+
+# MPF individual image types that are previews of the primary image.
+_MPF_PREVIEW_TYPES = {0x010001, 0x010002}  # large thumbnail: VGA, full HD
+
+
+def _segments(f: BinaryIO) -> Iterator[tuple[int, int, int]]:
+    """Yield (marker, payload_offset, payload_length) for the marker segments
+    up to and including the frame header (or the start of scan)."""
+    f.seek(0)
+    if f.read(2) != b"\xff\xd8":
+        return
+    pos = 2
+    while pos < MAX_HEADER_BYTES:
+        f.seek(pos)
+        head = f.read(4)
+        if len(head) < 4 or head[0] != 0xFF:
+            return
+        if head[1] == 0xFF:  # fill byte
+            pos += 1
+            continue
+        length = struct.unpack_from(">H", head, 2)[0]
+        if length < 2:
+            return
+        yield head[1], pos + 4, length - 2
+        if head[1] == _SOS or head[1] in _SOF_MARKERS:
+            return
+        pos += 2 + length
+
+
+def _frame_size(f: BinaryIO) -> Optional[tuple[int, int]]:
+    """(width, height) from the frame header."""
+    for marker, offset, _ in _segments(f):
+        if marker in _SOF_MARKERS:
+            f.seek(offset)
+            height, width = struct.unpack(">xHH", f.read(5))
+            return width, height
+    return None
+
+
+def _tiff_header(tiff: bytes) -> tuple[str, int]:
+    """Byte order and first IFD offset of a TIFF structure."""
+    if tiff[:4] == b"II*\x00":
+        return "<", struct.unpack_from("<I", tiff, 4)[0]
+    if tiff[:4] == b"MM\x00*":
+        return ">", struct.unpack_from(">I", tiff, 4)[0]
+    raise ValueError("not a TIFF header")
+
+
+def _ifd(tiff: bytes, offset: int, order: str) -> tuple[dict[int, tuple[int, int, int]], int]:
+    """{tag: (type, count, value)} of the IFD at ``offset`` and the next IFD's offset.
+
+    ``value`` is the inline value for single SHORTs and LONGs, otherwise the
+    offset of the data.
+    """
+    count = struct.unpack_from(order + "H", tiff, offset)[0]
+    entries = {}
+    for i in range(count):
+        pos = offset + 2 + 12 * i
+        tag, kind, n = struct.unpack_from(order + "HHI", tiff, pos)
+        value_format = "H" if kind == 3 and n == 1 else "I"
+        entries[tag] = (kind, n, struct.unpack_from(order + value_format, tiff, pos + 8)[0])
+    return entries, struct.unpack_from(order + "I", tiff, offset + 2 + 12 * count)[0]
+
+
+def _exif_thumbnail(tiff: bytes) -> Optional[bytes]:
+    """The JPEG thumbnail in IFD1 of an EXIF block."""
+    order, ifd0 = _tiff_header(tiff)
+    _, ifd1 = _ifd(tiff, ifd0, order)
+    if not ifd1:
+        return None
+    entries, _ = _ifd(tiff, ifd1, order)
+    start, length = entries.get(0x0201), entries.get(0x0202)  # JPEGInterchangeFormat(Length)
+    if start is None or length is None:
+        return None
+    data = tiff[start[2]:start[2] + length[2]]
+    return data if len(data) == length[2] and data[:2] == b"\xff\xd8" else None
+
+
+def _mpf_previews(tiff: bytes, base: int) -> list[tuple[int, int]]:
+    """(file offset, length) of the preview images listed in an MPF block
+    whose TIFF header is at file offset ``base``."""
+    order, ifd0 = _tiff_header(tiff)
+    entries, _ = _ifd(tiff, ifd0, order)
+    mp_entry = entries.get(0xB002)
+    if mp_entry is None:
+        return []
+    _, length, offset = mp_entry
+    previews = []
+    for i in range(length // 16):
+        attributes, size, data_offset = struct.unpack_from(order + "III", tiff, offset + 16 * i)
+        if (data_offset and attributes & 0xFFFFFF in _MPF_PREVIEW_TYPES
+                and size <= MAX_PREVIEW_BYTES):
+            previews.append((base + data_offset, size))
+    return previews
+
+
+def _usable(data: bytes, frame: tuple[int, int], min_size: int) -> bool:
+    size = _frame_size(io.BytesIO(data))
+    if size is None or not all(size) or max(size) < min_size:
+        return False
+    frame_aspect = frame[0] / frame[1]
+    return abs(size[0] / size[1] - frame_aspect) <= ASPECT_TOLERANCE * frame_aspect
+
+
+def _read_preview(f: BinaryIO, min_size: int) -> Optional[bytes]:
+    exif: Optional[bytes] = None
+    previews: list[tuple[int, int]] = []
+    frame: Optional[tuple[int, int]] = None
+    for marker, offset, length in _segments(f):
+        if marker == _APP1 and exif is None:
+            f.seek(offset)
+            payload = f.read(length)
+            if payload.startswith(b"Exif\x00\x00"):
+                exif = payload[6:]
+        elif marker == _APP2:
+            f.seek(offset)
+            if f.read(4) == b"MPF\x00":
+                previews = _mpf_previews(f.read(length - 4), offset + 4)
+        elif marker in _SOF_MARKERS:
+            f.seek(offset)
+            height, width = struct.unpack(">xHH", f.read(5))
+            frame = (width, height)
+    if frame is None or not all(frame):
+        return None
+
+    # Smallest first: the EXIF thumbnail is already in memory.
+    if exif is not None:
+        thumbnail = _exif_thumbnail(exif)
+        if thumbnail is not None and _usable(thumbnail, frame, min_size):
+            return thumbnail
+    for offset, size in sorted(previews, key=lambda p: p[1]):
+        f.seek(offset)
+        data = f.read(size)
+        if len(data) == size and _usable(data, frame, min_size):
+            return data
+    return None
+
+
+def read_preview(file_path: str, min_size: int) -> Optional[bytes]:
+    """The smallest embedded JPEG preview whose longer edge is at least
+    ``min_size`` pixels and whose aspect ratio matches the image's; None if
+    the file has none (or isn't a JPEG)."""
+    try:
+        with open(file_path, "rb") as f:
+            return _read_preview(f, min_size)
+    except (OSError, ValueError, struct.error) as e:
+        logger.debug("No embedded preview in %s: %s", file_path, e)
+        return None
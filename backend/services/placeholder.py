@@ -0,0 +1,65 @@
+import io
+import base64
+import logging
+from typing import Optional
+
+from PIL import Image, features
+from sqlalchemy import bindparam, update
+
+from database import SessionLocal
+from models.photo import Photo
+
+logger = logging.getLogger(__name__)
+
+# Longest edge of the inline preview a grid tile shows until its thumbnail
+# arrives; the browser scales it up, which blurs it.
+PLACEHOLDER_SIZE = 16
+
+# WebP keeps a 16px photo near 150 bytes; PNG is the fallback for builds
+# without it.
+_ENCODING = ("WEBP", {"quality": 50}, "image/webp") if features.check("webp") else \
+    ("PNG", {"optimize": True}, "image/png")
+
+_SAVE_STMT = (
+    update(Photo.__table__)
+    .where(Photo.__table__.c.id == bindparam("_id"))
+    .where(Photo.__table__.c.placeholder.is_(None))
+    .values(placeholder=bindparam("placeholder"))
+)
+
+
+def make_placeholder(img: Image.Image) -> str:
+    """A data: URI of ``img`` shrunk to PLACEHOLDER_SIZE pixels."""
+    img = img.copy() if img.mode == "RGB" else img.convert("RGB")
+    img.thumbnail((PLACEHOLDER_SIZE, PLACEHOLDER_SIZE), Image.Resampling.BOX)
+    fmt, options, media_type = _ENCODING
+    buf = io.BytesIO()
+    img.save(buf, fmt, **options)
+    return f"data:{media_type};base64,{base64.b64encode(buf.getvalue()).decode('ascii')}"
+
+
+def placeholder_from_thumbnail(data: bytes) -> Optional[str]:
+    """The placeholder for an encoded thumbnail; None if it can't be decoded."""
+    try:
+        with Image.open(io.BytesIO(data)) as img:
+            img.draft("RGB", (PLACEHOLDER_SIZE, PLACEHOLDER_SIZE))
+            return make_placeholder(img)
+    except Exception as e:
+        logger.debug("No placeholder from thumbnail: %s", e)
+        return None
+
+
+def save_placeholders(placeholders: dict[int, str]):
+    """Store placeholders for photos that don't have one yet (the scanner
+    clears a photo's placeholder when its file changes)."""
+    if not placeholders:
+        return
+    db = SessionLocal()
+    try:
+        db.execute(_SAVE_STMT, [{"_id": pid, "placeholder": uri} for pid, uri in placeholders.items()])
+        db.commit()
+    except Exception as e:
+        db.rollback()
+        logger.warning("Failed to save %d placeholder(s): %s", len(placeholders), e)
+    finally:
+        db.close()
@@ -0,0 +1,87 @@
+import heapq
+import itertools
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Callable, Optional
+
+from services.thumbnail import MAX_CONCURRENT_DECODES
+
+logger = logging.getLogger(__name__)
+
+# Lower runs first: tiles on screen ahead of tiles fetched ahead of scrolling.
+PRIORITY_VISIBLE = 0
+PRIORITY_PREFETCH = 1
+PRIORITIES = {"visible": PRIORITY_VISIBLE, "prefetch": PRIORITY_PREFETCH}
+# Request header naming one of PRIORITIES (default visible). A header rather
+# than a query parameter, so a rendition's URL, and the browser's cached copy,
+# is the same whichever priority fetched it.
+PRIORITY_HEADER = "X-Render-Priority"
+
+
+class RenderQueue:
+    """Dedicated threads for on-demand thumbnail renders, fed from a priority
+    queue so renders never occupy the server's shared request thread pool.
+
+    Jobs of equal priority run in submission order. A job whose Future is
+    cancelled before a thread picks it up is dropped without running.
+    """
+
+    def __init__(self, workers: int = MAX_CONCURRENT_DECODES):
+        self._workers = workers
+        self._cond = threading.Condition()
+        self._heap: list[tuple[int, int, Future, Callable, tuple]] = []
+        self._seq = itertools.count()
+        self._threads: list[threading.Thread] = []
+        self._stopping = False
+
+    def submit(self, fn: Callable, *args, priority: int = PRIORITY_VISIBLE) -> Future:
+        future: Future = Future()
+        with self._cond:
+            if not self._threads:
+                self._start()
+            heapq.heappush(self._heap, (priority, next(self._seq), future, fn, args))
+            self._cond.notify()
+        return future
+
+    def pending(self) -> int:
+        """Jobs queued and not yet picked up (including cancelled ones not yet dropped)."""
+        with self._cond:
+            return len(self._heap)
+
+    def _start(self):
+        self._stopping = False
+        for i in range(self._workers):
+            thread = threading.Thread(target=self._work, name=f"thumb-render-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _work(self):
+        while True:
+            with self._cond:
+                while not self._heap and not self._stopping:
+                    self._cond.wait()
+                if self._stopping:
+                    return
+                _, _, future, fn, args = heapq.heappop(self._heap)
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                future.set_result(fn(*args))
+            except BaseException as e:
+                future.set_exception(e)
+
+    def shutdown(self, timeout: Optional[float] = 30):
+        """Cancel queued jobs, let running ones finish and stop the threads."""
+        with self._cond:
+            self._stopping = True
+            for _, _, future, _, _ in self._heap:
+                future.cancel()
+            self._heap.clear()
+            self._cond.notify_all()
+            threads, self._threads = self._threads, []
+        for thread in threads:
+            thread.join(timeout)
+
+
+render_queue = RenderQueue()
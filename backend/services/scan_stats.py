@@ -0,0 +1,85 @@
+import heapq
+import threading
+import time
+from typing import Callable
+
+# How many of the slowest items to keep per stage.
+SLOWEST_PER_STAGE = 10
+
+
+def timed(fn: Callable, *args):
+    """Run ``fn(*args)`` and return (result, seconds). Picklable for process pools."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class _Stage:
+    __slots__ = ("count", "seconds", "slowest")
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.slowest: list[tuple[float, str]] = []  # min-heap of (seconds, path)
+
+
+class ScanStats:
+    """Per-stage timing for one scan: cumulative seconds, item counts and the
+    slowest items. Safe to update from the walker and writer threads.
+
+    Stage seconds are summed across threads and worker processes, so for
+    parallel stages they can exceed the scan's wall time.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages: dict[str, _Stage] = {}
+        self._started = time.perf_counter()
+
+    def _stage(self, name: str) -> _Stage:
+        stage = self._stages.get(name)
+        if stage is None:
+            stage = self._stages[name] = _Stage()
+        return stage
+
+    def add(self, name: str, seconds: float, count: int = 1, path: str | None = None):
+        """Count ``count`` items taking ``seconds`` in total.
+
+        With ``path``, ``seconds`` is also a candidate for the stage's slowest list.
+        """
+        with self._lock:
+            stage = self._stage(name)
+            stage.count += count
+            stage.seconds += seconds
+            if path is not None:
+                self._offer_slow(stage, seconds, path)
+
+    def slow_candidate(self, name: str, seconds: float, path: str):
+        """Offer one item for the slowest list without counting it again."""
+        with self._lock:
+            self._offer_slow(self._stage(name), seconds, path)
+
+    @staticmethod
+    def _offer_slow(stage: _Stage, seconds: float, path: str):
+        if len(stage.slowest) < SLOWEST_PER_STAGE:
+            heapq.heappush(stage.slowest, (seconds, path))
+        elif seconds > stage.slowest[0][0]:
+            heapq.heapreplace(stage.slowest, (seconds, path))
+
+    def snapshot(self) -> dict:
+        """JSON-ready report: wall time plus per-stage totals, rates and slowest items."""
+        with self._lock:
+            stages = {
+                name: {
+                    "count": s.count,
+                    "seconds": round(s.seconds, 3),
+                    "per_second": round(s.count / s.seconds, 1) if s.seconds > 0 else None,
+                    "avg_ms": round(s.seconds * 1000 / s.count, 3) if s.count else None,
+                    "slowest": [
+                        {"path": path, "ms": round(secs * 1000, 1)}
+                        for secs, path in sorted(s.slowest, reverse=True)
+                    ],
+                }
+                for name, s in self._stages.items()
+            }
+        return {"elapsed": round(time.perf_counter() - self._started, 3), "stages": stages}
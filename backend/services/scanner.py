@@ -1,43 +1,1014 @@
 import os
 import sys
+import json
 import logging
+import hashlib
+import threading
+import time
+from array import array
+from bisect import bisect_left
+from collections import deque
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from datetime import datetime
-from typing import Optional
+from typing import Iterable, Iterator, NamedTuple, Optional
 
+from sqlalchemy import bindparam, text, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
 from sqlalchemy.orm import Session
 
 from config import is_video_extension
 from models.photo import Photo
-from services.exif import extract_image_info
-from services.video import probe_video
+from models.scan_checkpoint import ScanCheckpoint
+from models.scan_directory import ScanDirectory
+from models.scan_report import ScanReport
+from services.exif import read_image_info
+from services.failures import FailureCache
+from services.fingerprint import file_fingerprint
+from services.scan_stats import ScanStats, timed
+from services.thumbnail import discard_thumbnails
+from services.video import get_ffmpeg, probe_video
+from services.walker import FileEntry, dir_key, walk_media
 
 logger = logging.getLogger(__name__)
 
 
 from services.pathutil import long_path, clean_path
 
+# Results kept in flight per worker before the writer blocks on the oldest one.
+_IN_FLIGHT_PER_WORKER = 4
+
+# Rows buffered by _IndexWriter before they are written in one transaction.
+_WRITE_BATCH = 2000
+
+_UPSERT_COLUMNS = (
+    "file_size", "modified_at", "width", "height", "duration", "taken_at", "scanned_at",
+    "fingerprint", "placeholder",
+)
+# New files: plain INSERT, but a row that appeared in the meantime (e.g. added by
+# the folder watcher) is updated in place rather than failing the batch.
+_INSERT_STMT = sqlite_insert(Photo.__table__)
+_INSERT_STMT = _INSERT_STMT.on_conflict_do_update(
+    index_elements=["file_path"],
+    set_={c: _INSERT_STMT.excluded[c] for c in _UPSERT_COLUMNS},
+)
+# Modified files: update the cached row by id (keeps the id, favorites and any
+# path case difference on case-insensitive filesystems).
+_UPDATE_STMT = (
+    update(Photo.__table__)
+    .where(Photo.__table__.c.id == bindparam("_id"))
+    .values({c: bindparam(c) for c in _UPSERT_COLUMNS})
+)
+
+# Moved/renamed files: repoint the existing row (keeping its id, metadata,
+# favorite flag and cached thumbnail) at the new path.
+_MOVE_COLUMNS = ("file_path", "file_name", "extension", "file_size", "modified_at", "scanned_at")
+_MOVE_STMT = (
+    update(Photo.__table__)
+    .where(Photo.__table__.c.id == bindparam("_id"))
+    .values({c: bindparam(c) for c in _MOVE_COLUMNS})
+)
+# Rows scanned before fingerprints existed get one backfilled on their next scan.
+_FINGERPRINT_STMT = (
+    update(Photo.__table__)
+    .where(Photo.__table__.c.id == bindparam("_id"))
+    .values(fingerprint=bindparam("fingerprint"))
+)
+
+# Held by whoever is writing scan results (scan_folder or sync_paths) so a
+# full scan and the folder watcher never interleave their batches.
+index_lock = threading.Lock()
+
 scan_status = {
     "is_scanning": False,
+    # Files found so far; the walk streams into the writer, so this only
+    # becomes the real total once walk_done is set.
     "total": 0,
+    "walk_done": False,
     "processed": 0,
     "current_file": "",
     "error": None,
+    "cancelled": False,
+    "resumed_from": None,  # started_at of the checkpoint being resumed
 }
 
 
+# Stage timings of the running (or most recent) scan_folder call.
+_live_stats: ScanStats | None = None
+
+# Finished scans kept in the scan_reports table.
+SCAN_HISTORY_LIMIT = 20
+
+# scan_folder commits and records a ScanCheckpoint at least this often.
+CHECKPOINT_SECONDS = 5.0
+CHECKPOINT_ID = 1
+_DIR_UPSERT_STMT = sqlite_insert(ScanDirectory.__table__)
+_DIR_UPSERT_STMT = _DIR_UPSERT_STMT.on_conflict_do_update(
+    index_elements=["path"],
+    set_={c: _DIR_UPSERT_STMT.excluded[c] for c in ("mtime", "entry_count", "scanned_at")},
+)
+
+_cancel = threading.Event()
+
+
 def reset_status():
     scan_status["is_scanning"] = False
     scan_status["total"] = 0
+    scan_status["walk_done"] = False
     scan_status["processed"] = 0
     scan_status["current_file"] = ""
     scan_status["error"] = None
+    scan_status["cancelled"] = False
+    scan_status["resumed_from"] = None
+
+
+def request_cancel() -> bool:
+    """Ask the running scan_folder to stop at the next batch boundary."""
+    if not scan_status["is_scanning"]:
+        return False
+    _cancel.set()
+    return True
+
+
+def checkpoint_info(db: Session) -> dict | None:
+    """The interrupted or cancelled scan that can be resumed, if any."""
+    if scan_status["is_scanning"]:
+        return None
+    cp = db.get(ScanCheckpoint, CHECKPOINT_ID)
+    if cp is None:
+        return None
+    return {
+        "mode": cp.mode,
+        "target_folders": json.loads(cp.target_folders) if cp.target_folders else None,
+        "state": cp.state,
+        "started_at": cp.started_at,
+        "updated_at": cp.updated_at,
+        "total": cp.total,
+        "processed": cp.processed,
+        "dirs_done": cp.dirs_done,
+    }
+
+
+def discard_checkpoint(db: Session):
+    """Forget any resumable scan. Does not commit."""
+    db.query(ScanCheckpoint).delete()
+    db.execute(text("DROP TABLE IF EXISTS scan_seen"))
+
+
+def status_payload(db: Session) -> dict:
+    """scan_status plus the per-stage timings of the running (or last) scan
+    and the scan that can be resumed, if any."""
+    stats = _live_stats
+    return {
+        **scan_status,
+        "stats": stats.snapshot() if stats is not None else None,
+        "resumable": checkpoint_info(db),
+    }
+
+
+def scan_history(db: Session, limit: int = SCAN_HISTORY_LIMIT) -> list[dict]:
+    """The most recent scan reports, newest first."""
+    rows = db.query(ScanReport).order_by(ScanReport.id.desc()).limit(limit).all()
+    return [
+        {
+            "id": r.id,
+            "mode": r.mode,
+            "started_at": r.started_at,
+            "finished_at": r.finished_at,
+            "total": r.total,
+            "unchanged": r.unchanged,
+            "written": r.written,
+            "moved": r.moved,
+            "skipped": r.skipped,
+            "removed": r.removed,
+            "error": r.error,
+            "stats": json.loads(r.stats),
+        }
+        for r in rows
+    ]
+
+
+def _save_report(db: Session, report: dict, stats: ScanStats):
+    """Store a finished scan's report and trim the history to SCAN_HISTORY_LIMIT."""
+    try:
+        db.add(ScanReport(
+            finished_at=datetime.now().isoformat(),
+            stats=json.dumps(stats.snapshot()),
+            **report,
+        ))
+        db.flush()
+        keep = db.query(ScanReport.id).order_by(ScanReport.id.desc()).limit(SCAN_HISTORY_LIMIT)
+        db.query(ScanReport).filter(ScanReport.id.not_in(keep.scalar_subquery())).delete(
+            synchronize_session=False
+        )
+        db.commit()
+    except Exception as e:
+        logger.warning("Failed to save scan report: %s", e)
+        db.rollback()
+
+
+def resolve_worker_count(workers: int | None) -> int:
+    """Return the metadata worker count to use (<= 0 / None means one per CPU)."""
+    if workers and workers > 0:
+        return workers
+    return max(1, os.cpu_count() or 1)
+
+
+class MetadataPool:
+    """Bounded worker pool for metadata extraction.
+
+    Pillow decoding is CPU-bound, so images go to worker processes; ffmpeg
+    probes and fingerprint reads spend their time waiting on I/O, so they go
+    to threads. With ``processes=False`` images are decoded on threads too,
+    for small batches where starting processes would cost more than it saves.
+    """
+
+    def __init__(self, workers: int, processes: bool = True):
+        self.workers = workers
+        self._io = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-io")
+        self._images: Optional[Executor] = None
+        if processes and workers > 1:
+            try:
+                self._images = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning("Process pool unavailable, decoding images on threads: %s", e)
+        if self._images is None:
+            self._images = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="scan-decode")
+
+    def submit(self, fpath: str, is_video: bool) -> Future:
+        """Start extraction; the future resolves to (result, seconds)."""
+        if is_video:
+            return self._io.submit(timed, probe_video, fpath)
+        return self._images.submit(timed, read_image_info, fpath)
+
+    def submit_fingerprint(self, fpath: str) -> Future:
+        """Start fingerprinting; the future resolves to (fingerprint, seconds)."""
+        return self._io.submit(timed, file_fingerprint, fpath)
+
+    def shutdown(self):
+        self._io.shutdown(wait=True, cancel_futures=True)
+        self._images.shutdown(wait=True, cancel_futures=True)
+
+
+def _metadata_result(fut: Future, fpath: str, is_video: bool,
+                     stats: ScanStats) -> tuple[tuple, Optional[tuple[str, str]]]:
+    """Return ((width, height, taken_at, duration), error) from a finished extraction job.
+
+    ``error`` is None on success, otherwise (error_class, message) for the
+    failure cache; the metadata fields are then whatever could be read. The
+    job's time is added to the "probe" or "decode" stage of ``stats``.
+    """
+    try:
+        try:
+            result, seconds = fut.result()
+        except BrokenProcessPool:
+            # A worker died (e.g. killed while decoding); redo this one inline.
+            started = time.perf_counter()
+            result = probe_video(fpath) if is_video else read_image_info(fpath)
+            seconds = time.perf_counter() - started
+    except Exception as e:
+        if is_video:
+            raise
+        logger.warning("Failed to open image %s: %s", fpath, e)
+        return (None, None, None, None), (type(e).__name__, str(e))
+    stats.add("probe" if is_video else "decode", seconds, path=clean_path(fpath))
+    if is_video:
+        width, height, duration = result
+        error = None
+        if duration is None:
+            if get_ffmpeg() is None:
+                error = ("FFmpegUnavailable", "ffmpeg not found and container not parseable")
+            else:
+                error = ("UnreadableVideo", "could not determine duration")
+        return (width, height, None, duration), error
+    width, height, taken_at = result
+    return (width, height, taken_at, None), None
+
+
+class CachedRow(NamedTuple):
+    """What change detection needs to know about an existing photos row."""
+    modified_key: int  # _text_key(modified_at)
+    file_size: int
+    id: int
+    has_duration: bool
+    has_fingerprint: bool
+
+
+def _text_key(value: str) -> int:
+    """Stable signed 64-bit hash of a string (fits an array('q') slot)."""
+    digest = hashlib.blake2b(value.encode("utf-8", "surrogatepass"), digest_size=8).digest()
+    return int.from_bytes(digest, "little", signed=True)
+
+
+def _path_key(path: str) -> int:
+    return _text_key(os.path.normcase(path))
+
+
+class _PhotoIndex:
+    """Compact read-only view of existing rows for change detection.
+
+    Holds parallel arrays sorted by the 64-bit hash of the normcase'd path
+    (about 40 bytes per photo) instead of a dict of path strings and tuples.
+    SQLite computes the keys and does the sorting, so building it never
+    materializes the rows in Python.
+    """
+
+    def __init__(self, db: Session, prefixes: list[str] | None = None):
+        self._keys = array("q")
+        self._mtimes = array("q")
+        self._sizes = array("q")
+        self._ids = array("q")
+        self._has_duration = array("b")
+        self._has_fingerprint = array("b")
+
+        dbapi_conn = db.connection().connection.driver_connection
+        dbapi_conn.create_function("scan_path_key", 1, _path_key, deterministic=True)
+        dbapi_conn.create_function("scan_text_key", 1, _text_key, deterministic=True)
+        where, params = "", {}
+        if prefixes is not None:
+            # LIKE narrows to the scanned folders; a superset is harmless here.
+            where = "WHERE " + " OR ".join(f"file_path LIKE :p{i}" for i in range(len(prefixes)))
+            params = {f"p{i}": p + os.sep + "%" for i, p in enumerate(prefixes)}
+        rows = db.execute(text(
+            "SELECT scan_path_key(file_path), scan_text_key(modified_at), file_size, id, "
+            f"duration IS NOT NULL, fingerprint IS NOT NULL FROM photos {where} ORDER BY 1"
+        ), params)
+        for key, mkey, size, pid, has_dur, has_fp in rows:
+            self._keys.append(key)
+            self._mtimes.append(mkey)
+            self._sizes.append(size)
+            self._ids.append(pid)
+            self._has_duration.append(has_dur)
+            self._has_fingerprint.append(has_fp)
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def get(self, clean_file_path: str) -> CachedRow | None:
+        key = _path_key(clean_file_path)
+        i = bisect_left(self._keys, key)
+        if i == len(self._keys) or self._keys[i] != key:
+            return None
+        return CachedRow(self._mtimes[i], self._sizes[i], self._ids[i],
+                         bool(self._has_duration[i]), bool(self._has_fingerprint[i]))
+
+
+class _SeenPaths:
+    """Paths seen by a walk, staged in the scan_seen table for deletion detection.
+
+    The anti-join in missing() runs inside SQLite instead of holding a Python
+    set of every path. The table outlives the process, so a resumed scan
+    (see ScanCheckpoint) keeps the paths seen before the interruption; it is
+    emptied when a new scan starts and dropped when one finishes.
+    """
+
+    _FLUSH_EVERY = 5000
+
+    def __init__(self, engine, resume_stamp: str | None = None):
+        """With ``resume_stamp``, keep only the paths in directories that the
+        interrupted scan finished (ScanDirectory rows stamped with it)."""
+        self._conn = engine.connect()
+        # Match os.path.normcase: paths compare case-insensitively on Windows.
+        collate = " COLLATE NOCASE" if sys.platform == "win32" else ""
+        self._conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS scan_seen (path TEXT PRIMARY KEY{collate})"
+        ))
+        if resume_stamp is None:
+            self._conn.execute(text("DELETE FROM scan_seen"))
+        else:
+            self._conn.connection.driver_connection.create_function(
+                "scan_dir_key", 1, lambda p: os.path.normcase(os.path.dirname(p)),
+                deterministic=True,
+            )
+            self._conn.execute(text(
+                "DELETE FROM scan_seen WHERE scan_dir_key(path) NOT IN "
+                "(SELECT path FROM scan_directories WHERE scanned_at = :stamp)"
+            ), {"stamp": resume_stamp})
+        self._conn.commit()
+        self._buffer: list[dict] = []
+
+    def add(self, clean_file_path: str):
+        self._buffer.append({"path": clean_file_path})
+        if len(self._buffer) >= self._FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        if self._buffer:
+            self._conn.execute(
+                text("INSERT OR IGNORE INTO scan_seen (path) VALUES (:path)"), self._buffer
+            )
+            self._conn.commit()
+            self._buffer = []
+
+    def missing(self, prefixes: list[str] | None = None) -> Iterator[tuple[int, str]]:
+        """Yield (id, file_path) of photos rows whose path was not seen.
+
+        With ``prefixes``, only rows LIKE-matching those folders are returned;
+        callers still verify the prefix exactly.
+        """
+        self.flush()
+        where, params = "", {}
+        if prefixes is not None:
+            where = "AND (" + " OR ".join(
+                f"p.file_path LIKE :p{i}" for i in range(len(prefixes))
+            ) + ")"
+            params = {f"p{i}": p + os.sep + "%" for i, p in enumerate(prefixes)}
+        yield from self._conn.execute(text(
+            "SELECT p.id, p.file_path FROM photos p WHERE NOT EXISTS "
+            f"(SELECT 1 FROM scan_seen s WHERE s.path = p.file_path) {where}"
+        ), params)
+
+    def close(self, keep: bool = False):
+        """Release the connection; ``keep`` leaves the table for a later resume."""
+        try:
+            if keep:
+                self.flush()
+            else:
+                self._conn.execute(text("DROP TABLE IF EXISTS scan_seen"))
+                self._conn.commit()
+        finally:
+            self._conn.close()
+
+
+class _Job:
+    """One file moving through the writer: fingerprint, then (maybe) metadata."""
+
+    __slots__ = ("seq", "fut", "stage", "entry", "fname", "ext", "is_video", "cached",
+                 "fingerprint")
+
+    def __init__(self, seq: int, entry: FileEntry, fname: str, ext: str, is_video: bool,
+                 cached: CachedRow | None):
+        self.seq = seq
+        self.fut: Optional[Future] = None
+        self.stage = ""
+        self.entry = entry
+        self.fname = fname
+        self.ext = ext
+        self.is_video = is_video
+        self.cached = cached
+        self.fingerprint: Optional[str] = None
+
+
+class _IndexWriter:
+    """The single DB writer shared by scan_folder and sync_paths.
+
+    Files offered with an unchanged cached row are only counted (and get a
+    fingerprint backfilled if they lack one). New or modified files are
+    fingerprinted first; a new file whose fingerprint matches a row whose file
+    has vanished is a move, and that row is repointed at the new path without
+    re-extracting anything. Everything else has its metadata extracted on a
+    MetadataPool. Results are buffered and written _WRITE_BATCH rows per
+    transaction with executemany (see _flush).
+    """
+
+    def __init__(self, db: Session, workers: int | None = None, status: dict | None = None,
+                 stats: ScanStats | None = None, processes: bool = True):
+        self.db = db
+        self.status = status
+        self.stats = stats or ScanStats()
+        self.now = datetime.now().isoformat()
+        self.written = 0
+        self.skipped = 0
+        self.unchanged = 0
+        # Number of offer() calls so far; see committed().
+        self.offered = 0
+        # Rows repointed at a new path by move detection.
+        self.moved_ids: set[int] = set()
+        self.failures = FailureCache(db)
+        # Sorted _text_key()s of the fingerprints already in the table, loaded
+        # on first use so most new files need no query to rule out a move.
+        self._known_fingerprints: array | None = None
+        worker_count = resolve_worker_count(workers)
+        self._max_in_flight = worker_count * _IN_FLIGHT_PER_WORKER
+        self._pool = MetadataPool(worker_count, processes)
+        # Jobs submitted to the pool, applied in submission order.
+        self._pending: deque[_Job] = deque()
+        self._ffmpeg_resolved = False
+        # Rows waiting for the next _flush(), as (fpath, params) pairs.
+        self._moves: list[tuple[str, dict]] = []
+        self._inserts: list[tuple[str, dict]] = []
+        self._updates: list[tuple[str, dict]] = []
+        self._fingerprints: list[tuple[str, dict]] = []
+
+    def _progress(self, fpath: str | None = None):
+        if self.status is not None:
+            self.status["processed"] += 1
+            if fpath:
+                self.status["current_file"] = os.path.basename(fpath)
+
+    def offer(self, entry: FileEntry, cached: CachedRow | None):
+        """Queue ``entry`` for writing unless its cached row is still current.
+
+        ``cached`` describes the existing row for this path, if any.
+        """
+        fname = os.path.basename(entry.path)
+        ext = os.path.splitext(fname)[1].lower().lstrip(".")
+        is_video = is_video_extension(ext)
+        job = _Job(self.offered, entry, fname, ext, is_video, cached)
+        self.offered += 1
+
+        modified_at = datetime.fromtimestamp(entry.mtime).isoformat()
+        if cached:
+            if cached.modified_key == _text_key(modified_at) and cached.file_size == entry.size:
+                # Re-probe videos that are missing duration (e.g. scanned before
+                # video metadata support existed), unless that already failed
+                # for this version of the file and its retry is not due yet.
+                metadata_complete = (
+                    (not is_video) or cached.has_duration
+                    or self.failures.backing_off(clean_path(entry.path), modified_at, entry.size)
+                )
+            else:
+                metadata_complete = False
+            if metadata_complete:
+                # Unchanged — skip entirely (no DB query needed)
+                if cached.has_fingerprint:
+                    self.unchanged += 1
+                    self._progress()
+                    return
+                self._submit(job, "backfill")
+                return
+        if self.failures.backing_off(clean_path(entry.path), modified_at, entry.size):
+            # This version could not be read or written last time; wait for its retry.
+            self.skipped += 1
+            self._progress()
+            return
+
+        self._submit(job, "fingerprint")
+
+    def _submit(self, job: _Job, stage: str):
+        self._start(job, stage)
+        self._drain(self._max_in_flight)
+
+    def _start(self, job: _Job, stage: str):
+        job.stage = stage
+        if stage == "metadata":
+            if job.is_video and not self._ffmpeg_resolved:
+                get_ffmpeg()  # resolve once before the probe threads race for it
+                self._ffmpeg_resolved = True
+            # Videos can't be opened by Pillow — they are probed with ffmpeg.
+            job.fut = self._pool.submit(job.entry.path, job.is_video)
+        else:
+            job.fut = self._pool.submit_fingerprint(job.entry.path)
+        self._pending.append(job)
+
+    def _drain(self, keep: int):
+        """Apply finished results from the head of the queue.
+
+        Blocks on the oldest job while more than ``keep`` are in flight. A
+        fingerprinted job that still needs metadata is resubmitted at the tail.
+        """
+        pending = self._pending
+        while pending and (len(pending) > keep or pending[0].fut.done()):
+            job = pending.popleft()
+            entry = job.entry
+            try:
+                if job.stage == "metadata":
+                    meta, error = _metadata_result(job.fut, entry.path, job.is_video, self.stats)
+                    self._progress(entry.path)
+                    if error:
+                        self._record_failure(entry, *error)
+                        if not job.is_video:
+                            # Nothing was read. Leave the row (and its size and
+                            # mtime) as it was, so the file still looks new or
+                            # changed and is retried once its backoff ends.
+                            self.skipped += 1
+                            continue
+                    else:
+                        self.failures.clear(clean_path(entry.path))
+                    self.written += 1
+                    self._apply(job, meta)
+                    continue
+
+                job.fingerprint, seconds = job.fut.result()
+                self.stats.add("fingerprint", seconds, path=clean_path(entry.path))
+                if job.stage == "backfill":
+                    self._progress()
+                    self.unchanged += 1
+                    self._fingerprints.append(
+                        (entry.path, {"_id": job.cached.id, "fingerprint": job.fingerprint})
+                    )
+                    self._maybe_flush()
+                    continue
+
+                moved_id = None
+                if not job.cached:
+                    started = time.perf_counter()
+                    moved_id = self._claim_moved(job.fingerprint)
+                    self.stats.add("move_check", time.perf_counter() - started)
+                if moved_id is None:
+                    self._start(job, "metadata")
+                    continue
+                self._progress(entry.path)
+                self.written += 1
+                self.moved_ids.add(moved_id)
+                self._moves.append((entry.path, {
+                    "_id": moved_id,
+                    "file_path": clean_path(entry.path),
+                    "file_name": job.fname,
+                    "extension": job.ext,
+                    "file_size": entry.size,
+                    "modified_at": datetime.fromtimestamp(entry.mtime).isoformat(),
+                    "scanned_at": self.now,
+                }))
+                self._maybe_flush()
+            except Exception as e:
+                self._progress(entry.path)
+                self.skipped += 1
+                self._record_failure(entry, type(e).__name__, str(e))
+                logger.warning("Skipped %s: %s", entry.path, e)
+
+    def _record_failure(self, entry: FileEntry, error_class: str, message: str):
+        self.failures.record(clean_path(entry.path),
+                             datetime.fromtimestamp(entry.mtime).isoformat(), entry.size,
+                             error_class, message)
+
+    def _claim_moved(self, fingerprint: str) -> Optional[int]:
+        """Return the id of a row with this fingerprint whose file is gone, if any."""
+        if self._known_fingerprints is None:
+            keys = sorted(
+                _text_key(fp) for (fp,) in
+                self.db.query(Photo.fingerprint).filter(Photo.fingerprint.isnot(None))
+            )
+            self._known_fingerprints = array("q", keys)
+        known = self._known_fingerprints
+        key = _text_key(fingerprint)
+        i = bisect_left(known, key)
+        if i == len(known) or known[i] != key:
+            return None
+        candidates = self.db.query(Photo.id, Photo.file_path).filter(
+            Photo.fingerprint == fingerprint
+        ).all()
+        for pid, path in candidates:
+            if pid in self.moved_ids or os.path.exists(long_path(path)):
+                continue
+            return pid
+        return None
+
+    def _apply(self, job: _Job, meta: tuple):
+        entry, cached = job.entry, job.cached
+        width, height, taken_at, duration = meta
+        row = {
+            "file_size": entry.size,
+            "modified_at": datetime.fromtimestamp(entry.mtime).isoformat(),
+            "width": width,
+            "height": height,
+            "duration": duration,
+            "taken_at": taken_at,
+            "scanned_at": self.now,
+            "fingerprint": job.fingerprint,
+            "placeholder": None,  # made with the thumbnails
+        }
+        if cached:
+            # Modified — update existing record.
+            row["_id"] = cached.id
+            self._updates.append((entry.path, row))
+        else:
+            # New photo
+            row.update({
+                # Store clean path (without \\?\ prefix) in DB
+                "file_path": clean_path(entry.path),
+                "file_name": job.fname,
+                "extension": job.ext,
+                "created_at": datetime.fromtimestamp(entry.ctime).isoformat(),
+                "is_favorite": 0,
+                "thumbnail_path": None,
+            })
+            self._inserts.append((entry.path, row))
+        self._maybe_flush()
+
+    def committed(self) -> int:
+        """Write everything buffered and return how many offers are fully committed.
+
+        Offers are numbered from 0 in offer() order; every offer numbered
+        below the returned value has been applied and written.
+        """
+        self._flush()
+        return min((job.seq for job in self._pending), default=self.offered)
+
+    def _maybe_flush(self):
+        buffered = (len(self._moves) + len(self._inserts) + len(self._updates)
+                    + len(self._fingerprints))
+        if buffered >= _WRITE_BATCH:
+            self._flush()
+
+    def _flush(self):
+        """Write buffered rows: one executemany per statement, one transaction.
+
+        If the batch fails, it is retried row by row (each in its own
+        savepoint) so a single bad row is skipped instead of the whole batch.
+        """
+        # Moves go first so a path vacated by a move can be reused by an insert.
+        batches = [
+            (_MOVE_STMT, self._moves),
+            (_INSERT_STMT, self._inserts),
+            (_UPDATE_STMT, self._updates),
+            (_FINGERPRINT_STMT, self._fingerprints),
+        ]
+        # Photos whose file changed: their cached thumbnails are stale.
+        changed_ids = [row["_id"] for _, row in self._updates]
+        self._moves, self._inserts, self._updates, self._fingerprints = [], [], [], []
+        if not any(rows for _, rows in batches):
+            self._flush_failures()
+            return
+        db = self.db
+        started = time.perf_counter()
+        try:
+            for stmt, rows in batches:
+                if rows:
+                    db.execute(stmt, [row for _, row in rows])
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            logger.warning("Batch write failed, retrying row by row: %s", getattr(e, "orig", e))
+            for stmt, rows in batches:
+                for fpath, row in rows:
+                    try:
+                        with db.begin_nested():
+                            db.execute(stmt, [row])
+                    except Exception as row_error:
+                        cause = getattr(row_error, "orig", row_error)
+                        if stmt is not _FINGERPRINT_STMT:
+                            self.skipped += 1
+                            self.written -= 1
+                            self.failures.record(clean_path(fpath), row["modified_at"],
+                                                 row["file_size"], type(cause).__name__, str(cause))
+                        logger.warning("Skipped %s: %s", fpath, cause)
+            db.commit()
+        if changed_ids:
+            discard_thumbnails(changed_ids)
+        self.stats.add("write", time.perf_counter() - started, sum(len(rows) for _, rows in batches))
+        self._flush_failures()
+
+    def _flush_failures(self):
+        try:
+            self.failures.flush(self.db)
+            self.db.commit()
+        except Exception as e:
+            logger.warning("Failed to save scan failures: %s", getattr(e, "orig", e))
+            self.db.rollback()
+
+    def close(self):
+        """Apply every outstanding result, stop the pool and write the rest."""
+        try:
+            self._drain(0)
+        finally:
+            self._pool.shutdown()
+        try:
+            self._flush()
+        except Exception as e:
+            logger.warning("Final commit failed, rolling back: %s", e)
+            self.db.rollback()
+
+
+def _within(norm_path: str, prefixes: list[str]) -> bool:
+    for prefix in prefixes:
+        if norm_path == prefix or norm_path.startswith(prefix + os.sep):
+            return True
+    return False
+
+
+def clear_dir_index(db: Session, folders: list[str] | None = None):
+    """Forget recorded directory listings (all, or those within ``folders``).
+
+    Must be called whenever photo rows are deleted outside of a scan, otherwise
+    a quick rescan would treat those directories as unchanged and never
+    re-add their files. Does not commit.
+    """
+    if folders is None:
+        db.query(ScanDirectory).delete(synchronize_session=False)
+        return
+    prefixes = [dir_key(os.path.normpath(f)) for f in folders]
+    keys = [k for (k,) in db.query(ScanDirectory.path).all() if _within(k, prefixes)]
+    for i in range(0, len(keys), 500):
+        db.query(ScanDirectory).filter(
+            ScanDirectory.path.in_(keys[i:i + 500])
+        ).delete(synchronize_session=False)
+
+
+def _row_lookup(rows) -> dict[str, CachedRow]:
+    """Map (id, file_path, modified_at, file_size, duration, fingerprint) rows by normcase'd path."""
+    return {
+        os.path.normcase(fp): CachedRow(_text_key(mat), fsz, pid, dur is not None, fpr is not None)
+        for pid, fp, mat, fsz, dur, fpr in rows
+    }
+
+
+def _lookup_columns(db: Session):
+    return db.query(Photo.id, Photo.file_path, Photo.modified_at, Photo.file_size,
+                    Photo.duration, Photo.fingerprint)
+
+
+def _rows_under(db: Session, folder: str, recursive: bool = True) -> dict:
+    """Existing rows for files inside ``folder`` (a clean, normpath'd path).
+
+    LIKE only narrows the candidates (``_`` and ``%`` in folder names act as
+    wildcards); the prefix is then checked exactly on normalized paths.
+    """
+    prefix = os.path.normcase(folder)
+    rows = _lookup_columns(db).filter(Photo.file_path.like(folder + os.sep + "%")).all()
+    lookup = _row_lookup(rows)
+    if recursive:
+        return {k: v for k, v in lookup.items() if k.startswith(prefix + os.sep)}
+    return {k: v for k, v in lookup.items() if os.path.dirname(k) == prefix}
+
+
+def _rows_for(db: Session, paths: list[str]) -> dict:
+    """Existing rows for the given clean file paths."""
+    lookup: dict = {}
+    for i in range(0, len(paths), 500):
+        lookup.update(_row_lookup(
+            _lookup_columns(db).filter(Photo.file_path.in_(paths[i:i + 500])).all()
+        ))
+    return lookup
+
+
+def sync_paths(db: Session, root_folder: str, extensions: set[str],
+               excluded_folders: set[str] | None, paths: Iterable[str],
+               shallow_dirs: Iterable[str] = (), workers: int | None = None) -> dict | None:
+    """Apply a batch of filesystem changes without walking the whole library.
+
+    Each of ``paths`` is re-synced from what is on disk now: a file is
+    inserted or updated, a directory is walked, and a path that no longer
+    exists has its row (and any rows below it) removed. ``shallow_dirs`` are
+    directories whose immediate children changed; only their direct files are
+    compared. Paths outside root_folder or inside excluded folders are ignored.
+
+    Uses the same writer as scan_folder. Returns None without doing anything
+    if a scan currently holds the index, otherwise a dict of counts.
+    """
+    if not index_lock.acquire(blocking=False):
+        return None
+    try:
+        root = os.path.normcase(os.path.normpath(root_folder))
+        excluded = [os.path.normcase(os.path.normpath(f)) for f in (excluded_folders or set())]
+
+        def _relevant(norm: str) -> bool:
+            return _within(norm, [root]) and not _within(norm, excluded)
+
+        files: list[str] = []
+        walk_dirs: list[str] = []
+        gone: list[str] = []
+        for p in set(paths):
+            p = os.path.normpath(clean_path(p))
+            if not _relevant(os.path.normcase(p)):
+                continue
+            lp = long_path(p)
+            if os.path.isdir(lp):
+                walk_dirs.append(p)
+            elif os.path.isfile(lp):
+                ext = os.path.splitext(p)[1].lower().lstrip(".")
+                if ext in extensions and not os.path.basename(p).startswith("._"):
+                    files.append(p)
+                else:
+                    gone.append(p)
+            else:
+                gone.append(p)
+
+        shallow = [
+            os.path.normpath(clean_path(d)) for d in set(shallow_dirs)
+            if _relevant(os.path.normcase(os.path.normpath(clean_path(d))))
+        ]
+        for d in shallow:
+            try:
+                with os.scandir(long_path(d)) as it:
+                    for entry in it:
+                        name = entry.name
+                        if name.startswith("._") or not entry.is_file():
+                            continue
+                        if os.path.splitext(name)[1].lower().lstrip(".") in extensions:
+                            files.append(os.path.join(d, name))
+            except OSError as e:
+                logger.warning("Cannot access directory: %s", e)
+
+        # Coalesce: anything inside a directory being walked is covered by the walk.
+        walk_norm = sorted({os.path.normcase(d): d for d in walk_dirs}.items())
+        walk_dirs, kept = [], []
+        for norm, d in walk_norm:
+            if not _within(norm, kept):
+                kept.append(norm)
+                walk_dirs.append(d)
+        files = [f for f in dict.fromkeys(files) if not _within(os.path.normcase(f), kept)]
+
+        # Existing rows that may be affected, and which of them are still present.
+        lookup = _rows_for(db, files)
+        removable: dict = {}
+        for d in walk_dirs + gone:
+            removable.update(_rows_under(db, d))
+        for d in shallow:
+            removable.update(_rows_under(db, d, recursive=False))
+        lookup.update(removable)
+        removable.update(_rows_for(db, gone))
+        seen: set[str] = set()
+
+        excluded_set = set(excluded)
+        # Watcher batches are usually a handful of files: decode them on
+        # threads rather than start a process pool each time.
+        writer = _IndexWriter(db, workers, processes=False)
+        try:
+            for p in files:
+                try:
+                    st = os.stat(long_path(p))
+                except OSError as e:
+                    logger.warning("Skipped %s: %s", p, e)
+                    continue
+                norm = os.path.normcase(p)
+                seen.add(norm)
+                writer.offer(FileEntry(long_path(p), st.st_size, st.st_mtime, st.st_ctime),
+                             lookup.get(norm))
+            if walk_dirs:
+                for entry in walk_media([long_path(d) for d in walk_dirs], extensions, excluded_set):
+                    norm = os.path.normcase(clean_path(entry.path))
+                    seen.add(norm)
+                    writer.offer(entry, lookup.get(norm))
+            if gone:
+                gone_norm = [os.path.normcase(g) for g in gone]
+                writer.failures.prune_missing(lambda key: _within(key, gone_norm))
+        finally:
+            writer.close()
+
+        removed_ids = [
+            row.id for norm, row in removable.items()
+            if norm not in seen and row.id not in writer.moved_ids
+        ]
+        for i in range(0, len(removed_ids), 500):
+            db.query(Photo).filter(
+                Photo.id.in_(removed_ids[i:i + 500])
+            ).delete(synchronize_session=False)
+        if removed_ids:
+            db.commit()
+            discard_thumbnails(removed_ids)
+
+        return {
+            "updated": writer.written,
+            "moved": len(writer.moved_ids),
+            "unchanged": writer.unchanged,
+            "skipped": writer.skipped,
+            "removed": len(removed_ids),
+        }
+    finally:
+        index_lock.release()
+
+
+def _save_dir_index(db: Session, listings: list[tuple[str, float, int, bool]],
+                    target_prefixes: list[str] | None, now: str):
+    """Replace the recorded listings in the scanned scope with this walk's."""
+    clear_dir_index(db, target_prefixes)
+    rows = [
+        {"path": key, "mtime": mtime, "entry_count": count, "scanned_at": now}
+        for key, mtime, count, _ in listings
+    ]
+    for i in range(0, len(rows), 500):
+        db.execute(ScanDirectory.__table__.insert(), rows[i:i + 500])
 
 
 def scan_folder(root_folder: str, extensions: set[str], db: Session,
                 excluded_folders: set[str] | None = None,
-                target_folders: list[str] | None = None):
+                target_folders: list[str] | None = None,
+                workers: int | None = None,
+                quick: bool = False,
+                resume: bool = False):
+    """Index media under root_folder (or only target_folders) into the photos table.
+
+    Runs as a pipeline: walk_media lists directories on its own thread pool
+    and streams (path, size, mtime, ctime) entries to the calling thread,
+    which compares them against the DB; metadata for new or modified files is
+    extracted on a MetadataPool of ``workers`` workers, and the calling thread
+    applies the results to the database in walk order as the single writer.
+
+    With ``quick``, directories whose mtime and entry count match the
+    ScanDirectory index are not re-examined: their files are neither statted
+    nor checked for in-place edits, which only a full (verify) scan catches.
+
+    Progress is checkpointed every CHECKPOINT_SECONDS (see ScanCheckpoint).
+    With ``resume``, an interrupted or cancelled scan continues where it
+    stopped, with the mode and target folders it was started with; otherwise
+    any old checkpoint is discarded. request_cancel() stops the scan once the
+    files already handed to the writer are committed.
+
+    Per-stage timings are collected in a ScanStats (live via status_payload)
+    and stored as a ScanReport when the scan ends.
+    """
+    global _live_stats
     reset_status()
     scan_status["is_scanning"] = True
+    index_lock.acquire()
+    _cancel.clear()
+    stats = _live_stats = ScanStats()
+
+    checkpoint = None
+    if resume:
+        try:
+            checkpoint = db.get(ScanCheckpoint, CHECKPOINT_ID)
+        except Exception as e:
+            logger.warning("Cannot load scan checkpoint: %s", e)
+    if checkpoint is not None:
+        quick = checkpoint.mode == "quick"
+        target_folders = json.loads(checkpoint.target_folders) if checkpoint.target_folders else None
+        scan_status["resumed_from"] = checkpoint.started_at
+    report = {
+        "mode": "partial" if target_folders is not None else ("quick" if quick else "full"),
+        "started_at": datetime.now().isoformat(),
+    }
 
     excluded_normalized = {
         os.path.normcase(os.path.normpath(f)) for f in (excluded_folders or set())
@@ -54,10 +1025,7 @@ def scan_folder(root_folder: str, extensions: set[str], db: Session,
         """Check if a path falls within any of the target folders."""
         if target_prefixes is None:
             return True
-        for prefix in target_prefixes:
-            if normcase_path == prefix or normcase_path.startswith(prefix + os.sep):
-                return True
-        return False
+        return _within(normcase_path, target_prefixes)
 
     try:
         long_root = long_path(root_folder)
@@ -66,179 +1034,210 @@ def scan_folder(root_folder: str, extensions: set[str], db: Session,
             scan_status["is_scanning"] = False
             return
 
-        # Pre-build lookup of existing DB records: {normcase_path: (modified_at, file_size, id, duration)}
-        all_db_photos = db.query(
-            Photo.id, Photo.file_path, Photo.modified_at, Photo.file_size, Photo.duration
-        ).all()
-        db_lookup: dict[str, tuple[str, int, int, float | None]] = {}
-        for pid, fp, mat, fsz, dur in all_db_photos:
-            norm = os.path.normcase(fp)
-            if _is_in_target(norm):
-                db_lookup[norm] = (mat, fsz, pid, dur)
-
-        # Collect all image files (use long path prefix for Windows long filename support)
-        image_files: list[str] = []
-
-        def _walk_error(err: OSError):
-            logger.warning("Cannot access directory: %s", err)
+        resuming = checkpoint is not None
+        if resuming:
+            checkpoint.state = "running"
+        else:
+            discard_checkpoint(db)
+            started_at = datetime.now().isoformat()
+            checkpoint = ScanCheckpoint(
+                id=CHECKPOINT_ID,
+                mode="quick" if quick else "full",
+                target_folders=json.dumps(target_folders) if target_folders is not None else None,
+                state="running",
+                started_at=started_at,
+                updated_at=started_at,
+            )
+            db.add(checkpoint)
+        db.commit()
+        # Directories finished by this scan (before an interruption, too) are
+        # stamped with this in the ScanDirectory index.
+        stamp = checkpoint.started_at
 
-        def _filter_and_collect(walker):
-            for dirpath, dirnames, filenames in walker:
-                try:
-                    dirnames[:] = [
-                        d for d in dirnames
-                        if os.path.normcase(os.path.normpath(
-                            clean_path(os.path.join(dirpath, d))
-                        ))
-                        not in excluded_normalized
-                    ]
-                except Exception as e:
-                    logger.warning("Error filtering dirs in %s: %s", dirpath, e)
-                for fname in filenames:
-                    if fname.startswith("._"):
-                        continue
-                    ext = os.path.splitext(fname)[1].lower().lstrip(".")
-                    if ext in extensions:
-                        image_files.append(os.path.join(dirpath, fname))
+        # Existing rows in the scanned scope, for change detection.
+        like_prefixes = None
+        if target_folders is not None:
+            like_prefixes = [os.path.normpath(f) for f in target_folders]
+        started = time.perf_counter()
+        db_index = _PhotoIndex(db, like_prefixes)
+        stats.add("index", time.perf_counter() - started, len(db_index))
 
+        # Walk with the long path prefix for Windows long filename support
         if target_prefixes is not None:
             # Walk only the specified target folders
-            for tf in target_folders:
-                long_tf = long_path(tf)
-                if not os.path.isdir(long_tf):
-                    continue
-                _filter_and_collect(os.walk(long_tf, onerror=_walk_error))
+            walk_roots = [long_path(tf) for tf in target_folders]
+            walk_roots = [r for r in walk_roots if os.path.isdir(r)]
         else:
             # Full scan: walk the entire root
-            _filter_and_collect(os.walk(long_root, onerror=_walk_error))
+            walk_roots = [long_root]
 
-        scan_status["total"] = len(image_files)
-        logger.info("Scan started: %d files found in %s", len(image_files), root_folder)
+        # Directory listings seen by this walk: (key, mtime, entry_count, unchanged)
+        listings: list[tuple[str, float, int, bool]] = []
+        dir_meta: dict[str, tuple[float, int]] = {}
+        known_dirs: dict[str, tuple[float, int]] | None = None
+        # Directories completed before this scan was interrupted.
+        resumed_dirs: set[str] = set()
+        if quick or resuming:
+            known_dirs = {}
+            for key, mtime, count, scanned_at in db.query(
+                ScanDirectory.path, ScanDirectory.mtime, ScanDirectory.entry_count,
+                ScanDirectory.scanned_at,
+            ):
+                if not _is_in_target(key):
+                    continue
+                if resuming and scanned_at == stamp:
+                    resumed_dirs.add(key)
+                elif not quick:
+                    continue
+                known_dirs[key] = (mtime, count)
 
-        # Track existing paths for deletion detection
-        existing_paths = set()
+        logger.info("Scan %s in %s (%s)", "resumed" if resuming else "started",
+                    root_folder, "quick" if quick else "full")
 
-        now = datetime.now().isoformat()
-        skipped = 0
-        unchanged = 0
+        def _record_dir(key: str, mtime: float, count: int, dir_unchanged: bool):
+            listings.append((key, mtime, count, dir_unchanged))  # list.append is thread-safe
+            dir_meta[key] = (mtime, count)
 
-        for i, fpath in enumerate(image_files):
-            fpath = os.path.normpath(fpath)
-            # Store clean path (without \\?\ prefix) in DB
-            db_path = clean_path(fpath)
-            scan_status["processed"] = i + 1
-            scan_status["current_file"] = os.path.basename(fpath)
+        # (offers made when the directory's last file was offered, key)
+        done_dirs: list[tuple[int, str]] = []
 
-            norm_key = os.path.normcase(db_path)
-            existing_paths.add(norm_key)
+        def _dir_done(key: str):
+            done_dirs.append((writer.offered, key))
 
-            fname = os.path.basename(fpath)
-            ext = os.path.splitext(fname)[1].lower().lstrip(".")
-            is_video = is_video_extension(ext)
+        def _save_checkpoint():
+            committed = writer.committed()
+            seen.flush()
+            ready = [key for offered, key in done_dirs if offered <= committed]
+            done_dirs[:] = [(offered, key) for offered, key in done_dirs if offered > committed]
+            if ready:
+                db.execute(_DIR_UPSERT_STMT, [
+                    {"path": key, "mtime": dir_meta[key][0], "entry_count": dir_meta[key][1],
+                     "scanned_at": stamp}
+                    for key in ready
+                ])
+            checkpoint.dirs_done += len(ready)
+            checkpoint.total = scan_status["total"]
+            checkpoint.processed = scan_status["processed"]
+            checkpoint.updated_at = datetime.now().isoformat()
+            db.commit()
 
+        # Track seen paths for deletion detection
+        seen = _SeenPaths(db.get_bind(), resume_stamp=stamp if resuming else None)
+        finished = cancelled = False
+        try:
+            writer = _IndexWriter(db, workers, status=scan_status, stats=stats)
             try:
-                stat = os.stat(fpath)
-                file_size = stat.st_size
-                modified_at = datetime.fromtimestamp(stat.st_mtime).isoformat()
-
-                cached = db_lookup.get(norm_key)
-
-                if cached:
-                    cached_mat, cached_fsz, cached_id, cached_dur = cached
-                    # Re-probe videos that are missing duration (e.g. scanned before
-                    # video metadata support existed), even if otherwise unchanged.
-                    metadata_complete = (not is_video) or (cached_dur is not None)
-                    if cached_mat == modified_at and cached_fsz == file_size and metadata_complete:
-                        # Unchanged — skip entirely (no DB query needed)
-                        unchanged += 1
-                        continue
-
-                # Extract metadata (only for new or modified files).
-                # Videos can't be opened by Pillow — probe with ffmpeg instead.
-                if is_video:
-                    width, height, duration = probe_video(fpath)
-                    taken_at = None
-                else:
-                    width, height, taken_at = extract_image_info(fpath)
-                    duration = None
-
-                if cached:
-                    # Modified — update existing record.
-                    db.query(Photo).filter(Photo.id == cached_id).update({
-                        "file_size": file_size,
-                        "modified_at": modified_at,
-                        "width": width,
-                        "height": height,
-                        "duration": duration,
-                        "taken_at": taken_at,
-                        "scanned_at": now,
-                    })
-                else:
-                    # New photo
-                    created_at = datetime.fromtimestamp(stat.st_ctime).isoformat()
-
-                    photo = Photo(
-                        file_path=db_path,
-                        file_name=fname,
-                        extension=ext,
-                        file_size=file_size,
-                        width=width,
-                        height=height,
-                        duration=duration,
-                        created_at=created_at,
-                        modified_at=modified_at,
-                        taken_at=taken_at,
-                        is_favorite=0,
-                        thumbnail_path=None,
-                        scanned_at=now,
-                    )
-                    db.add(photo)
-
-                # Commit in batches
-                if (i + 1) % 100 == 0:
-                    try:
-                        db.commit()
-                    except Exception as e:
-                        logger.warning("Batch commit failed at %d, rolling back: %s", i + 1, e)
-                        db.rollback()
+                last_checkpoint = time.monotonic()
+                for entry in walk_media(walk_roots, extensions, excluded_normalized,
+                                        known_dirs=known_dirs, on_dir=_record_dir,
+                                        stats=stats, on_dir_done=_dir_done):
+                    scan_status["total"] += 1
+                    db_path = clean_path(entry.path)
+                    seen.add(db_path)
+                    writer.offer(entry, db_index.get(db_path))
+                    if _cancel.is_set():
+                        cancelled = True
+                        break
+                    if time.monotonic() - last_checkpoint >= CHECKPOINT_SECONDS:
+                        _save_checkpoint()
+                        last_checkpoint = time.monotonic()
+                if not cancelled:
+                    scan_status["walk_done"] = True
+                    writer.failures.prune_missing(_is_in_target)
+            finally:
+                writer.close()
+            del db_index
+            _save_checkpoint()
+            unchanged, skipped = writer.unchanged, writer.skipped
+            moved = len(writer.moved_ids)
 
-            except Exception as e:
-                skipped += 1
-                logger.warning("Skipped %s: %s", fpath, e)
-                try:
-                    db.rollback()
-                except Exception:
-                    pass
-                continue
-
-        try:
-            db.commit()
-        except Exception as e:
-            logger.warning("Final commit failed, rolling back: %s", e)
-            db.rollback()
+            if cancelled:
+                checkpoint.state = "cancelled"
+                db.commit()
+                scan_status["cancelled"] = True
+                logger.info("Scan cancelled after %d files; %d directories checkpointed",
+                            scan_status["processed"], checkpoint.dirs_done)
+                report.update(total=scan_status["total"], unchanged=unchanged,
+                              written=scan_status["total"] - unchanged - skipped - moved,
+                              moved=moved, skipped=skipped)
+                return
 
-        # Remove photos whose files no longer exist on disk
-        # When target_folders is set, only consider photos within those folders
-        removed_ids = [
-            pid for norm_path, (_, _, pid, _) in db_lookup.items()
-            if norm_path not in existing_paths and _is_in_target(norm_path)
-        ]
+            # Remove photos whose files no longer exist on disk
+            # When target_folders is set, only consider photos within those folders.
+            # Files in directories a quick scan skipped were not listed, so keep them.
+            # Directories finished before a resume were listed back then (their
+            # paths are still in scan_seen), so rows there are checked on disk:
+            # the watcher may have added files since, and a directory that
+            # changed in the meantime may have lost some.
+            skipped_dirs = {
+                key for key, _, _, dir_unchanged in listings
+                if dir_unchanged and key not in resumed_dirs
+            }
+            removed_ids = []
+            for pid, fp in seen.missing(like_prefixes):
+                norm_path = os.path.normcase(fp)
+                parent = os.path.dirname(norm_path)
+                if not _is_in_target(norm_path) or parent in skipped_dirs:
+                    continue
+                if parent in resumed_dirs and os.path.exists(long_path(fp)):
+                    continue
+                removed_ids.append(pid)
+            relisted = [key for key, _, _, dir_unchanged in listings
+                        if not dir_unchanged and key in resumed_dirs]
+            for key in relisted:
+                for norm_path, row in _rows_under(db, key, recursive=False).items():
+                    if not os.path.exists(long_path(norm_path)):
+                        removed_ids.append(row.id)
+            removed_ids = list(dict.fromkeys(removed_ids))
+            finished = True
+        finally:
+            seen.close(keep=not finished)
         if removed_ids:
+            started = time.perf_counter()
             try:
-                db.query(Photo).filter(Photo.id.in_(removed_ids)).delete(synchronize_session=False)
+                for i in range(0, len(removed_ids), 500):
+                    db.query(Photo).filter(
+                        Photo.id.in_(removed_ids[i:i + 500])
+                    ).delete(synchronize_session=False)
                 db.commit()
+                discard_thumbnails(removed_ids)
             except Exception as e:
                 logger.warning("Failed to remove deleted photos: %s", e)
                 db.rollback()
+            stats.add("delete", time.perf_counter() - started, len(removed_ids))
+
+        started = time.perf_counter()
+        try:
+            _save_dir_index(db, listings, target_prefixes, stamp)
+            discard_checkpoint(db)
+            db.commit()
+        except Exception as e:
+            logger.warning("Failed to save directory index: %s", e)
+            db.rollback()
+        stats.add("dir_index", time.perf_counter() - started, len(listings))
 
         logger.info(
-            "Scan complete: %d total, %d unchanged, %d new/updated, %d skipped, %d removed",
-            len(image_files), unchanged,
-            len(image_files) - unchanged - skipped, skipped, len(removed_ids),
+            "Scan complete: %d total, %d unchanged, %d new/updated, %d moved, %d skipped, "
+            "%d removed, %d/%d directories unchanged",
+            scan_status["total"], unchanged,
+            scan_status["total"] - unchanged - skipped - moved, moved, skipped, len(removed_ids),
+            sum(1 for listing in listings if listing[3]), len(listings),
+        )
+        report.update(
+            total=scan_status["total"], unchanged=unchanged,
+            written=scan_status["total"] - unchanged - skipped - moved,
+            moved=moved, skipped=skipped, removed=len(removed_ids),
         )
 
     except Exception as e:
         scan_status["error"] = str(e)
         logger.error("Scan failed: %s", e)
+        try:
+            db.rollback()
+        except Exception:
+            pass
     finally:
+        report["error"] = scan_status["error"]
+        _save_report(db, report, stats)
+        index_lock.release()
         scan_status["is_scanning"] = False
@@ -1,34 +1,489 @@
+import io
 import os
+import hashlib
 import logging
-from PIL import Image
+import threading
+from contextlib import contextmanager
+from typing import Callable, Iterable, Optional, TypeVar
+from PIL import Image, features
 
-from config import THUMBNAIL_DIR
+from services.decode_budget import decode_budget, draft_box, estimate_decode_bytes
+from services.jpeg_preview import read_preview
 from services.pathutil import long_path
+from services.thumbstore import store
 
 logger = logging.getLogger(__name__)
 
+# Renditions built together from one decode of the source. A requested size
+# is served from the smallest rendition at least that large.
+PYRAMID_SIZES = (160, 320, 640, 1280)
+JPEG_QUALITY = 85
 
-def generate_thumbnail(photo_id: int, file_path: str, max_size: int = 300) -> str:
-    thumb_path = os.path.join(THUMBNAIL_DIR, f"{photo_id}.jpg")
+# Screen-sized renditions for the viewer, by longest edge. A display box is
+# served from the smallest at least as large as its longer side.
+DISPLAY_SIZES = (1280, 1920, 2560, 3840)
 
-    if os.path.exists(thumb_path):
-        return thumb_path
+# Rendition encodings: Pillow format, save options and media type. JPEG is
+# always available and is what clients that don't advertise the others get.
+FORMATS = {
+    "jpeg": ("JPEG", {"quality": JPEG_QUALITY}, "image/jpeg"),
+    "webp": ("WEBP", {"quality": 80}, "image/webp"),
+    "avif": ("AVIF", {"quality": 60, "speed": 8}, "image/avif"),
+}
+# What to try, in order, for each preferred format.
+_FALLBACKS = {"jpeg": ("jpeg",), "webp": ("webp", "jpeg"), "avif": ("avif", "webp", "jpeg")}
 
+# Stored thumbnails start with a tag: _TAG_MAGIC plus an 8-byte digest of the
+# source version (mtime and size) and the render parameters. An entry whose
+# tag doesn't match what the request expects is stale and is re-rendered
+# over. Untagged entries came from the old loose-file cache; nothing says
+# which source (or even which photo, as ids are reused) they were made from,
+# so they are stale too.
+_TAG_MAGIC = b"LPv1"
+_TAG_LEN = len(_TAG_MAGIC) + 8
+
+# On-demand renders that may decode a source at the same time; further
+# requests queue, so a burst of uncached thumbnails can't spike memory.
+MAX_CONCURRENT_DECODES = max(2, min(8, os.cpu_count() or 1))
+_decode_slots = threading.BoundedSemaphore(MAX_CONCURRENT_DECODES)
+
+T = TypeVar("T")
+
+
+@contextmanager
+def decode_slot():
+    """Hold one of the MAX_CONCURRENT_DECODES slots while decoding a source."""
+    with _decode_slots:
+        yield
+
+
+class _Flight:
+    __slots__ = ("done", "result", "error")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+class SingleFlight:
+    """Runs one call per key at a time: callers arriving while a call for
+    their key is in progress wait for it and share its result (or error)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: dict[tuple, _Flight] = {}
+
+    def do(self, key: tuple, fn: Callable[[], T]) -> T:
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+        try:
+            flight.result = fn()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.result
+
+
+_flights = SingleFlight()
+
+
+def render_once(key: tuple, fn: Callable[[], T]) -> T:
+    """Run the render ``fn`` for ``key`` under a decode slot, joining an
+    identical render already in flight instead of starting another."""
+    def _run():
+        with decode_slot():
+            return fn()
+    return _flights.do(key, _run)
+
+
+def thumbnail_key(photo_id: int) -> str:
+    """Store key of the thumbnail_size-setting thumbnail."""
+    return str(photo_id)
+
+
+def rendition_key(photo_id: int, level: int, fmt: str = "jpeg") -> str:
+    if fmt == "jpeg":
+        return f"{photo_id}_{level}"
+    return f"{photo_id}_{level}.{fmt}"
+
+
+def format_supported(fmt: str) -> bool:
+    if fmt == "jpeg":
+        return True
     try:
+        return bool(features.check(fmt))
+    except ValueError:  # Pillow too old to know the codec
+        return False
+
+
+def preferred_format(setting: Optional[str]) -> str:
+    """The thumbnail_format setting, or the best supported fallback for it."""
+    for fmt in _FALLBACKS.get(setting or "", ("jpeg",)):
+        if format_supported(fmt):
+            return fmt
+    return "jpeg"
+
+
+def negotiate_format(accept: Optional[str], preferred: str) -> str:
+    """The first of ``preferred`` and its fallbacks that the Accept header
+    names explicitly (wildcards don't count: plenty of clients send */*
+    without decoding WebP), else JPEG."""
+    accepted = set()
+    for part in (accept or "").split(","):
+        media_type, _, params = part.partition(";")
+        q = params.strip().removeprefix("q=")
+        if params and q.replace(".", "", 1).isdigit() and float(q) == 0:
+            continue
+        accepted.add(media_type.strip().lower())
+    for fmt in _FALLBACKS.get(preferred, ("jpeg",)):
+        if fmt == "jpeg" or (FORMATS[fmt][2] in accepted and format_supported(fmt)):
+            return fmt
+    return "jpeg"
+
+
+def source_version(modified_at: str, file_size: int) -> str:
+    """Identifies the source file's content for cache tags (mtime and size, as scanned)."""
+    return f"{modified_at}|{file_size}"
+
+
+def source_token(source: str) -> str:
+    """Short token for a source version; the ``v`` parameter of thumbnail URLs."""
+    return hashlib.blake2b(source.encode(), digest_size=6).hexdigest()
+
+
+def _tag(source: str, params: str) -> bytes:
+    digest = hashlib.blake2b(f"{source}|{params}".encode(), digest_size=8).digest()
+    return _TAG_MAGIC + digest
+
+
+def _render_params(max_size: int, fmt: str = "jpeg") -> str:
+    return f"{fmt}:q{FORMATS[fmt][1]['quality']}:{max_size}"
+
+
+def _load(key: str, tag: bytes) -> Optional[bytes]:
+    """Cached image for ``key`` if it is current for ``tag``; None if missing or stale."""
+    data = store.get(key)
+    if data is None:
+        return None
+    if data[:_TAG_LEN] != tag:
+        return None
+    return data[_TAG_LEN:]
+
+
+def has_current_renditions(photo_id: int, source: str, fmt: str = "jpeg") -> bool:
+    """True if the photo's whole pyramid in ``fmt`` is cached and current.
+
+    Renditions are stored largest first, so the smallest marks a complete
+    set; the largest is checked too because a set built from a small
+    embedded preview stops short of it.
+    """
+    for level in (PYRAMID_SIZES[0], PYRAMID_SIZES[-1]):
+        head = store.peek(rendition_key(photo_id, level, fmt), _TAG_LEN)
+        if head is None:
+            return False
+        if head != _tag(source, _render_params(level, fmt)):
+            return False
+    return True
+
+
+def discard_thumbnails(photo_ids: Iterable[int]):
+    """Drop every cached thumbnail of these photos."""
+    store.delete(
+        key for pid in photo_ids
+        for key in (thumbnail_key(pid), *(
+            rendition_key(pid, level, fmt) for fmt in FORMATS for level in PYRAMID_SIZES
+        ), *(
+            display_key(pid, level, fmt) for fmt in FORMATS for level in DISPLAY_SIZES
+        ))
+    )
+
+
+def _encode(img: Image.Image, fmt: str = "jpeg") -> bytes:
+    pil_format, options, _ = FORMATS[fmt]
+    buf = io.BytesIO()
+    img.save(buf, pil_format, **options)
+    return buf.getvalue()
+
+
+def _open_source(file_path: str, min_size: int) -> Image.Image:
+    """Open the embedded preview if one is at least ``min_size`` pixels,
+    otherwise the file itself."""
+    preview = read_preview(long_path(file_path), min_size)
+    if preview is not None:
+        return Image.open(io.BytesIO(preview))
+    return Image.open(long_path(file_path))
+
+
+def render_thumbnail(file_path: str, max_size: int) -> bytes:
+    with _open_source(file_path, max_size) as img:
+        # Handle animated images (GIF) - use first frame
+        if hasattr(img, "n_frames") and img.n_frames > 1:
+            img.seek(0)
+
+        img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
+
+        # Convert to RGB for JPEG compatibility
+        if img.mode not in ("RGB",):
+            img = img.convert("RGB")
+
+        return _encode(img)
+
+
+def generate_thumbnail(photo_id: int, file_path: str, source: str, max_size: int = 300) -> bytes:
+    """Return the cached JPEG thumbnail, rendering it if missing or stale (b"" on failure).
+
+    ``source`` is the photo's source_version().
+    """
+    key = thumbnail_key(photo_id)
+    tag = _tag(source, _render_params(max_size))
+    data = _load(key, tag)
+    if data is not None:
+        return data
+
+    def _build() -> bytes:
+        # A render that finished just before this one was registered has
+        # already stored the result.
+        cached = _load(key, tag)
+        if cached is not None:
+            return cached
+        # Image.thumbnail() drafts to twice the size.
+        with decode_budget.reserve(estimate_decode_bytes(file_path, max_size * 2)):
+            rendered = render_thumbnail(file_path, max_size)
+        store.put(key, tag + rendered)
+        return rendered
+
+    try:
+        return render_once(("thumbnail", photo_id, source, max_size), _build)
+    except Exception as e:
+        logger.warning("Failed to generate thumbnail for photo %d (%s): %s", photo_id, file_path, e)
+        return b""
+
+
+def put_thumbnail(photo_id: int, source: str, max_size: int, data: bytes):
+    store.put(thumbnail_key(photo_id), _tag(source, _render_params(max_size)) + data)
+
+
+def load_thumbnail(photo_id: int, source: str, max_size: int) -> Optional[bytes]:
+    return _load(thumbnail_key(photo_id), _tag(source, _render_params(max_size)))
+
+
+def pyramid_level(size: int) -> int:
+    """The rendition that serves ``size``: the smallest at least that large."""
+    for level in PYRAMID_SIZES:
+        if size <= level:
+            return level
+    return PYRAMID_SIZES[-1]
+
+
+def render_pyramid(img: Image.Image, fmt: str = "jpeg",
+                   largest: int = PYRAMID_SIZES[-1]) -> dict[int, bytes]:
+    """Encode the renditions of an opened image up to ``largest`` as ``fmt``.
+
+    Only JPEGs can be decoded at a reduced scale (draft). Other formats are
+    decoded at full size, which is what their DecodeBudget reservation covers;
+    the integer box reduce() that follows only makes the LANCZOS passes
+    cheaper. Each smaller level is resampled from the one above it, so the
+    source is decoded once.
+    """
+    if hasattr(img, "n_frames") and img.n_frames > 1:
+        img.seek(0)
+    # Keep at least 2x the target so the final LANCZOS pass has detail to work with.
+    img.draft("RGB", draft_box(img.size, largest * 2))
+    if img.mode not in ("RGB",):
+        img = img.convert("RGB")
+    factor = max(img.size) // (largest * 2)
+    if factor > 1:
+        img = img.reduce(factor)
+
+    renditions = {}
+    for level in reversed(PYRAMID_SIZES):
+        if level > largest:
+            continue
+        img = img.copy()
+        img.thumbnail((level, level), Image.Resampling.LANCZOS)
+        renditions[level] = _encode(img, fmt)
+    return renditions
+
+
+def render_renditions(file_path: str, fmt: str = "jpeg",
+                      level: int = PYRAMID_SIZES[-1]) -> dict[int, bytes]:
+    """Render the pyramid for a request needing ``level``.
+
+    An embedded preview at least ``level`` pixels is used when the file has
+    one, yielding the levels it is large enough for; otherwise the source is
+    decoded and every level is rendered.
+    """
+    preview = read_preview(long_path(file_path), level)
+    if preview is None:
         with Image.open(long_path(file_path)) as img:
-            # Handle animated images (GIF) - use first frame
+            return render_pyramid(img, fmt)
+    with Image.open(io.BytesIO(preview)) as img:
+        return render_pyramid(img, fmt, max(lv for lv in PYRAMID_SIZES if lv <= max(img.size)))
+
+
+def store_renditions(photo_id: int, source: str, renditions: dict[int, bytes], fmt: str = "jpeg"):
+    # Largest first: the smallest rendition being present marks a complete set.
+    store.put_many({
+        rendition_key(photo_id, level, fmt): _tag(source, _render_params(level, fmt)) + renditions[level]
+        for level in sorted(renditions, reverse=True)
+    })
+
+
+def thumbnail_etag(photo_id: int, source: str, size: Optional[int], max_size: int,
+                   fmt: str = "jpeg") -> str:
+    """Strong ETag for what the thumbnail endpoint serves: the cache key plus
+    its version tag, so it changes exactly when the cached bytes would."""
+    if size is not None:
+        level = pyramid_level(size)
+        key, params = rendition_key(photo_id, level, fmt), _render_params(level, fmt)
+    else:
+        key, params = thumbnail_key(photo_id), _render_params(max_size)
+    return f'"{key}-{_tag(source, params)[len(_TAG_MAGIC):].hex()}"'
+
+
+def load_rendition(photo_id: int, source: str, level: int, fmt: str = "jpeg") -> Optional[bytes]:
+    return _load(rendition_key(photo_id, level, fmt), _tag(source, _render_params(level, fmt)))
+
+
+def generate_rendition(photo_id: int, file_path: str, source: str, size: int,
+                       fmt: str = "jpeg") -> bytes:
+    """Return the cached ``fmt`` rendition serving ``size``, rebuilding the
+    pyramid if it is missing or stale."""
+    level = pyramid_level(size)
+    data = load_rendition(photo_id, source, level, fmt)
+    if data is not None:
+        return data
+
+    def _build() -> dict[int, bytes]:
+        cached = load_rendition(photo_id, source, level, fmt)
+        if cached is not None:
+            return {level: cached}
+        with decode_budget.reserve(estimate_decode_bytes(file_path, PYRAMID_SIZES[-1] * 2)):
+            renditions = render_renditions(file_path, fmt, level)
+        store_renditions(photo_id, source, renditions, fmt)
+        return renditions
+
+    # A render joined in flight may have been for a smaller level and built
+    # from a preview too small for this one; then render again.
+    for _ in range(3):
+        try:
+            renditions = render_once(("pyramid", photo_id, source, fmt), _build)
+        except Exception as e:
+            logger.warning("Failed to generate thumbnails for photo %d (%s): %s", photo_id, file_path, e)
+            return b""
+        data = renditions.get(level)
+        if data is None:
+            data = load_rendition(photo_id, source, level, fmt)
+        if data is not None:
+            return data
+    return b""
+
+
+def display_key(photo_id: int, level: int, fmt: str = "jpeg") -> str:
+    if fmt == "jpeg":
+        return f"{photo_id}_d{level}"
+    return f"{photo_id}_d{level}.{fmt}"
+
+
+def _display_params(level: int, fmt: str) -> str:
+    return f"display:{_render_params(level, fmt)}"
+
+
+def display_level(width: int, height: int) -> int:
+    """The display rendition for a ``width`` x ``height`` box: the smallest
+    whose longest edge covers the box's longer side."""
+    longest = max(width, height)
+    for level in DISPLAY_SIZES:
+        if longest <= level:
+            return level
+    return DISPLAY_SIZES[-1]
+
+
+# Transpose turning an image with the given EXIF orientation upright.
+_UPRIGHT = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+
+def _orientation(img: Image.Image) -> int:
+    """EXIF orientation (1-8) from the header; 1 if absent."""
+    if img.format == "PNG" and "exif" not in img.info:
+        return 1  # getexif() would decode the whole PNG
+    try:
+        return int(img.getexif().get(0x0112, 1))
+    except Exception:
+        return 1
+
+
+def render_display(file_path: str, level: int, fmt: str = "jpeg") -> bytes:
+    """Fit the image within ``level`` pixels, turned upright per its EXIF
+    orientation (the encoded rendition carries no EXIF)."""
+    path = long_path(file_path)
+    preview = read_preview(path, level)
+    with Image.open(path) as source:
+        orientation = _orientation(source)
+        img = Image.open(io.BytesIO(preview)) if preview is not None else source
+        with img:
             if hasattr(img, "n_frames") and img.n_frames > 1:
                 img.seek(0)
+            img.draft("RGB", draft_box(img.size, level))
+            img.thumbnail((level, level), Image.Resampling.LANCZOS, reducing_gap=None)
+            if img.mode != "RGB":
+                img = img.convert("RGB")
+            if orientation in _UPRIGHT:
+                img = img.transpose(_UPRIGHT[orientation])
+            return _encode(img, fmt)
 
-            img.thumbnail((max_size, max_size), Image.Resampling.LANCZOS)
 
-            # Convert to RGB for JPEG compatibility
-            if img.mode not in ("RGB",):
-                img = img.convert("RGB")
+def load_display(photo_id: int, source: str, level: int, fmt: str = "jpeg") -> Optional[bytes]:
+    return _load(display_key(photo_id, level, fmt), _tag(source, _display_params(level, fmt)))
 
-            img.save(thumb_path, "JPEG", quality=85)
-    except Exception as e:
-        logger.warning("Failed to generate thumbnail for photo %d (%s): %s", photo_id, file_path, e)
-        return ""
 
-    return thumb_path
+def display_etag(photo_id: int, source: str, level: int, fmt: str = "jpeg") -> str:
+    """Strong ETag of a display rendition; see thumbnail_etag()."""
+    tag = _tag(source, _display_params(level, fmt))
+    return f'"{display_key(photo_id, level, fmt)}-{tag[len(_TAG_MAGIC):].hex()}"'
+
+
+def generate_display(photo_id: int, file_path: str, source: str, level: int,
+                     fmt: str = "jpeg") -> bytes:
+    """Return the cached display rendition, rendering it if missing or stale (b"" on failure)."""
+    key = display_key(photo_id, level, fmt)
+    tag = _tag(source, _display_params(level, fmt))
+    data = _load(key, tag)
+    if data is not None:
+        return data
+
+    def _build() -> bytes:
+        cached = _load(key, tag)
+        if cached is not None:
+            return cached
+        with decode_budget.reserve(estimate_decode_bytes(file_path, level)):
+            rendered = render_display(file_path, level, fmt)
+        store.put(key, tag + rendered)
+        return rendered
+
+    try:
+        return render_once(("display", photo_id, source, level, fmt), _build)
+    except Exception as e:
+        logger.warning("Failed to generate display image for photo %d (%s): %s", photo_id, file_path, e)
+        return b""
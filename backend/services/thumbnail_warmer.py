@@ -0,0 +1,284 @@
+import os
+import time
+import logging
+import threading
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from typing import Optional
+
+from sqlalchemy import func
+
+from config import is_video_extension
+from database import SessionLocal
+from models.photo import Photo
+from models.setting import Setting
+from services.decode_budget import decode_budget, estimate_decode_bytes
+from services.pathutil import long_path
+from services.placeholder import placeholder_from_thumbnail, save_placeholders
+from services.scanner import scan_status
+from services.thumbnail import (
+    PYRAMID_SIZES, has_current_renditions, load_rendition, preferred_format, render_renditions, source_version,
+    store_renditions,
+)
+from services.video import render_video_renditions
+
+logger = logging.getLogger(__name__)
+
+# The warmer only submits new work once no interactive thumbnail request has
+# been in progress for IDLE_GRACE_SECONDS, so scrolling the grid is never
+# queued behind pre-generation.
+IDLE_GRACE_SECONDS = 0.5
+
+# Placeholders are written to the database this many at a time.
+PLACEHOLDER_BATCH = 200
+
+warm_status = {
+    "is_warming": False,
+    "total": 0,
+    "done": 0,
+    "failed": 0,
+    "current_file": "",
+    "paused": False,
+    "error": None,
+}
+
+_interactive_lock = threading.Lock()
+_interactive_active = 0
+_interactive_last = 0.0
+
+
+@contextmanager
+def interactive_request():
+    """Mark an on-demand thumbnail request; the warmer holds back while any run."""
+    global _interactive_active, _interactive_last
+    with _interactive_lock:
+        _interactive_active += 1
+    try:
+        yield
+    finally:
+        with _interactive_lock:
+            _interactive_active -= 1
+            _interactive_last = time.monotonic()
+
+
+def _interactive_busy() -> bool:
+    with _interactive_lock:
+        return (_interactive_active > 0
+                or time.monotonic() - _interactive_last < IDLE_GRACE_SECONDS)
+
+
+def resolve_warm_workers() -> int:
+    """Half the CPUs (at least one), leaving room for interactive requests."""
+    return max(1, (os.cpu_count() or 1) // 2)
+
+
+def warm_format(db) -> str:
+    """The encoding to pre-generate: the thumbnail_format setting's, which
+    is what browsers that advertise it will be served."""
+    setting = db.query(Setting).filter(Setting.key == "thumbnail_format").first()
+    return preferred_format(setting.value if setting else None)
+
+
+def _pending_photos(db, fmt: str) -> tuple[list[tuple[int, str, bool, str, bool]],
+                                           list[tuple[int, str]]]:
+    """Photos to render and photos only missing their placeholder.
+
+    The first list holds (id, file_path, is_video, source_version,
+    needs_placeholder) for photos without a current cached ``fmt`` pyramid,
+    in warm order: folders touched by the most recent scan come first, then
+    the rest of the library; within a folder, files are taken in name order.
+    The second holds (id, source_version) for photos whose pyramid is cached
+    but that have no placeholder yet.
+    """
+    latest = db.query(func.max(Photo.scanned_at)).scalar()
+    rows = []
+    backfill = []
+    for pid, path, ext, modified_at, file_size, placeholder in db.query(
+        Photo.id, Photo.file_path, Photo.extension, Photo.modified_at, Photo.file_size,
+        Photo.placeholder,
+    ):
+        source = source_version(modified_at, file_size)
+        if not has_current_renditions(pid, source, fmt):
+            rows.append((pid, path, ext, source, placeholder is None))
+        elif placeholder is None:
+            backfill.append((pid, source))
+    recent_dirs = {
+        os.path.dirname(path)
+        for (path,) in db.query(Photo.file_path).filter(Photo.scanned_at == latest)
+    }
+
+    def _order(row):
+        folder = os.path.dirname(row[1])
+        return (folder not in recent_dirs, folder, row[1])
+
+    rows.sort(key=_order)
+    return [
+        (pid, path, is_video_extension(ext), source, needs_placeholder)
+        for pid, path, ext, source, needs_placeholder in rows
+    ], backfill
+
+
+def _render(photo_id: int, file_path: str, is_video: bool, fmt: str) -> dict[int, bytes]:
+    """Worker entry point; module-level so it pickles for the process pool.
+
+    Only renders: the parent process owns the thumbnail store and writes the
+    result, so workers never append to the pack files concurrently.
+    """
+    if is_video:
+        # ffmpeg dislikes \\?\ prefixes, so it gets the clean path.
+        return render_video_renditions(photo_id, file_path, fmt=fmt)
+    return render_renditions(long_path(file_path), fmt)
+
+
+def _decode_cost(file_path: str, is_video: bool) -> int:
+    """Decode budget to hold for one job (ffmpeg decodes videos in its own process)."""
+    if is_video:
+        return 0
+    try:
+        return estimate_decode_bytes(file_path, PYRAMID_SIZES[-1] * 2)
+    except Exception:
+        return 0  # unreadable; the render will fail and be counted
+
+
+def _backfill_placeholders(backfill: list[tuple[int, str]], fmt: str, stop: threading.Event):
+    """Make placeholders for photos from their cached smallest rendition."""
+    made: dict[int, str] = {}
+    for pid, source in backfill:
+        if stop.is_set():
+            break
+        data = load_rendition(pid, source, PYRAMID_SIZES[0], fmt)
+        placeholder = placeholder_from_thumbnail(data) if data is not None else None
+        if placeholder is not None:
+            made[pid] = placeholder
+        if len(made) >= PLACEHOLDER_BATCH:
+            save_placeholders(made)
+            made = {}
+    save_placeholders(made)
+
+
+class ThumbnailWarmer:
+    """Pre-generates missing thumbnails on a bounded process pool after a scan.
+
+    Work is submitted a few jobs at a time and only while no interactive
+    thumbnail request is running and no scan is in progress, so on-demand
+    requests keep priority over the backlog. Each job holds its share of
+    the decode budget until it finishes. Placeholders are made from each
+    new pyramid's smallest rendition, and backfilled first for photos whose
+    pyramid was already cached.
+    """
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, workers: int | None = None) -> bool:
+        """Start warming in the background; False if a run is already going."""
+        if self.running:
+            return False
+        self._stop = threading.Event()
+        warm_status.update(is_warming=True, total=0, done=0, failed=0,
+                           current_file="", paused=False, error=None)
+        self._thread = threading.Thread(
+            target=self._run, args=(workers or resolve_warm_workers(), self._stop),
+            name="thumbnail-warmer", daemon=True,
+        )
+        self._thread.start()
+        return True
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+        warm_status["is_warming"] = False
+        warm_status["paused"] = False
+
+    def _run(self, workers: int, stop: threading.Event):
+        pool: Optional[Executor] = None
+        in_flight: dict[Future, tuple[int, str, str, bool, int]] = {}
+        placeholders: dict[int, str] = {}
+        try:
+            db = SessionLocal()
+            try:
+                fmt = warm_format(db)
+                queue, backfill = _pending_photos(db, fmt)
+            finally:
+                db.close()
+            warm_status["total"] = len(queue)
+            if backfill:
+                logger.info("Making %d placeholder(s) from cached thumbnails", len(backfill))
+                _backfill_placeholders(backfill, fmt, stop)
+            if not queue:
+                return
+            logger.info("Pre-generating %d %s thumbnail pyramid(s) on %d worker(s)",
+                        len(queue), fmt, workers)
+            try:
+                pool = ProcessPoolExecutor(max_workers=workers)
+            except (OSError, NotImplementedError) as e:
+                logger.warning("Process pool unavailable, warming thumbnails on threads: %s", e)
+                pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumb-warm")
+
+            next_index = 0
+            next_cost: Optional[int] = None
+            while (next_index < len(queue) or in_flight) and not stop.is_set():
+                # Hold back new work (but keep collecting finished jobs) while
+                # the user is waiting on thumbnails or a scan is running.
+                paused = _interactive_busy() or scan_status["is_scanning"]
+                warm_status["paused"] = paused
+                while not paused and next_index < len(queue) and len(in_flight) < workers:
+                    pid, path, is_video, source, needs_placeholder = queue[next_index]
+                    if next_cost is None:
+                        next_cost = _decode_cost(path, is_video)
+                    if not decode_budget.try_acquire(next_cost):
+                        break
+                    cost, next_cost = next_cost, None
+                    next_index += 1
+                    warm_status["current_file"] = path
+                    in_flight[pool.submit(_render, pid, path, is_video, fmt)] = (
+                        pid, path, source, needs_placeholder, cost)
+                if not in_flight:
+                    stop.wait(0.1)
+                    continue
+                done, _ = wait(in_flight, timeout=0.5, return_when=FIRST_COMPLETED)
+                for fut in done:
+                    pid, path, source, needs_placeholder, cost = in_flight.pop(fut)
+                    decode_budget.release(cost)
+                    try:
+                        renditions = fut.result()
+                    except Exception as e:
+                        logger.warning("Thumbnail pre-generation failed for %s: %s", path, e)
+                        renditions = {}
+                    if renditions:
+                        store_renditions(pid, source, renditions, fmt)
+                        warm_status["done"] += 1
+                        placeholder = (placeholder_from_thumbnail(renditions[min(renditions)])
+                                       if needs_placeholder else None)
+                        if placeholder is not None:
+                            placeholders[pid] = placeholder
+                            if len(placeholders) >= PLACEHOLDER_BATCH:
+                                save_placeholders(placeholders)
+                                placeholders = {}
+                    else:
+                        warm_status["failed"] += 1
+            logger.info("Thumbnail pre-generation %s: %d done, %d failed",
+                        "stopped" if stop.is_set() else "finished",
+                        warm_status["done"], warm_status["failed"])
+        except Exception as e:
+            logger.error("Thumbnail pre-generation failed: %s", e)
+            warm_status["error"] = str(e)
+        finally:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+            for *_, cost in in_flight.values():
+                decode_budget.release(cost)
+            save_placeholders(placeholders)
+            warm_status["is_warming"] = False
+            warm_status["paused"] = False
+            warm_status["current_file"] = ""
+
+
+warmer = ThumbnailWarmer()
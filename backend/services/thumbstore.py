@@ -0,0 +1,528 @@
+import os
+import re
+import mmap
+import shutil
+import struct
+import logging
+import threading
+import zlib
+from datetime import datetime
+from typing import Iterable, Iterator, NamedTuple, Optional
+
+from config import THUMBNAIL_DIR
+
+logger = logging.getLogger(__name__)
+
+# Segments are rotated once they reach SEGMENT_BYTES; only the newest one is
+# ever appended to.
+SEGMENT_BYTES = 64 * 1024 * 1024
+# compact() rewrites sealed segments whose share of dead bytes (overwritten or
+# deleted records) is at least this.
+COMPACT_GARBAGE_RATIO = 0.3
+# Once the store outgrows its budget, least recently used entries are evicted
+# until the live data fits in EVICT_TARGET of it, leaving headroom so the
+# evictor doesn't run again after every few writes.
+EVICT_TARGET = 0.9
+# The evictor also checks the budget this often, not only when woken by a write.
+EVICT_INTERVAL_SECONDS = 60.0
+
+# Record: magic, flags, key length, data length, crc32(data), key, data.
+_RECORD = struct.Struct("<4sBHII")
+_MAGIC = b"LPT1"
+_FLAG_TOMBSTONE = 1
+# Index file written for each sealed segment: its size, then one entry per
+# record (flags, key length, offset, data length, key).
+_IDX_HEADER = struct.Struct("<Q")
+_IDX_ENTRY = struct.Struct("<BHQI")
+_SEGMENT_RE = re.compile(r"^seg-(\d{6})\.pack$")
+_LOOSE_RE = re.compile(r"^(\d+(?:_\d+)?)\.jpg$")
+
+
+class _Location(NamedTuple):
+    segment: int
+    offset: int  # of the data
+    length: int
+
+
+class _Record(NamedTuple):
+    key: str
+    flags: int
+    offset: int  # of the record header
+    length: int  # of the data
+
+    def location(self, seg: int) -> _Location:
+        return _Location(seg, self.offset + _RECORD.size + len(self.key.encode()), self.length)
+
+
+def _segment_name(seg: int) -> str:
+    return f"seg-{seg:06d}.pack"
+
+
+def _record_size(key: bytes, length: int) -> int:
+    return _RECORD.size + len(key) + length
+
+
+class ThumbnailStore:
+    """Append-only pack files holding cached thumbnails, keyed by short strings.
+
+    Each segment is a sequence of self-describing records; the newest record
+    for a key wins and deletions are written as tombstones. The key -> location
+    index lives in memory and is rebuilt on open from a per-segment index file
+    (written when a segment is sealed) or, for the active segment, by scanning
+    its records. Sealed segments are read through mmap.
+
+    Thread-safe within one process. Worker processes should render and hand
+    the bytes back to the parent rather than writing here.
+    """
+
+    def __init__(self, directory: str, segment_bytes: int = SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self._lock = threading.RLock()
+        self._opened = False
+        self._index: dict[str, _Location] = {}
+        self._sizes: dict[int, int] = {}  # segment -> bytes on disk
+        self._live: dict[int, int] = {}  # segment -> bytes of live records
+        self._maps: dict[int, mmap.mmap] = {}
+        self._active: Optional[int] = None
+        self._active_file = None
+        # Recency for LRU eviction: a counter bumped on every hit or write, so
+        # tracking an access is one dict store. Not persisted; after a restart
+        # entries fall back to write order.
+        self._clock = 0
+        self._atime: dict[str, int] = {}
+        # Disk budget in bytes (0 = unlimited); set by the app from settings.
+        self.budget_bytes = 0
+        self.over_budget = threading.Event()
+        self._counters = {"hits": 0, "misses": 0, "evicted_entries": 0, "evicted_bytes": 0,
+                          "evictions": 0}
+        self._last_evicted_at: Optional[str] = None
+
+    # -- opening -----------------------------------------------------------
+
+    def _open(self):
+        if self._opened:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        segments = sorted(
+            int(m.group(1)) for m in map(_SEGMENT_RE.match, os.listdir(self.directory)) if m
+        )
+        for seg in segments:
+            path = self._path(seg)
+            size = os.path.getsize(path)
+            records = self._read_idx(seg, size)
+            if records is None:
+                records, valid = self._scan(seg)
+                if valid < size:
+                    logger.warning("Truncating %d torn byte(s) from thumbnail segment %s",
+                                   size - valid, _segment_name(seg))
+                    with open(path, "r+b") as f:
+                        f.truncate(valid)
+                    size = valid
+            self._sizes[seg] = size
+            self._live[seg] = 0
+            for rec in records:
+                self._apply(seg, rec)
+        self._active = segments[-1] if segments else 1
+        self._sizes.setdefault(self._active, 0)
+        self._live.setdefault(self._active, 0)
+        self._active_file = open(self._path(self._active), "a+b")
+        self._opened = True
+
+    def _path(self, seg: int) -> str:
+        return os.path.join(self.directory, _segment_name(seg))
+
+    def _idx_path(self, seg: int) -> str:
+        return self._path(seg)[:-len(".pack")] + ".idx"
+
+    def _apply(self, seg: int, rec: _Record, touch: bool = False):
+        old = self._index.pop(rec.key, None)
+        if old is not None:
+            self._live[old.segment] -= _record_size(rec.key.encode(), old.length)
+        if not rec.flags & _FLAG_TOMBSTONE:
+            self._index[rec.key] = rec.location(seg)
+            self._live[seg] += _record_size(rec.key.encode(), rec.length)
+            if touch:
+                self._clock += 1
+                self._atime[rec.key] = self._clock
+        else:
+            self._atime.pop(rec.key, None)
+
+    def _scan(self, seg: int) -> tuple[list[_Record], int]:
+        """Parse a segment's records; returns them and the length of the valid prefix."""
+        records: list[_Record] = []
+        with open(self._path(seg), "rb") as f:
+            data = f.read()
+        offset = 0
+        while offset + _RECORD.size <= len(data):
+            magic, flags, key_len, length, crc = _RECORD.unpack_from(data, offset)
+            start = offset + _RECORD.size
+            end = start + key_len + length
+            if magic != _MAGIC or end > len(data):
+                break
+            if zlib.crc32(data[start + key_len:end]) != crc:
+                break
+            records.append(_Record(data[start:start + key_len].decode(), flags, offset, length))
+            offset = end
+        return records, offset
+
+    def _read_idx(self, seg: int, size: int) -> Optional[list[_Record]]:
+        try:
+            with open(self._idx_path(seg), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+        if len(data) < _IDX_HEADER.size or _IDX_HEADER.unpack_from(data)[0] != size:
+            return None
+        records = []
+        pos = _IDX_HEADER.size
+        try:
+            while pos < len(data):
+                flags, key_len, offset, length = _IDX_ENTRY.unpack_from(data, pos)
+                pos += _IDX_ENTRY.size
+                records.append(_Record(data[pos:pos + key_len].decode(), flags, offset, length))
+                pos += key_len
+        except (struct.error, UnicodeDecodeError):
+            return None
+        return records
+
+    def _write_idx(self, seg: int):
+        records, size = self._scan(seg)
+        parts = [_IDX_HEADER.pack(size)]
+        for rec in records:
+            key = rec.key.encode()
+            parts.append(_IDX_ENTRY.pack(rec.flags, len(key), rec.offset, rec.length))
+            parts.append(key)
+        tmp = self._idx_path(seg) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp, self._idx_path(seg))
+
+    # -- writing -----------------------------------------------------------
+
+    def _rotate(self):
+        self._active_file.flush()
+        os.fsync(self._active_file.fileno())
+        self._active_file.close()
+        self._write_idx(self._active)
+        self._active += 1
+        self._sizes[self._active] = 0
+        self._live[self._active] = 0
+        self._active_file = open(self._path(self._active), "a+b")
+
+    def _append(self, key: str, data: bytes, flags: int = 0, touch: bool = True):
+        key_bytes = key.encode()
+        size = _record_size(key_bytes, len(data))
+        if self._sizes[self._active] and self._sizes[self._active] + size > self.segment_bytes:
+            self._rotate()
+        offset = self._sizes[self._active]
+        self._active_file.write(_RECORD.pack(_MAGIC, flags, len(key_bytes), len(data), zlib.crc32(data)))
+        self._active_file.write(key_bytes)
+        self._active_file.write(data)
+        self._sizes[self._active] += size
+        self._apply(self._active, _Record(key, flags, offset, len(data)), touch)
+
+    def put_many(self, items: dict[str, bytes]):
+        if not items:
+            return
+        with self._lock:
+            self._open()
+            for key, data in items.items():
+                self._append(key, data)
+            self._active_file.flush()
+            if self.budget_bytes and sum(self._sizes.values()) > self.budget_bytes:
+                self.over_budget.set()
+
+    def put(self, key: str, data: bytes):
+        self.put_many({key: data})
+
+    def delete(self, keys: Iterable[str]):
+        with self._lock:
+            self._open()
+            wrote = False
+            for key in keys:
+                if key in self._index:
+                    self._append(key, b"", _FLAG_TOMBSTONE)
+                    wrote = True
+            if wrote:
+                self._active_file.flush()
+
+    # -- reading -----------------------------------------------------------
+
+    def _read(self, loc: _Location) -> bytes:
+        if loc.segment == self._active:
+            # Appends always go to the end (append mode), so seeking is safe.
+            self._active_file.seek(loc.offset)
+            return self._active_file.read(loc.length)
+        return self._map(loc.segment)[loc.offset:loc.offset + loc.length]
+
+    def _map(self, seg: int) -> mmap.mmap:
+        m = self._maps.get(seg)
+        if m is None:
+            with open(self._path(seg), "rb") as f:
+                m = self._maps[seg] = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return m
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            self._open()
+            loc = self._index.get(key)
+            if loc is None:
+                self._counters["misses"] += 1
+                return None
+            self._counters["hits"] += 1
+            self._clock += 1
+            self._atime[key] = self._clock
+            return self._read(loc)
+
+    def peek(self, key: str, length: int) -> Optional[bytes]:
+        """The first ``length`` bytes of an entry, without counting it as an access."""
+        with self._lock:
+            self._open()
+            loc = self._index.get(key)
+            if loc is None:
+                return None
+            return self._read(loc._replace(length=min(length, loc.length)))
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            self._open()
+            return key in self._index
+
+    def keys(self) -> list[str]:
+        with self._lock:
+            self._open()
+            return list(self._index)
+
+    # -- maintenance -------------------------------------------------------
+
+    def stats(self) -> dict:
+        with self._lock:
+            self._open()
+            total = sum(self._sizes.values())
+            live = sum(self._live.values())
+            lookups = self._counters["hits"] + self._counters["misses"]
+            return {
+                "entries": len(self._index),
+                "segments": len(self._sizes),
+                "bytes": total,
+                "live_bytes": live,
+                "garbage_ratio": round(1 - live / total, 3) if total else 0.0,
+                "budget_bytes": self.budget_bytes,
+                **self._counters,
+                "hit_rate": round(self._counters["hits"] / lookups, 3) if lookups else None,
+                "last_evicted_at": self._last_evicted_at,
+            }
+
+    def evict(self, target_bytes: int) -> int:
+        """Delete least recently used entries until the live data fits in
+        ``target_bytes``, then compact to give the space back. Returns the
+        number of entries evicted.
+        """
+        with self._lock:
+            self._open()
+            live = sum(self._live.values())
+            if live <= target_bytes:
+                return 0
+            order = sorted(
+                self._index.items(),
+                key=lambda item: (self._atime.get(item[0], 0), item[1].segment, item[1].offset),
+            )
+            victims = []
+            freed = 0
+            for key, loc in order:
+                if live - freed <= target_bytes:
+                    break
+                victims.append(key)
+                freed += _record_size(key.encode(), loc.length)
+            self.delete(victims)
+            self._counters["evicted_entries"] += len(victims)
+            self._counters["evicted_bytes"] += freed
+            self._counters["evictions"] += 1
+            self._last_evicted_at = datetime.now().isoformat()
+            self.compact(target_bytes=self.budget_bytes or None)
+            logger.info("Evicted %d thumbnail(s) (%d bytes) to stay within the cache budget",
+                        len(victims), freed)
+            return len(victims)
+
+    def enforce_budget(self) -> int:
+        """Evict down to EVICT_TARGET of the budget if the store is over it."""
+        budget = self.budget_bytes
+        if not budget:
+            return 0
+        with self._lock:
+            self._open()
+            if sum(self._sizes.values()) <= budget:
+                return 0
+            evicted = self.evict(int(budget * EVICT_TARGET))
+            if not evicted:
+                # Live data already fits; the excess is dead records.
+                self.compact(target_bytes=budget)
+            return evicted
+
+    def compact(self, min_garbage: float = COMPACT_GARBAGE_RATIO,
+                target_bytes: Optional[int] = None) -> dict:
+        """Rewrite the live records of mostly-dead segments into a fresh
+        active one and delete those segments. Returns the number of segments
+        removed and bytes reclaimed.
+
+        With ``target_bytes``, segments below ``min_garbage`` are also taken,
+        most garbage first, until the store is projected to fit in it.
+        """
+        with self._lock:
+            self._open()
+
+            def _garbage(seg: int) -> int:
+                return self._sizes[seg] - self._live[seg]
+
+            total = sum(self._sizes.values())
+            active_size = self._sizes[self._active]
+            if active_size and (_garbage(self._active) >= min_garbage * active_size
+                                or (target_bytes is not None and total > target_bytes
+                                    and _garbage(self._active))):
+                # Seal the active segment so its dead records can be dropped too.
+                self._rotate()
+            sealed = sorted((seg for seg in self._sizes if seg != self._active),
+                            key=_garbage, reverse=True)
+            victims = [seg for seg in sealed
+                       if not self._sizes[seg] or _garbage(seg) >= min_garbage * self._sizes[seg]]
+            if target_bytes is not None:
+                projected = total - sum(_garbage(seg) for seg in victims)
+                for seg in sealed:
+                    if projected <= target_bytes:
+                        break
+                    if seg not in victims and _garbage(seg):
+                        victims.append(seg)
+                        projected -= _garbage(seg)
+            victims.sort()
+            if not victims:
+                return {"segments": 0, "reclaimed_bytes": 0}
+            before = sum(self._sizes.values())
+            remaining_older = set(self._sizes) - set(victims) - {self._active}
+            for seg in victims:
+                records, _ = self._scan(seg)
+                keep_tombstones = any(s < seg for s in remaining_older)
+                for rec in records:
+                    if rec.flags & _FLAG_TOMBSTONE:
+                        # Still needed to mask an older copy in a segment we keep.
+                        if keep_tombstones and rec.key not in self._index:
+                            self._append(rec.key, b"", _FLAG_TOMBSTONE, touch=False)
+                        continue
+                    loc = rec.location(seg)
+                    if self._index.get(rec.key) == loc:
+                        self._append(rec.key, self._read(loc), touch=False)
+                self._active_file.flush()
+                self._drop_segment(seg)
+            reclaimed = before - sum(self._sizes.values())
+            logger.info("Compacted %d thumbnail segment(s), reclaimed %d bytes", len(victims), reclaimed)
+            return {"segments": len(victims), "reclaimed_bytes": reclaimed}
+
+    def _drop_segment(self, seg: int):
+        m = self._maps.pop(seg, None)
+        if m is not None:
+            m.close()
+        for path in (self._path(seg), self._idx_path(seg)):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        del self._sizes[seg]
+        del self._live[seg]
+
+    def close(self):
+        with self._lock:
+            for m in self._maps.values():
+                m.close()
+            self._maps.clear()
+            if self._active_file is not None:
+                self._active_file.close()
+                self._active_file = None
+            self._index.clear()
+            self._sizes.clear()
+            self._live.clear()
+            self._atime.clear()
+            self._active = None
+            self._opened = False
+
+    def clear(self):
+        """Delete every segment (and anything else in the store's directory)."""
+        with self._lock:
+            self.close()
+            if os.path.isdir(self.directory):
+                shutil.rmtree(self.directory)
+            os.makedirs(self.directory, exist_ok=True)
+
+    def import_loose_files(self, directory: str, batch: int = 256) -> Iterator[int]:
+        """Move ``{key}.jpg`` files from the old one-file-per-thumbnail cache
+        into the store, deleting each file once it is packed. Yields the running
+        count after each batch.
+        """
+        names = [name for name in os.listdir(directory) if _LOOSE_RE.match(name)]
+        imported = 0
+        for i in range(0, len(names), batch):
+            items = {}
+            for name in names[i:i + batch]:
+                try:
+                    with open(os.path.join(directory, name), "rb") as f:
+                        items[name[:-len(".jpg")]] = f.read()
+                except OSError as e:
+                    logger.warning("Skipping unreadable thumbnail %s: %s", name, e)
+            with self._lock:
+                self._open()
+                for key, data in items.items():
+                    if key not in self._index:
+                        self._append(key, data)
+                self._active_file.flush()
+                os.fsync(self._active_file.fileno())
+            for key in items:
+                try:
+                    os.remove(os.path.join(directory, key + ".jpg"))
+                except OSError:
+                    pass
+            imported += len(items)
+            yield imported
+
+
+class CacheEvictor:
+    """Background thread that keeps a store within its disk budget.
+
+    Woken by writes that push the store over budget, and every
+    EVICT_INTERVAL_SECONDS in case the budget was lowered.
+    """
+
+    def __init__(self, target: ThumbnailStore):
+        self._store = target
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(self._stop,), name="thumbnail-evictor", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._store.over_budget.set()
+            self._thread.join(timeout=30)
+            self._thread = None
+
+    def _run(self, stop: threading.Event):
+        while not stop.is_set():
+            self._store.over_budget.wait(EVICT_INTERVAL_SECONDS)
+            self._store.over_budget.clear()
+            if stop.is_set():
+                break
+            try:
+                self._store.enforce_budget()
+            except Exception as e:
+                logger.error("Thumbnail cache eviction failed: %s", e)
+                stop.wait(1)
+
+
+store = ThumbnailStore(THUMBNAIL_DIR)
+evictor = CacheEvictor(store)
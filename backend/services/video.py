@@ -1,11 +1,19 @@
+import io
 import os
 import re
 import sys
 import logging
+import tempfile
 import subprocess
 from typing import Optional
 
-from config import THUMBNAIL_DIR
+from PIL import Image
+
+from services.container import read_container_info
+from services.thumbnail import (
+    PYRAMID_SIZES, has_current_renditions, load_rendition, load_thumbnail, put_thumbnail,
+    pyramid_level, render_once, render_pyramid, store_renditions,
+)
 
 logger = logging.getLogger(__name__)
 
@@ -46,11 +54,17 @@ def _run_ffmpeg(args: list[str]) -> subprocess.CompletedProcess:
 def probe_video(file_path: str) -> tuple[Optional[int], Optional[int], Optional[float]]:
     """Return (width, height, duration_seconds) for a video, best-effort.
 
-    Any field may be None if it cannot be determined.
+    The container headers are read directly (see services.container); ffmpeg
+    is only launched for files that cannot be parsed that way. Any field may
+    be None if it cannot be determined.
     """
+    info = read_container_info(file_path)
+    if info is not None and None not in info:
+        return info
+
     ffmpeg = get_ffmpeg()
     if not ffmpeg:
-        return None, None, None
+        return info or (None, None, None)
 
     width: Optional[int] = None
     height: Optional[int] = None
@@ -78,42 +92,116 @@ def probe_video(file_path: str) -> tuple[Optional[int], Optional[int], Optional[
     return width, height, duration
 
 
-def generate_video_thumbnail(photo_id: int, file_path: str, max_size: int = 300,
-                             seek: float = 1.0) -> str:
-    """Extract a single poster frame and cache it as a JPEG thumbnail.
-
-    Returns the thumbnail path, or "" on failure.
-    """
+def _extract_frame(photo_id: int, file_path: str, max_size: int,
+                   seek: float, quality: int = 3) -> bytes:
+    """Return one poster frame, fitted within max_size, as JPEG bytes (b"" on failure)."""
     ffmpeg = get_ffmpeg()
     if not ffmpeg:
-        return ""
-
-    thumb_path = os.path.join(THUMBNAIL_DIR, f"{photo_id}.jpg")
-    if os.path.exists(thumb_path):
-        return thumb_path
+        return b""
 
     # Fit the frame within a max_size box while preserving aspect ratio.
     vf = f"scale='min({max_size},iw)':'min({max_size},ih)':force_original_aspect_ratio=decrease"
 
-    # Try seeking a little into the clip first (avoids black intro frames);
-    # fall back to the very first frame for very short clips.
-    for ss in (seek, 0.0):
-        args = [
-            ffmpeg, "-y", "-hide_banner",
-            "-ss", str(ss),
-            "-i", file_path,
-            "-frames:v", "1",
-            "-vf", vf,
-            "-q:v", "3",
-            thumb_path,
-        ]
+    fd, out_path = tempfile.mkstemp(prefix="poster-", suffix=".jpg")
+    os.close(fd)
+    try:
+        # Try seeking a little into the clip first (avoids black intro frames);
+        # fall back to the very first frame for very short clips.
+        for ss in (seek, 0.0):
+            args = [
+                ffmpeg, "-y", "-hide_banner",
+                "-ss", str(ss),
+                "-i", file_path,
+                "-frames:v", "1",
+                "-vf", vf,
+                "-q:v", str(quality),
+                out_path,
+            ]
+            try:
+                _run_ffmpeg(args)
+            except Exception as e:
+                logger.warning("Failed to run ffmpeg for video %d (%s): %s", photo_id, file_path, e)
+                return b""
+            with open(out_path, "rb") as f:
+                data = f.read()
+            if data:
+                return data
+    finally:
         try:
-            _run_ffmpeg(args)
-        except Exception as e:
-            logger.warning("Failed to run ffmpeg for video %d (%s): %s", photo_id, file_path, e)
-            return ""
-        if os.path.isfile(thumb_path) and os.path.getsize(thumb_path) > 0:
-            return thumb_path
+            os.remove(out_path)
+        except OSError:
+            pass
 
     logger.warning("Failed to extract poster frame for video %d (%s)", photo_id, file_path)
-    return ""
+    return b""
+
+
+def generate_video_thumbnail(photo_id: int, file_path: str, source: str, max_size: int = 300,
+                             seek: float = 1.0) -> bytes:
+    """Extract a single poster frame and cache it as a JPEG thumbnail.
+
+    Returns the JPEG bytes, or b"" on failure.
+    """
+    data = load_thumbnail(photo_id, source, max_size)
+    if data is not None:
+        return data
+
+    def _build() -> bytes:
+        cached = load_thumbnail(photo_id, source, max_size)
+        if cached is not None:
+            return cached
+        frame = _extract_frame(photo_id, file_path, max_size, seek)
+        if frame:
+            put_thumbnail(photo_id, source, max_size, frame)
+        return frame
+
+    try:
+        return render_once(("thumbnail", photo_id, source, max_size), _build)
+    except Exception as e:
+        logger.warning("Failed to generate thumbnail for video %d (%s): %s", photo_id, file_path, e)
+        return b""
+
+
+def render_video_renditions(photo_id: int, file_path: str, seek: float = 1.0,
+                            fmt: str = "jpeg") -> dict[int, bytes]:
+    """Like render_renditions() for videos: one poster frame at the largest
+    rendition size, from which the whole pyramid is built. {} on failure.
+    """
+    frame = _extract_frame(photo_id, file_path, PYRAMID_SIZES[-1], seek, quality=2)
+    if not frame:
+        return {}
+    try:
+        with Image.open(io.BytesIO(frame)) as img:
+            return render_pyramid(img, fmt)
+    except Exception as e:
+        logger.warning("Failed to generate thumbnails for video %d (%s): %s", photo_id, file_path, e)
+        return {}
+
+
+def generate_video_rendition(photo_id: int, file_path: str, source: str, size: int,
+                             seek: float = 1.0, fmt: str = "jpeg") -> bytes:
+    """Return the cached rendition serving ``size``, rebuilding the pyramid if
+    it is missing or stale.
+
+    Returns b"" on failure.
+    """
+    level = pyramid_level(size)
+    data = load_rendition(photo_id, source, level, fmt)
+    if data is not None:
+        return data
+
+    def _build() -> dict[int, bytes]:
+        if has_current_renditions(photo_id, source, fmt):
+            return {}
+        renditions = render_video_renditions(photo_id, file_path, seek, fmt)
+        if renditions:
+            store_renditions(photo_id, source, renditions, fmt)
+        return renditions
+
+    try:
+        renditions = render_once(("pyramid", photo_id, source, fmt), _build)
+    except Exception as e:
+        logger.warning("Failed to generate thumbnails for video %d (%s): %s", photo_id, file_path, e)
+        return b""
+    data = renditions.get(level)
+    return data if data is not None else load_rendition(photo_id, source, level, fmt) or b""
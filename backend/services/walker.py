@@ -0,0 +1,217 @@
+import os
+import queue
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterable, Iterator, NamedTuple, Optional
+
+from services.pathutil import clean_path
+from services.scan_stats import ScanStats
+
+logger = logging.getLogger(__name__)
+
+# Directory listings are I/O-bound (especially on network mounts), so walk
+# sibling subtrees on more threads than there are cores.
+WALK_THREADS = 8
+
+# Entries are handed to the consumer in chunks to keep queue overhead low;
+# the queue bound keeps the walk from racing far ahead of the scan loop.
+_CHUNK_SIZE = 256
+_QUEUE_CHUNKS = 64
+
+_DONE = object()
+
+
+class _DirDone(NamedTuple):
+    key: str
+
+
+class FileEntry(NamedTuple):
+    path: str  # as listed (may carry the Windows \\?\ prefix)
+    size: int
+    mtime: float
+    ctime: float
+
+
+def dir_key(path: str) -> str:
+    """Key used for directories in the scan index (normcase'd clean path)."""
+    return os.path.normcase(clean_path(path))
+
+
+def walk_media(roots: Iterable[str], extensions: set[str],
+               excluded: set[str] | None = None,
+               threads: int = WALK_THREADS,
+               known_dirs: dict[str, tuple[float, int]] | None = None,
+               on_dir: Callable[[str, float, int, bool], None] | None = None,
+               stats: ScanStats | None = None,
+               on_dir_done: Callable[[str], None] | None = None,
+               ) -> Iterator[FileEntry]:
+    """Yield every media file under ``roots`` with its stat data.
+
+    Built on os.scandir so each file costs one DirEntry.stat() (served from the
+    directory listing on Windows) instead of a separate os.stat() pass. Sibling
+    subtrees are listed concurrently on a thread pool and entries are streamed
+    as they are found, so the yield order is not deterministic.
+
+    ``excluded`` holds normcase'd, normpath'd directory paths to prune.
+    AppleDouble files ("._*") and symlinked directories are skipped, matching
+    os.walk's defaults.
+
+    ``known_dirs`` maps dir_key() paths to the (mtime, entry_count) recorded
+    by an earlier walk. Directories that still match are listed only to find
+    their subdirectories; their files are neither statted nor yielded.
+    ``on_dir(key, mtime, entry_count, unchanged)`` is called from the walker
+    threads for every directory listed.
+
+    With ``stats``, directory listings are timed as the "walk" stage and
+    per-file stat calls as the "stat" stage.
+
+    ``on_dir_done(key)`` is called from the consuming thread once every file
+    of a (changed) directory has been yielded, i.e. after the consumer has
+    finished with them.
+    """
+    roots = [os.path.normpath(r) for r in roots]
+    if not roots:
+        return
+    track_dirs = known_dirs is not None or on_dir is not None or on_dir_done is not None
+
+    excluded = excluded or set()
+    # Only directories whose name matches an excluded folder's basename need
+    # their full path normalized and looked up.
+    excluded_names = {os.path.basename(p) for p in excluded}
+
+    out: queue.Queue = queue.Queue(maxsize=_QUEUE_CHUNKS)
+    stop = threading.Event()
+    lock = threading.Lock()
+    outstanding = len(roots)
+    pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix="scan-walk")
+
+    def _put(item) -> bool:
+        while not stop.is_set():
+            try:
+                out.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _finish_one():
+        nonlocal outstanding
+        with lock:
+            outstanding -= 1
+            done = outstanding == 0
+        if done:
+            _put(_DONE)
+
+    def _submit(path: str, mtime: Optional[float]):
+        nonlocal outstanding
+        with lock:
+            outstanding += 1
+        try:
+            pool.submit(_scan_dir, path, mtime)
+        except RuntimeError:
+            # Pool already shut down (consumer stopped iterating).
+            _finish_one()
+
+    def _is_excluded(entry: os.DirEntry) -> bool:
+        if os.path.normcase(entry.name) not in excluded_names:
+            return False
+        return os.path.normcase(os.path.normpath(clean_path(entry.path))) in excluded
+
+    def _dir_mtime(path_or_entry) -> Optional[float]:
+        if not track_dirs:
+            return None
+        try:
+            if isinstance(path_or_entry, str):
+                return os.stat(path_or_entry).st_mtime
+            return path_or_entry.stat().st_mtime
+        except OSError:
+            return None
+
+    def _scan_dir(path: str, mtime: Optional[float]):
+        chunk: list[FileEntry] = []
+        stat_seconds, stat_count = 0.0, 0
+        slowest_stat = (0.0, "")
+        done_key = None
+        try:
+            started = time.perf_counter()
+            with os.scandir(path) as it:
+                entries = list(it)
+            if stats is not None:
+                stats.add("walk", time.perf_counter() - started, path=clean_path(path))
+            unchanged = False
+            if mtime is not None:
+                key = dir_key(path)
+                if known_dirs is not None:
+                    unchanged = known_dirs.get(key) == (mtime, len(entries))
+                if on_dir is not None:
+                    on_dir(key, mtime, len(entries), unchanged)
+                if on_dir_done is not None and not unchanged:
+                    done_key = key
+            for entry in entries:
+                if stop.is_set():
+                    return
+                try:
+                    if entry.is_dir():
+                        if entry.is_symlink() or (excluded and _is_excluded(entry)):
+                            continue
+                        _submit(entry.path, _dir_mtime(entry))
+                        continue
+                    if unchanged:
+                        continue
+                    name = entry.name
+                    if name.startswith("._"):
+                        continue
+                    ext = os.path.splitext(name)[1].lower().lstrip(".")
+                    if ext not in extensions:
+                        continue
+                    if stats is None:
+                        st = entry.stat()
+                    else:
+                        started = time.perf_counter()
+                        st = entry.stat()
+                        elapsed = time.perf_counter() - started
+                        stat_seconds += elapsed
+                        stat_count += 1
+                        if elapsed > slowest_stat[0]:
+                            slowest_stat = (elapsed, entry.path)
+                except OSError as e:
+                    logger.warning("Skipped %s: %s", entry.path, e)
+                    continue
+                chunk.append(FileEntry(entry.path, st.st_size, st.st_mtime, st.st_ctime))
+                if len(chunk) >= _CHUNK_SIZE:
+                    if not _put(chunk):
+                        return
+                    chunk = []
+            if done_key is not None:
+                chunk.append(_DirDone(done_key))
+        except OSError as e:
+            logger.warning("Cannot access directory: %s", e)
+        finally:
+            if stat_count:
+                stats.add("stat", stat_seconds, stat_count)
+                stats.slow_candidate("stat", slowest_stat[0], clean_path(slowest_stat[1]))
+            if chunk:
+                _put(chunk)
+            _finish_one()
+
+    for root in roots:
+        pool.submit(_scan_dir, root, _dir_mtime(root))
+
+    try:
+        while True:
+            item = out.get()
+            if item is _DONE:
+                break
+            if on_dir_done is None:
+                yield from item
+                continue
+            for entry in item:
+                if type(entry) is _DirDone:
+                    on_dir_done(entry.key)
+                else:
+                    yield entry
+    finally:
+        stop.set()
+        pool.shutdown(wait=True, cancel_futures=True)
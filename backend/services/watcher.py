@@ -0,0 +1,329 @@
+import os
+import sys
+import time
+import errno
+import select
+import struct
+import ctypes
+import ctypes.util
+import logging
+import threading
+from datetime import datetime
+from typing import Callable, Optional
+
+from services.pathutil import clean_path, long_path
+
+logger = logging.getLogger(__name__)
+
+# A batch is flushed once no new event has arrived for DEBOUNCE_SECONDS, or
+# at the latest MAX_LATENCY_SECONDS after its first event.
+DEBOUNCE_SECONDS = 1.0
+MAX_LATENCY_SECONDS = 5.0
+POLL_INTERVAL_SECONDS = 5.0
+# Delay before retrying a batch the consumer could not take (scan running).
+RETRY_SECONDS = 5.0
+
+# inotify(7) constants
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_FROM = 0x00000040
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE = 0x00000200
+_IN_DELETE_SELF = 0x00000400
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ONLYDIR = 0x01000000
+_IN_ISDIR = 0x40000000
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+_WATCH_MASK = (_IN_CLOSE_WRITE | _IN_MOVED_FROM | _IN_MOVED_TO | _IN_CREATE
+               | _IN_DELETE | _IN_DELETE_SELF | _IN_ONLYDIR)
+_EVENT_HEADER = struct.Struct("iIII")
+
+watch_status = {
+    "is_watching": False,
+    "backend": None,
+    "pending": 0,
+    "batches": 0,
+    "last_batch_size": 0,
+    "last_batch_at": None,
+    "error": None,
+}
+
+
+def _load_libc():
+    if not sys.platform.startswith("linux"):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.inotify_init1.argtypes = [ctypes.c_int]
+        libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        return libc
+    except (OSError, AttributeError):
+        return None
+
+
+class _InotifyBackend:
+    """Recursive inotify watch of a directory tree (Linux only)."""
+
+    name = "inotify"
+
+    def __init__(self, libc, root: str, is_excluded: Callable[[str], bool]):
+        self._libc = libc
+        self._root = root
+        self._is_excluded = is_excluded
+        self._wd_paths: dict[int, str] = {}
+        self._fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        try:
+            self._add_tree(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_tree(self, top: str):
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(path), _WATCH_MASK)
+            if wd < 0:
+                err = ctypes.get_errno()
+                if err == errno.ENOSPC:
+                    raise OSError(err, "inotify watch limit reached (fs.inotify.max_user_watches)")
+                continue
+            self._wd_paths[wd] = path
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if (entry.is_dir(follow_symlinks=False)
+                                and not self._is_excluded(entry.path)):
+                            stack.append(entry.path)
+            except OSError:
+                pass
+
+    def _drop_tree(self, top: str):
+        for wd, path in list(self._wd_paths.items()):
+            if path == top or path.startswith(top + os.sep):
+                self._libc.inotify_rm_watch(self._fd, wd)
+                self._wd_paths.pop(wd, None)
+
+    def poll(self, timeout: float) -> tuple[set[str], set[str]]:
+        """Wait up to ``timeout`` for events; return (paths, shallow_dirs)."""
+        paths: set[str] = set()
+        ready, _, _ = select.select([self._fd], [], [], timeout)
+        if not ready:
+            return paths, set()
+        try:
+            data = os.read(self._fd, 256 * 1024)
+        except BlockingIOError:
+            return paths, set()
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0")
+            offset += length
+
+            if mask & _IN_Q_OVERFLOW:
+                logger.warning("inotify queue overflowed; resyncing %s", self._root)
+                paths.add(self._root)
+                continue
+            if mask & _IN_IGNORED:
+                self._wd_paths.pop(wd, None)
+                continue
+            parent = self._wd_paths.get(wd)
+            if parent is None:
+                continue
+            if mask & _IN_DELETE_SELF:
+                paths.add(parent)
+                continue
+            path = os.path.join(parent, os.fsdecode(name))
+            if mask & _IN_ISDIR:
+                if self._is_excluded(path):
+                    continue
+                if mask & (_IN_CREATE | _IN_MOVED_TO):
+                    self._add_tree(path)
+                elif mask & _IN_MOVED_FROM:
+                    self._drop_tree(path)
+                paths.add(path)
+            elif not (mask & _IN_CREATE):
+                # Files are reported once written (IN_CLOSE_WRITE), not when
+                # created empty.
+                paths.add(path)
+        return paths, set()
+
+    def close(self):
+        try:
+            os.close(self._fd)
+        except OSError:
+            pass
+
+
+class _PollingBackend:
+    """Portable fallback: polls directory mtimes.
+
+    Only directories are tracked, so this notices files being added, removed or
+    renamed (which touch the parent directory's mtime) but not in-place edits
+    of existing files; a full scan still catches those.
+    """
+
+    name = "polling"
+
+    def __init__(self, root: str, is_excluded: Callable[[str], bool]):
+        self._root = root
+        self._is_excluded = is_excluded
+        self._dirs: dict[str, float] = {}
+        self._snapshot(root, self._dirs)
+
+    def _snapshot(self, top: str, into: dict[str, float]):
+        stack = [top]
+        while stack:
+            path = stack.pop()
+            try:
+                into[path] = os.stat(path).st_mtime
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if (entry.is_dir(follow_symlinks=False)
+                                and not self._is_excluded(entry.path)):
+                            stack.append(entry.path)
+            except OSError:
+                into.pop(path, None)
+
+    def poll(self, timeout: float) -> tuple[set[str], set[str]]:
+        time.sleep(timeout)
+        paths: set[str] = set()
+        shallow: set[str] = set()
+        for path, mtime in list(self._dirs.items()):
+            if path not in self._dirs:
+                continue  # dropped along with a vanished parent below
+            try:
+                current = os.stat(path).st_mtime
+            except OSError:
+                paths.add(path)
+                for d in [d for d in self._dirs if d == path or d.startswith(path + os.sep)]:
+                    del self._dirs[d]
+                continue
+            if current == mtime:
+                continue
+            self._dirs[path] = current
+            shallow.add(path)
+            try:
+                with os.scandir(path) as it:
+                    for entry in it:
+                        if (entry.is_dir(follow_symlinks=False)
+                                and entry.path not in self._dirs
+                                and not self._is_excluded(entry.path)):
+                            self._snapshot(entry.path, self._dirs)
+                            paths.add(entry.path)
+            except OSError:
+                pass
+        return paths, shallow
+
+    def close(self):
+        pass
+
+
+class FolderWatcher:
+    """Watches a library folder and feeds debounced change batches to a callback.
+
+    ``on_batch(paths, shallow_dirs)`` runs on the watcher thread and should
+    return False if it could not take the batch right now (e.g. a scan is
+    running); the batch is then kept and retried.
+    """
+
+    def __init__(self, on_batch: Callable[[set[str], set[str]], bool]):
+        self._on_batch = on_batch
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self, root_folder: str, excluded_folders: set[str] | None = None):
+        self.stop()
+        root = long_path(os.path.normpath(root_folder))
+        if not os.path.isdir(root):
+            watch_status["error"] = f"Folder not found: {root_folder}"
+            return
+        excluded = {os.path.normcase(os.path.normpath(f)) for f in (excluded_folders or set())}
+
+        def _is_excluded(path: str) -> bool:
+            return os.path.normcase(os.path.normpath(clean_path(path))) in excluded
+
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run, args=(root, _is_excluded, self._stop),
+            name="folder-watcher", daemon=True,
+        )
+        self._thread.start()
+
+    def stop(self):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join(timeout=POLL_INTERVAL_SECONDS + 1)
+            self._thread = None
+        watch_status["is_watching"] = False
+        watch_status["backend"] = None
+        watch_status["pending"] = 0
+
+    def _run(self, root: str, is_excluded: Callable[[str], bool], stop: threading.Event):
+        backend = None
+        try:
+            libc = _load_libc()
+            if libc is not None:
+                try:
+                    backend = _InotifyBackend(libc, root, is_excluded)
+                except OSError as e:
+                    logger.warning("inotify unavailable, falling back to polling: %s", e)
+            if backend is None:
+                backend = _PollingBackend(root, is_excluded)
+            if backend.name == "inotify":
+                poll_timeout, debounce = DEBOUNCE_SECONDS / 2, DEBOUNCE_SECONDS
+            else:
+                # Each poll already spans a whole interval; flush right after it.
+                poll_timeout, debounce = POLL_INTERVAL_SECONDS, 0.0
+
+            watch_status.update(is_watching=True, backend=backend.name, error=None)
+            logger.info("Watching %s (%s)", root, backend.name)
+
+            paths: set[str] = set()
+            shallow: set[str] = set()
+            first_at = last_at = 0.0
+            retry_at = 0.0
+            while not stop.is_set():
+                new_paths, new_shallow = backend.poll(poll_timeout)
+                now = time.monotonic()
+                if new_paths or new_shallow:
+                    if not (paths or shallow):
+                        first_at = now
+                    last_at = now
+                    paths |= new_paths
+                    shallow |= new_shallow
+                watch_status["pending"] = len(paths) + len(shallow)
+
+                if not (paths or shallow) or now < retry_at:
+                    continue
+                if now - last_at < debounce and now - first_at < MAX_LATENCY_SECONDS:
+                    continue
+
+                try:
+                    taken = self._on_batch(paths, shallow)
+                except Exception as e:
+                    logger.error("Failed to apply watch batch: %s", e)
+                    watch_status["error"] = str(e)
+                    taken = True  # drop it; the next full scan reconciles
+                if not taken:
+                    retry_at = now + RETRY_SECONDS
+                    continue
+                watch_status["batches"] += 1
+                watch_status["last_batch_size"] = len(paths) + len(shallow)
+                watch_status["last_batch_at"] = datetime.now().isoformat()
+                paths, shallow = set(), set()
+                watch_status["pending"] = 0
+        except Exception as e:
+            watch_status["error"] = str(e)
+            logger.error("Folder watcher stopped: %s", e)
+        finally:
+            if backend is not None:
+                backend.close()
+            watch_status["is_watching"] = False
@@ -0,0 +1,39 @@
+"""Benchmark probe_video's container reader against its ffmpeg fallback.
+
+Run from the backend directory: ``python -m tests.bench_container [rounds]``.
+"""
+import sys
+import tempfile
+import time
+
+from services import video
+from services.container import read_container_info
+from tests.samples import encode_samples
+
+
+def _per_call_ms(fn, path: str, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(path)
+    return (time.perf_counter() - started) * 1000 / rounds
+
+
+def main(rounds: int = 20):
+    with tempfile.TemporaryDirectory() as directory:
+        samples = encode_samples(directory)
+        if samples is None:
+            sys.exit("ffmpeg unavailable")
+        reader = video.read_container_info
+        print(f"{'sample':<18}{'reader ms':>11}{'ffmpeg ms':>11}{'speedup':>9}")
+        for name, path in samples.items():
+            fast = _per_call_ms(read_container_info, path, rounds * 10)
+            video.read_container_info = lambda _: None
+            try:
+                slow = _per_call_ms(video.probe_video, path, rounds)
+            finally:
+                video.read_container_info = reader
+            print(f"{name:<18}{fast:>11.3f}{slow:>11.1f}{slow / fast:>8.0f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
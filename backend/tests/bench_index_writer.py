@@ -0,0 +1,99 @@
+"""Benchmark the scanner's write stage: _IndexWriter's batched executemany
+against one ORM add (or query.update) per row, committed every 100 rows as
+the scanner used to.
+
+Run from the backend directory: ``python -m tests.bench_index_writer [rows]``.
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import models  # noqa: F401
+from database import Base
+from models.photo import Photo
+from services import scanner
+from services.walker import FileEntry
+
+META = (4000, 3000, None, None)
+
+
+def _session(directory: str, name: str):
+    engine = create_engine(f"sqlite:///{os.path.join(directory, name)}")
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(bind=engine)
+    return sessionmaker(autoflush=False, bind=engine)()
+
+
+def _entry(i: int, version: int) -> FileEntry:
+    return FileEntry(f"/library/d{i // 1000}/img{i}.jpg", 1000 * version + i,
+                     1.7e9 + version * 1e6 + i, 1.7e9 + i)
+
+
+def _batched(db, rows: int, version: int, ids: dict[str, int] | None):
+    writer = scanner._IndexWriter(db, workers=1, processes=False)
+    for i in range(rows):
+        entry = _entry(i, version)
+        cached = scanner.CachedRow(0, 0, ids[entry.path], False, False) if ids else None
+        writer._apply(scanner._Job(i, entry, f"img{i}.jpg", "jpg", False, cached), META)
+    writer.close()
+
+
+def _per_row(db, rows: int, version: int, ids: dict[str, int] | None):
+    now = datetime.now().isoformat()
+    for i in range(rows):
+        entry = _entry(i, version)
+        modified_at = datetime.fromtimestamp(entry.mtime).isoformat()
+        if ids:
+            db.query(Photo).filter(Photo.id == ids[entry.path]).update({
+                "file_size": entry.size, "modified_at": modified_at,
+                "width": META[0], "height": META[1], "scanned_at": now,
+            })
+        else:
+            db.add(Photo(
+                file_path=entry.path, file_name=f"img{i}.jpg", extension="jpg",
+                file_size=entry.size, width=META[0], height=META[1],
+                created_at=modified_at, modified_at=modified_at, is_favorite=0,
+                scanned_at=now,
+            ))
+        if (i + 1) % 100 == 0:
+            db.commit()
+    db.commit()
+
+
+def _rows_per_second(write, db, rows: int, version: int, ids=None) -> float:
+    started = time.perf_counter()
+    write(db, rows, version, ids)
+    return rows / (time.perf_counter() - started)
+
+
+def main(rows: int = 20_000):
+    logging.disable(logging.WARNING)
+    scanner.discard_thumbnails = lambda ids: None  # keep away from the app's store
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'write':<10}{'per row':>12}{'batched':>12}{'speedup':>9}   rows/s, {rows} rows")
+        results = {}
+        for name, write in (("per row", _per_row), ("batched", _batched)):
+            db = _session(directory, f"{name.replace(' ', '_')}.db")
+            insert = _rows_per_second(write, db, rows, 1)
+            ids = dict(db.query(Photo.file_path, Photo.id))
+            update = _rows_per_second(write, db, rows, 2, ids)
+            assert db.query(Photo).filter(Photo.file_size >= 2000).count() == rows
+            results[name] = (insert, update)
+            db.close()
+        for i, stage in enumerate(("insert", "update")):
+            slow, fast = results["per row"][i], results["batched"][i]
+            print(f"{stage:<10}{slow:>12,.0f}{fast:>12,.0f}{fast / slow:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
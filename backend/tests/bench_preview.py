@@ -0,0 +1,50 @@
+"""Benchmark thumbnail rendering from embedded JPEG previews against a full
+decode of the same camera-sized files.
+
+Run from the backend directory: ``python -m tests.bench_preview [rounds]``.
+"""
+import os
+import sys
+import tempfile
+import time
+
+from services import thumbnail
+from services.jpeg_preview import read_preview
+from tests.samples import camera_jpeg
+
+# Name -> camera_jpeg() arguments; 6000x4000 is a 24 MP frame.
+SAMPLES = {
+    "exif_160.jpg": dict(width=6000, height=4000),
+    "mpf_1620.jpg": dict(width=6000, height=4000, preview=1620),
+}
+SIZES = (160, 300, 1200)
+
+
+def _per_call_ms(fn, rounds: int, *args) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(*args)
+    return (time.perf_counter() - started) * 1000 / rounds
+
+
+def main(rounds: int = 5):
+    with tempfile.TemporaryDirectory() as directory:
+        print(f"{'sample':<15}{'size':>6}{'preview':>9}{'ms':>9}{'decode ms':>11}{'speedup':>9}")
+        for name, options in SAMPLES.items():
+            path = os.path.join(directory, name)
+            with open(path, "wb") as f:
+                f.write(camera_jpeg(**options))
+            for size in SIZES:
+                used = read_preview(path, size) is not None
+                fast = _per_call_ms(thumbnail.render_thumbnail, rounds, path, size)
+                thumbnail.read_preview = lambda *_: None
+                try:
+                    slow = _per_call_ms(thumbnail.render_thumbnail, rounds, path, size)
+                finally:
+                    thumbnail.read_preview = read_preview
+                print(f"{name:<15}{size:>6}{'yes' if used else 'no':>9}{fast:>9.1f}"
+                      f"{slow:>11.1f}{slow / fast:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
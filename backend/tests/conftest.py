@@ -0,0 +1,23 @@
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+
+import models  # noqa: F401
+from database import Base
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A session on an empty database of the app's schema, in a temp file."""
+    engine = create_engine(f"sqlite:///{tmp_path / 'app.db'}",
+                           connect_args={"check_same_thread": False})
+
+    @event.listens_for(engine, "connect")
+    def _pragmas(dbapi_connection, _):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+
+    Base.metadata.create_all(bind=engine)
+    session = sessionmaker(autoflush=False, bind=engine)()
+    yield session
+    session.close()
+    engine.dispose()
@@ -0,0 +1,143 @@
+"""Small media files for the reader tests and benchmarks: videos encoded
+with the bundled ffmpeg or written byte by byte, and camera-style JPEGs with
+embedded previews."""
+import io
+import os
+import struct
+import subprocess
+from typing import Optional
+
+from PIL import Image, ImageDraw
+
+from services.video import get_ffmpeg
+
+WIDTH, HEIGHT, SECONDS = 320, 240, 2.4
+
+# File name -> ffmpeg output options. Encoded from a generated test pattern.
+ENCODED = {
+    "moov_at_end.mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p"],
+    "faststart.mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-movflags", "+faststart"],
+    "fragmented.mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p",
+                       "-movflags", "frag_keyframe+empty_moov"],
+    "clip.mov": ["-c:v", "libx264", "-pix_fmt", "yuv420p"],
+    "clip.webm": ["-c:v", "libvpx", "-b:v", "200k"],
+    "clip.mkv": ["-c:v", "libx264", "-pix_fmt", "yuv420p"],
+}
+
+
+def encode_samples(directory: str) -> Optional[dict[str, str]]:
+    """Encode the ENCODED samples into ``directory``; None without ffmpeg."""
+    ffmpeg = get_ffmpeg()
+    if not ffmpeg:
+        return None
+    paths = {}
+    for name, options in ENCODED.items():
+        path = os.path.join(directory, name)
+        subprocess.run(
+            [ffmpeg, "-loglevel", "error", "-y", "-f", "lavfi",
+             "-i", f"testsrc=size={WIDTH}x{HEIGHT}:rate=25", "-t", str(SECONDS), *options, path],
+            check=True,
+        )
+        paths[name] = path
+    return paths
+
+
+def box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def handmade_mp4(width: int, height: int, timescale: int, duration: int) -> bytes:
+    """ftyp, mdat and a moov with just the boxes the reader looks at."""
+    mvhd = struct.pack(">4xIIII", 0, 0, timescale, duration) + bytes(80)
+    tkhd = bytes(76) + struct.pack(">II", width << 16, height << 16)
+    hdlr = bytes(8) + b"vide" + bytes(12) + b"\0"
+    trak = box(b"trak", box(b"tkhd", tkhd) + box(b"mdia", box(b"hdlr", hdlr)))
+    return (box(b"ftyp", b"isom" + bytes(4) + b"isommp41")
+            + box(b"mdat", bytes(64))
+            + box(b"moov", box(b"mvhd", mvhd) + trak))
+
+
+def _element(eid: int, payload: bytes) -> bytes:
+    eid_bytes = eid.to_bytes((eid.bit_length() + 7) // 8, "big")
+    return eid_bytes + (0x0100000000000000 | len(payload)).to_bytes(8, "big") + payload
+
+
+def _uint_element(eid: int, value: int) -> bytes:
+    return _element(eid, value.to_bytes(4, "big"))
+
+
+def handmade_webm(width: int, height: int, milliseconds: float) -> bytes:
+    """EBML header and a Segment holding Info, Tracks and an empty Cluster."""
+    ebml = _element(0x1A45DFA3, _element(0x4282, b"webm"))
+    info = _element(0x1549A966, _uint_element(0x2AD7B1, 1_000_000)
+                    + _element(0x4489, struct.pack(">d", milliseconds)))
+    video = _element(0xE0, _uint_element(0xB0, width) + _uint_element(0xBA, height))
+    tracks = _element(0x1654AE6B, _element(0xAE, _uint_element(0x83, 1) + video))
+    cluster = _element(0x1F43B675, _uint_element(0xE7, 0))
+    return ebml + _element(0x18538067, info + tracks + cluster)
+
+
+def _jpeg(img: Image.Image, quality: int = 90) -> bytes:
+    buf = io.BytesIO()
+    img.save(buf, "JPEG", quality=quality)
+    return buf.getvalue()
+
+
+def _exif_app1(orientation: int, thumbnail: Optional[bytes]) -> bytes:
+    """APP1 with IFD0 holding Orientation and, given a thumbnail, an IFD1
+    pointing at it (little-endian, like most cameras)."""
+    ifd1_offset = 8 + 2 + 12 + 4 if thumbnail is not None else 0
+    ifd0 = (struct.pack("<H", 1) + struct.pack("<HHIHH", 0x0112, 3, 1, orientation, 0)
+            + struct.pack("<I", ifd1_offset))
+    ifd1 = b""
+    if thumbnail is not None:
+        data_offset = ifd1_offset + 2 + 2 * 12 + 4
+        ifd1 = (struct.pack("<H", 2) + struct.pack("<HHII", 0x0201, 4, 1, data_offset)
+                + struct.pack("<HHII", 0x0202, 4, 1, len(thumbnail)) + struct.pack("<I", 0)
+                + thumbnail)
+    payload = b"Exif\0\0" + b"II*\0" + struct.pack("<I", 8) + ifd0 + ifd1
+    return b"\xff\xe1" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def _mpf_app2(primary_size: int, preview_size: int, preview_offset: int) -> bytes:
+    """APP2 listing the primary image and one full-HD preview (big-endian).
+    ``preview_offset`` counts from the MPF TIFF header, as the format says."""
+    entries_offset = 8 + 2 + 3 * 12 + 4
+    ifd = (struct.pack(">H", 3) + struct.pack(">HHI4s", 0xB000, 7, 4, b"0100")
+           + struct.pack(">HHII", 0xB001, 4, 1, 2)
+           + struct.pack(">HHII", 0xB002, 7, 32, entries_offset) + struct.pack(">I", 0))
+    entries = (struct.pack(">IIIHH", 0x20030000, primary_size, 0, 0, 0)
+               + struct.pack(">IIIHH", 0x00010002, preview_size, preview_offset, 0, 0))
+    payload = b"MPF\0" + b"MM\0*" + struct.pack(">I", 8) + ifd + entries
+    return b"\xff\xe2" + struct.pack(">H", len(payload) + 2) + payload
+
+
+def camera_jpeg(width: int, height: int, thumbnail: Optional[int] = 160,
+                preview: Optional[int] = None, orientation: int = 1,
+                truncate_preview: int = 0) -> bytes:
+    """A JPEG laid out like a camera's: EXIF (Orientation and, unless
+    ``thumbnail`` is None, a thumbnail that size) and, given ``preview``, an
+    MPF preview that size appended after the primary image, minus its last
+    ``truncate_preview`` bytes. Previews are grey with a black left half, so
+    tests can tell them (and which way up they are) from the primary image,
+    which is red with a blue right half."""
+    img = Image.new("RGB", (width, height), "red")
+    ImageDraw.Draw(img).rectangle((width // 2, 0, width, height), fill="blue")
+    primary = _jpeg(img)
+
+    def shrunk(size: int) -> bytes:
+        small = Image.new("RGB", (width, height), "grey")
+        ImageDraw.Draw(small).rectangle((0, 0, width // 2, height), fill="black")
+        small.thumbnail((size, size))
+        return _jpeg(small, 80)
+
+    app1 = _exif_app1(orientation, shrunk(thumbnail) if thumbnail is not None else None)
+    if preview is None:
+        return primary[:2] + app1 + primary[2:]
+    preview_data = shrunk(preview)
+    app2_size = len(_mpf_app2(0, 0, 0))
+    mpf_base = 2 + len(app1) + 4 + 4  # SOI, APP1, APP2 marker and length, "MPF\0"
+    primary_size = len(primary) + len(app1) + app2_size
+    app2 = _mpf_app2(primary_size, len(preview_data), primary_size - mpf_base)
+    data = primary[:2] + app1 + app2 + primary[2:] + preview_data
+    return data[:len(data) - truncate_preview]
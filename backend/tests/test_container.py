@@ -0,0 +1,97 @@
+import subprocess
+
+import pytest
+
+from services import video
+from services.container import read_container_info
+from tests.samples import (
+    ENCODED, HEIGHT, SECONDS, WIDTH, box, encode_samples, handmade_mp4, handmade_webm,
+)
+
+
+@pytest.fixture(scope="module")
+def encoded(tmp_path_factory):
+    paths = encode_samples(str(tmp_path_factory.mktemp("videos")))
+    if paths is None:
+        pytest.skip("ffmpeg unavailable")
+    return paths
+
+
+def ffmpeg_probe(path, monkeypatch):
+    """probe_video's answer with the container reader out of the way."""
+    with monkeypatch.context() as m:
+        m.setattr(video, "read_container_info", lambda _: None)
+        return video.probe_video(path)
+
+
+@pytest.fixture
+def ffmpeg_calls(monkeypatch):
+    """Stand-in ffmpeg that records its calls and reports a 640x360, 3.5 s clip."""
+    calls = []
+
+    def run(args):
+        calls.append(args)
+        stderr = (b"  Duration: 00:00:03.50, start: 0.000000, bitrate: 100 kb/s\n"
+                  b"  Stream #0:0: Video: h264, yuv420p, 640x360, 25 fps\n")
+        return subprocess.CompletedProcess(args, 1, b"", stderr)
+
+    monkeypatch.setattr(video, "get_ffmpeg", lambda: "ffmpeg")
+    monkeypatch.setattr(video, "_run_ffmpeg", run)
+    return calls
+
+
+@pytest.mark.parametrize("name", [n for n in ENCODED if n != "fragmented.mp4"])
+def test_reader_matches_ffmpeg(encoded, name, monkeypatch):
+    width, height, seconds = read_container_info(encoded[name])
+    expected = ffmpeg_probe(encoded[name], monkeypatch)
+    assert (width, height) == expected[:2] == (WIDTH, HEIGHT)
+    assert seconds == pytest.approx(expected[2], abs=0.05)
+    assert seconds == pytest.approx(SECONDS, abs=0.05)
+
+
+def test_fragmented_mp4_without_duration_falls_back(encoded, monkeypatch):
+    # empty_moov with no mehd: the headers carry the size but no duration.
+    assert read_container_info(encoded["fragmented.mp4"]) == (WIDTH, HEIGHT, None)
+    probed = video.probe_video(encoded["fragmented.mp4"])
+    assert probed[:2] == (WIDTH, HEIGHT)
+    assert probed[2] == pytest.approx(ffmpeg_probe(encoded["fragmented.mp4"], monkeypatch)[2])
+
+
+def test_truncated_moov_falls_back(encoded, tmp_path, ffmpeg_calls):
+    data = open(encoded["moov_at_end.mp4"], "rb").read()
+    path = tmp_path / "truncated.mp4"
+    path.write_bytes(data[:-100])
+    assert read_container_info(str(path)) is None
+    assert video.probe_video(str(path)) == (640, 360, 3.5)
+    assert len(ffmpeg_calls) == 1
+
+
+def test_handmade_files_need_no_ffmpeg(tmp_path, ffmpeg_calls):
+    mp4 = tmp_path / "handmade.mp4"
+    mp4.write_bytes(handmade_mp4(1920, 1080, timescale=600, duration=4500))
+    webm = tmp_path / "handmade.webm"
+    webm.write_bytes(handmade_webm(1280, 720, milliseconds=12345.0))
+    assert video.probe_video(str(mp4)) == (1920, 1080, 7.5)
+    assert video.probe_video(str(webm)) == (1280, 720, pytest.approx(12.345))
+    assert ffmpeg_calls == []
+
+
+@pytest.mark.parametrize("data", [
+    # A top-level box claiming to run past the end of the file.
+    box(b"ftyp", b"isom" + bytes(8)) + b"\xff\xff\xff\xf0moov" + bytes(32),
+    # A box size smaller than its own header.
+    box(b"ftyp", b"isom" + bytes(8)) + b"\x00\x00\x00\x04moov" + bytes(32),
+    # moov cut off half way through.
+    handmade_mp4(1920, 1080, 600, 4500)[:-40],
+    # Not a container at all.
+    b"\x00\x01\x02\x03 garbage, not a video" * 4,
+    # Matroska whose Segment size runs past a truncated file.
+    handmade_webm(1280, 720, 1000.0)[:30],
+], ids=["oversized-box", "undersized-box", "truncated-moov", "garbage", "truncated-webm"])
+def test_garbage_atoms_fall_back(tmp_path, ffmpeg_calls, data):
+    path = tmp_path / "broken.mp4"
+    path.write_bytes(data)
+    info = read_container_info(str(path))
+    assert info is None or None in info
+    assert video.probe_video(str(path)) == (640, 360, 3.5)
+    assert len(ffmpeg_calls) == 1
@@ -0,0 +1,83 @@
+import io
+
+import pytest
+from PIL import Image, ImageStat
+
+from services.jpeg_preview import read_preview
+from services.thumbnail import render_display, render_thumbnail
+from tests.samples import camera_jpeg
+
+
+def write(tmp_path, data: bytes, name: str = "photo.jpg") -> str:
+    path = tmp_path / name
+    path.write_bytes(data)
+    return str(path)
+
+
+def decoded(data: bytes) -> Image.Image:
+    img = Image.open(io.BytesIO(data))
+    img.load()
+    return img
+
+
+def from_preview(img: Image.Image) -> bool:
+    """Previews in the samples are grey and black; the primary image is red and blue."""
+    r, g, b = img.convert("RGB").getpixel((img.width * 3 // 4, img.height * 3 // 4))
+    return abs(r - g) < 16 and abs(g - b) < 16
+
+
+def dark_side(img: Image.Image) -> str:
+    """The half of an upright preview that is black."""
+    img = img.convert("L")
+    w, h = img.size
+    halves = {"left": (0, 0, w // 2, h), "right": (w // 2, 0, w, h),
+              "top": (0, 0, w, h // 2), "bottom": (0, h // 2, w, h)}
+    return min(halves, key=lambda side: ImageStat.Stat(img.crop(halves[side])).mean[0])
+
+
+@pytest.mark.parametrize("min_size, expected", [
+    (100, (160, 107)),  # the EXIF thumbnail is enough
+    (160, (160, 107)),
+    (161, (600, 400)),  # too small: the MPF preview
+    (600, (600, 400)),
+    (601, None),        # neither: decode the image itself
+])
+def test_smallest_preview_at_least_min_size(tmp_path, min_size, expected):
+    path = write(tmp_path, camera_jpeg(1200, 800, preview=600))
+    preview = read_preview(path, min_size)
+    assert (decoded(preview).size if preview else None) == expected
+
+
+def test_exif_thumbnail_only(tmp_path):
+    path = write(tmp_path, camera_jpeg(1200, 800))
+    assert decoded(read_preview(path, 120)).size == (160, 107)
+    assert read_preview(path, 300) is None
+
+
+@pytest.mark.parametrize("data", [
+    camera_jpeg(1200, 800, thumbnail=None),
+    camera_jpeg(1200, 800, thumbnail=None, preview=600, truncate_preview=100),
+], ids=["absent", "truncated"])
+def test_falls_back_to_full_decode(tmp_path, data):
+    path = write(tmp_path, data)
+    assert read_preview(path, 300) is None
+    for rendered in (render_thumbnail(path, 300), render_display(path, 300)):
+        img = decoded(rendered)
+        assert img.size == (300, 200) and not from_preview(img)
+
+
+def test_not_a_jpeg(tmp_path):
+    path = tmp_path / "photo.png"
+    Image.new("RGB", (1200, 800)).save(path)
+    assert read_preview(str(path), 100) is None
+
+
+@pytest.mark.parametrize("orientation, size, dark", [
+    (1, (300, 200), "left"), (3, (300, 200), "right"),
+    (6, (200, 300), "top"), (8, (200, 300), "bottom"),
+])
+def test_display_from_preview_is_upright(tmp_path, orientation, size, dark):
+    # The preview carries no EXIF of its own; the primary image's orientation applies.
+    path = write(tmp_path, camera_jpeg(1200, 800, preview=600, orientation=orientation))
+    img = decoded(render_display(path, 300))
+    assert img.size == size and from_preview(img) and dark_side(img) == dark
@@ -0,0 +1,221 @@
+from datetime import datetime
+
+import pytest
+from PIL import Image
+from sqlalchemy import text
+
+from models.photo import Photo
+from models.scan_failure import ScanFailure
+from services import scanner
+from services.walker import FileEntry
+
+
+@pytest.fixture(autouse=True)
+def discarded(monkeypatch):
+    """Ids whose thumbnails scans discarded, kept away from the app's store."""
+    ids = []
+    monkeypatch.setattr(scanner, "discard_thumbnails", ids.extend)
+    return ids
+
+
+def scan(db, root, **kwargs):
+    scanner.scan_folder(str(root), {"jpg", "png"}, db, workers=1, **kwargs)
+    assert scanner.scan_status["error"] is None
+    db.expire_all()
+
+
+def photo(db, path):
+    return db.query(Photo).filter(Photo.file_path == str(path)).one_or_none()
+
+
+def write_image(path, size=(40, 30), color="red"):
+    Image.new("RGB", size, color).save(path)
+
+
+def last_report(db) -> dict:
+    return scanner.scan_history(db, 1)[0]
+
+
+def library(tmp_path, *names):
+    """A library folder holding an image at each relative path in ``names``."""
+    root = tmp_path / "lib"
+    for name in names:
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        write_image(root / name)
+    return root
+
+
+def expire_failures(db):
+    """Move every recorded failure's retry time into the past."""
+    db.query(ScanFailure).update({"retry_after": "2000-01-01T00:00:00"})
+    db.commit()
+
+
+def test_failed_read_backs_off_then_retries(db, tmp_path, monkeypatch):
+    root = tmp_path / "lib"
+    root.mkdir()
+    path = root / "a.jpg"
+    write_image(path)
+    reads = []
+
+    def read_image_info(fpath):
+        reads.append(fpath)
+        if len(reads) <= 2:
+            raise OSError("decoder hiccup")
+        return real_read(fpath)
+
+    real_read = scanner.read_image_info
+    monkeypatch.setattr(scanner, "read_image_info", read_image_info)
+
+    scan(db, root)
+    assert photo(db, path) is None
+    assert db.query(ScanFailure).one().attempts == 1
+
+    # Inside the backoff window the unchanged file is not read again.
+    scan(db, root)
+    assert len(reads) == 1 and photo(db, path) is None
+
+    # After it, the same file is retried (and fails again: longer backoff).
+    expire_failures(db)
+    scan(db, root)
+    failure = db.query(ScanFailure).one()
+    assert len(reads) == 2 and failure.attempts == 2
+    assert failure.retry_after > datetime.now().isoformat()
+
+    expire_failures(db)
+    scan(db, root)
+    row = photo(db, path)
+    assert len(reads) == 3 and (row.width, row.height) == (40, 30)
+    assert db.query(ScanFailure).count() == 0
+
+    # Now it is simply unchanged.
+    scan(db, root)
+    assert len(reads) == 3
+
+
+def test_bad_row_does_not_drop_its_batch(db, tmp_path):
+    writer = scanner._IndexWriter(db, workers=1, processes=False)
+    jobs = []
+    for i, name in enumerate(["a.jpg", None, "c.jpg"]):  # file_name is NOT NULL
+        entry = FileEntry(str(tmp_path / f"{i}.jpg"), 100 + i, 1.7e9, 1.7e9)
+        jobs.append(scanner._Job(i, entry, name, "jpg", False, None))
+    for job in jobs:
+        writer.written += 1
+        writer._apply(job, (40, 30, None, None))
+    writer.close()
+
+    db.expire_all()
+    assert sorted(p.file_name for p in db.query(Photo)) == ["a.jpg", "c.jpg"]
+    assert (writer.written, writer.skipped) == (2, 1)
+    failure = db.query(ScanFailure).one()
+    assert failure.file_path == str(tmp_path / "1.jpg")
+    assert failure.error_class == "IntegrityError"
+
+
+def test_quick_scan_skips_unchanged_directories(db, tmp_path):
+    root = library(tmp_path, "a/1.jpg", "b/2.jpg")
+    scan(db, root)
+
+    write_image(root / "b" / "2.jpg", size=(80, 60))  # edited in place: b's listing is unchanged
+    write_image(root / "a" / "3.jpg")
+    scan(db, root, quick=True)
+    assert photo(db, root / "a" / "3.jpg") is not None
+    assert photo(db, root / "b" / "2.jpg").width == 40
+    assert last_report(db)["total"] == 2  # b was not listed
+
+    # A full scan still checks every file.
+    scan(db, root)
+    assert photo(db, root / "b" / "2.jpg").width == 80
+
+
+def test_quick_scan_sees_new_subdirectories(db, tmp_path):
+    root = library(tmp_path, "a/1.jpg")
+    scan(db, root)
+    (root / "a" / "new").mkdir()
+    write_image(root / "a" / "new" / "2.jpg")
+    scan(db, root, quick=True)
+    assert photo(db, root / "a" / "new" / "2.jpg") is not None
+
+
+def scan_seen_exists(db) -> bool:
+    return db.execute(text(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'scan_seen'"
+    )).first() is not None
+
+
+def test_deleted_files_are_removed(db, tmp_path, discarded):
+    root = library(tmp_path, "a/1.jpg", "a/2.jpg", "b/3.jpg")
+    scan(db, root)
+    gone = photo(db, root / "a" / "2.jpg").id
+    (root / "a" / "2.jpg").unlink()
+    (root / "b" / "3.jpg").unlink()
+
+    scan(db, root)
+    assert [p.file_name for p in db.query(Photo)] == ["1.jpg"]
+    assert gone in discarded and last_report(db)["removed"] == 2
+    assert not scan_seen_exists(db)
+
+
+def test_partial_scan_only_removes_within_its_folders(db, tmp_path):
+    # "a2" shares a's prefix as a string but is not inside it.
+    root = library(tmp_path, "a/1.jpg", "a/sub/2.jpg", "a2/3.jpg", "b/4.jpg")
+    scan(db, root)
+    for name in ("a/1.jpg", "a/sub/2.jpg", "a2/3.jpg", "b/4.jpg"):
+        (root / name).unlink()
+
+    scan(db, root, target_folders=[str(root / "a")])
+    assert sorted(p.file_name for p in db.query(Photo)) == ["3.jpg", "4.jpg"]
+
+
+def test_excluded_folder_rows_are_removed(db, tmp_path):
+    root = library(tmp_path, "a/1.jpg", "private/2.jpg")
+    scan(db, root)
+    scan(db, root, excluded_folders={str(root / "private")})
+    assert [p.file_name for p in db.query(Photo)] == ["1.jpg"]
+
+
+def test_moved_file_keeps_its_row(db, tmp_path, discarded):
+    root = library(tmp_path, "a/1.jpg", "a/2.jpg")
+    scan(db, root)
+    before = photo(db, root / "a" / "1.jpg")
+    before.is_favorite = 1
+    db.commit()
+    moved_id = before.id
+
+    (root / "b").mkdir()
+    (root / "a" / "1.jpg").rename(root / "b" / "renamed.jpg")
+    scan(db, root)
+    after = photo(db, root / "b" / "renamed.jpg")
+    assert after.id == moved_id and after.is_favorite == 1
+    assert after.file_name == "renamed.jpg" and (after.width, after.height) == (40, 30)
+    assert photo(db, root / "a" / "1.jpg") is None and db.query(Photo).count() == 2
+    assert moved_id not in discarded
+    report = last_report(db)
+    assert (report["moved"], report["written"], report["removed"]) == (1, 0, 0)
+
+
+def test_copy_is_not_a_move(db, tmp_path):
+    root = library(tmp_path, "a/1.jpg")
+    scan(db, root)
+    original = photo(db, root / "a" / "1.jpg").id
+    (root / "a" / "copy.jpg").write_bytes((root / "a" / "1.jpg").read_bytes())
+
+    scan(db, root)
+    assert photo(db, root / "a" / "1.jpg").id == original
+    assert photo(db, root / "a" / "copy.jpg").id != original
+    assert last_report(db)["moved"] == 0
+
+
+def test_two_copies_moved_claim_different_rows(db, tmp_path):
+    root = library(tmp_path, "a/1.jpg")
+    (root / "a" / "2.jpg").write_bytes((root / "a" / "1.jpg").read_bytes())
+    scan(db, root)
+    ids = {p.id for p in db.query(Photo)}
+
+    (root / "b").mkdir()
+    for name in ("1.jpg", "2.jpg"):
+        (root / "a" / name).rename(root / "b" / name)
+    scan(db, root)
+    assert {p.id for p in db.query(Photo)} == ids
+    assert {p.file_path for p in db.query(Photo)} == {str(root / "b" / n) for n in ("1.jpg", "2.jpg")}
+    assert last_report(db)["moved"] == 2
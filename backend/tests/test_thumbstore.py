@@ -0,0 +1,161 @@
+import os
+import time
+
+import pytest
+
+from services.thumbstore import CacheEvictor, ThumbnailStore
+
+
+@pytest.fixture
+def store(tmp_path):
+    s = ThumbnailStore(str(tmp_path / "thumbs"), segment_bytes=1024)
+    yield s
+    s.close()
+
+
+def reopened(s: ThumbnailStore) -> ThumbnailStore:
+    """The same directory opened afresh, as after a restart."""
+    s.close()
+    return ThumbnailStore(s.directory, s.segment_bytes)
+
+
+def segments(s: ThumbnailStore) -> list[str]:
+    return sorted(name for name in os.listdir(s.directory) if name.endswith(".pack"))
+
+
+def blob(i: int, size: int = 200) -> bytes:
+    return bytes([i % 256]) * size
+
+
+def test_segments_roll_over_and_survive_reopening(store):
+    for i in range(20):
+        store.put(f"k{i}", blob(i))
+    assert len(segments(store)) > 1
+    assert all(os.path.getsize(os.path.join(store.directory, name)) <= 1024
+               for name in segments(store))
+    # Sealed segments get an index file; the active one is scanned on open.
+    assert sorted(n for n in os.listdir(store.directory) if n.endswith(".idx")) == [
+        name[:-len(".pack")] + ".idx" for name in segments(store)[:-1]]
+
+    store = reopened(store)
+    assert all(store.get(f"k{i}") == blob(i) for i in range(20))
+    store.close()
+
+
+def test_newest_record_wins(store):
+    store.put("a", blob(1))
+    store.put("a", blob(2))
+    assert store.get("a") == blob(2)
+    store = reopened(store)
+    assert store.get("a") == blob(2)
+    store.close()
+
+
+def test_torn_tail_is_truncated_on_open(store):
+    store.put("a", blob(1))
+    store.put("b", blob(2))
+    path = os.path.join(store.directory, segments(store)[-1])
+    store.close()
+    with open(path, "r+b") as f:
+        f.truncate(os.path.getsize(path) - 10)
+    store = ThumbnailStore(store.directory, store.segment_bytes)
+    assert store.get("a") == blob(1) and store.get("b") is None
+    store.put("b", blob(3))
+    assert reopened(store).get("b") == blob(3)
+
+
+def test_tombstones_hide_deleted_entries_across_reopen(store):
+    for i in range(10):
+        store.put(f"k{i}", blob(i))
+    store.delete(["k0", "k5", "missing"])
+    assert store.get("k0") is None and "k5" not in store and store.get("k1") == blob(1)
+    store = reopened(store)
+    assert store.get("k0") is None and store.get("k5") is None
+    assert sorted(store.keys()) == sorted(f"k{i}" for i in range(10) if i not in (0, 5))
+    store.close()
+
+
+def test_compact_reclaims_dead_records(store):
+    for i in range(20):
+        store.put(f"k{i}", blob(i))
+    store.delete(f"k{i}" for i in range(15))
+    store.put("k19", blob(99))
+    before = store.stats()
+    assert before["garbage_ratio"] > 0.5
+
+    result = store.compact()
+    after = store.stats()
+    assert result["segments"] > 0 and result["reclaimed_bytes"] > 0
+    assert after["bytes"] == before["bytes"] - result["reclaimed_bytes"]
+    assert after["live_bytes"] == before["live_bytes"] and after["garbage_ratio"] < 0.3
+    expected = {f"k{i}": blob(i) for i in range(15, 19)} | {"k19": blob(99)}
+    assert {k: store.get(k) for k in store.keys()} == expected
+
+    # Tombstones dropped with compacted segments don't bring entries back.
+    store = reopened(store)
+    assert {k: store.get(k) for k in store.keys()} == expected
+    store.close()
+
+
+def test_compact_keeps_tombstones_masking_kept_segments(store):
+    for i in range(5):
+        store.put(f"old{i}", blob(i))        # fills the first segment(s)
+    for i in range(10):
+        store.put(f"new{i}", blob(i))
+    store.delete(["old0"])
+    for i in range(10):
+        store.delete([f"new{i}"])            # the newest segments are now mostly dead
+    store.compact(min_garbage=0.9)
+    store = reopened(store)
+    assert store.get("old0") is None and store.get("old1") == blob(1)
+    store.close()
+
+
+def test_evicts_least_recently_used_first(store):
+    for i in range(10):
+        store.put(f"k{i}", blob(i))
+    store.get("k0")  # touched: now the most recently used
+    per_entry = store.stats()["live_bytes"] // 10
+    store.budget_bytes = 6 * per_entry
+
+    evicted = store.enforce_budget()
+    remaining = set(store.keys())
+    assert evicted == len({f"k{i}" for i in range(10)} - remaining)
+    assert "k0" in remaining and "k1" not in remaining
+    assert store.stats()["live_bytes"] <= 6 * per_entry * 0.9
+    assert store.stats()["bytes"] <= store.budget_bytes
+    assert store.stats()["evicted_entries"] == evicted
+
+
+def test_peek_is_not_an_access(store):
+    store.put("a", blob(1))
+    store.put("b", blob(2))
+    assert store.peek("a", 4) == blob(1)[:4]
+    store.budget_bytes = int(store.stats()["live_bytes"] * 0.6)  # room for one
+    store.enforce_budget()
+    assert store.keys() == ["b"]
+
+
+def test_within_budget_nothing_is_evicted(store):
+    for i in range(5):
+        store.put(f"k{i}", blob(i))
+    store.budget_bytes = 0  # unlimited
+    assert store.enforce_budget() == 0
+    store.budget_bytes = store.stats()["bytes"]
+    assert store.enforce_budget() == 0 and len(store.keys()) == 5
+
+
+def test_evictor_thread_enforces_budget_after_writes(store):
+    evictor = CacheEvictor(store)
+    store.budget_bytes = 2048
+    evictor.start()
+    try:
+        for i in range(30):
+            store.put(f"k{i}", blob(i))
+        deadline = time.monotonic() + 5
+        while store.stats()["bytes"] > 2048 and time.monotonic() < deadline:
+            time.sleep(0.01)
+    finally:
+        evictor.stop()
+    assert store.stats()["bytes"] <= 2048
+    assert "k29" in store.keys() and "k0" not in store.keys()
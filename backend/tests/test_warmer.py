@@ -0,0 +1,83 @@
+import time
+
+import pytest
+from PIL import Image
+from sqlalchemy.orm import sessionmaker
+
+from models.photo import Photo
+from models.setting import Setting
+from services import placeholder, scanner, thumbnail, thumbnail_warmer
+from services.thumbnail import has_current_renditions, source_version
+from services.thumbstore import ThumbnailStore
+from services.thumbnail_warmer import _pending_photos, warm_status, warmer
+
+
+@pytest.fixture
+def app_db(db, tmp_path, monkeypatch):
+    """``db``, with the warmer, placeholders and thumbnails using it and a temp store."""
+    session_factory = sessionmaker(autoflush=False, bind=db.get_bind())
+    monkeypatch.setattr(thumbnail_warmer, "SessionLocal", session_factory)
+    monkeypatch.setattr(placeholder, "SessionLocal", session_factory)
+    store = ThumbnailStore(str(tmp_path / "thumbs"))
+    monkeypatch.setattr(thumbnail, "store", store)
+    monkeypatch.setattr(scanner, "discard_thumbnails", lambda ids: None)
+    db.add(Setting(key="thumbnail_format", value="jpeg", updated_at=""))
+    db.commit()
+    yield db
+    warmer.stop()
+    store.close()
+
+
+def library(tmp_path, names):
+    root = tmp_path / "lib"
+    for i, name in enumerate(names):
+        (root / name).parent.mkdir(parents=True, exist_ok=True)
+        Image.new("RGB", (900, 600), (i * 40 % 256, 80, 160)).save(root / name)
+    return root
+
+
+def warm(workers: int = 1):
+    assert warmer.start(workers)
+    deadline = time.monotonic() + 30
+    while warmer.running and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert not warmer.running
+
+
+def test_pending_order_puts_recently_scanned_folders_first(app_db, tmp_path):
+    root = library(tmp_path, ["a/2.jpg", "a/1.jpg", "b/1.jpg"])
+    scanner.scan_folder(str(root), {"jpg"}, app_db, workers=1)
+    (root / "z").mkdir()
+    Image.new("RGB", (90, 60)).save(root / "z" / "new.jpg")
+    scanner.scan_folder(str(root), {"jpg"}, app_db, workers=1)
+
+    queue, backfill = _pending_photos(app_db, "jpeg")
+    assert [row[1] for row in queue] == [
+        str(root / "z" / "new.jpg"), str(root / "a" / "1.jpg"), str(root / "a" / "2.jpg"),
+        str(root / "b" / "1.jpg"),
+    ]
+    assert all(needs_placeholder for *_, needs_placeholder in queue) and backfill == []
+
+
+def test_warm_renders_pyramids_and_placeholders(app_db, tmp_path):
+    root = library(tmp_path, ["a/1.jpg", "a/2.jpg", "b/3.jpg"])
+    (root / "b" / "broken.jpg").write_bytes(b"\xff\xd8 not really")
+    scanner.scan_folder(str(root), {"jpg"}, app_db, workers=1)
+
+    warm()
+    assert (warm_status["total"], warm_status["done"], warm_status["failed"]) == (3, 3, 0)
+    app_db.expire_all()
+    for photo in app_db.query(Photo):
+        assert has_current_renditions(photo.id, source_version(photo.modified_at, photo.file_size),
+                                      "jpeg")
+        assert photo.placeholder.startswith("data:image/")
+    assert _pending_photos(app_db, "jpeg") == ([], [])
+
+    # Pyramids cached but placeholders lost: only the placeholders are made.
+    app_db.query(Photo).update({"placeholder": None})
+    app_db.commit()
+    assert len(_pending_photos(app_db, "jpeg")[1]) == 3
+    warm()
+    assert warm_status["total"] == 0
+    app_db.expire_all()
+    assert all(photo.placeholder for photo in app_db.query(Photo))
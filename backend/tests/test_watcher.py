@@ -0,0 +1,140 @@
+import os
+import threading
+import time
+
+import pytest
+from PIL import Image
+
+from models.photo import Photo
+from services import scanner, watcher
+from services.watcher import FolderWatcher, _PollingBackend
+
+
+@pytest.fixture
+def batches(monkeypatch):
+    """Batches handed to a FolderWatcher's callback, with short timings."""
+    monkeypatch.setattr(watcher, "DEBOUNCE_SECONDS", 0.2)
+    monkeypatch.setattr(watcher, "MAX_LATENCY_SECONDS", 2.0)
+    monkeypatch.setattr(watcher, "RETRY_SECONDS", 0.2)
+    received: list[tuple[set[str], set[str]]] = []
+    arrived = threading.Condition()
+    refuse = []  # pop()ped per call: False means "a scan is running"
+
+    def on_batch(paths, shallow):
+        with arrived:
+            received.append((set(paths), set(shallow)))
+            arrived.notify_all()
+        return refuse.pop() if refuse else True
+
+    def wait(count: int, timeout: float = 5.0):
+        with arrived:
+            assert arrived.wait_for(lambda: len(received) >= count, timeout)
+        time.sleep(0.5)  # anything arriving now would be an extra batch
+        return received
+
+    return on_batch, wait, refuse
+
+
+def write_image(path, size=(40, 30), color="red"):
+    Image.new("RGB", size, color).save(path)
+
+
+def start(on_batch, root, **kwargs) -> FolderWatcher:
+    w = FolderWatcher(on_batch)
+    w.start(str(root), **kwargs)
+    deadline = time.monotonic() + 5
+    while not watcher.watch_status["is_watching"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return w
+
+
+def test_burst_is_one_batch(tmp_path, batches):
+    on_batch, wait, _ = batches
+    w = start(on_batch, tmp_path)
+    try:
+        for i in range(5):
+            write_image(tmp_path / f"{i}.jpg")
+        received = wait(1)
+    finally:
+        w.stop()
+    assert len(received) == 1
+    paths, _ = received[0]
+    assert {str(tmp_path / f"{i}.jpg") for i in range(5)} <= paths
+
+
+def test_refused_batch_is_kept_and_retried(tmp_path, batches):
+    on_batch, wait, refuse = batches
+    refuse.append(False)
+    w = start(on_batch, tmp_path)
+    try:
+        write_image(tmp_path / "a.jpg")
+        received = wait(2)
+    finally:
+        w.stop()
+    assert len(received) == 2
+    assert received[0] == received[1] == ({str(tmp_path / "a.jpg")}, set())
+
+
+def test_new_and_excluded_subdirectories(tmp_path, batches):
+    on_batch, wait, _ = batches
+    (tmp_path / "private").mkdir()
+    w = start(on_batch, tmp_path, excluded_folders={str(tmp_path / "private")})
+    try:
+        write_image(tmp_path / "private" / "secret.jpg")
+        (tmp_path / "new").mkdir()
+        time.sleep(0.1)  # let the new directory be watched
+        write_image(tmp_path / "new" / "a.jpg")
+        received = wait(1)
+    finally:
+        w.stop()
+    paths = set().union(*(p for p, _ in received))
+    assert str(tmp_path / "new") in paths
+    assert not any("private" in p for p in paths)
+
+
+def test_polling_backend_reports_changed_directories(tmp_path):
+    (tmp_path / "a").mkdir()
+    backend = _PollingBackend(str(tmp_path), lambda path: False)
+    assert backend.poll(0) == (set(), set())
+
+    time.sleep(0.01)
+    write_image(tmp_path / "a" / "1.jpg")
+    (tmp_path / "b").mkdir()
+    paths, shallow = backend.poll(0)
+    assert shallow == {str(tmp_path), str(tmp_path / "a")}
+    assert paths == {str(tmp_path / "b")}
+
+    (tmp_path / "b").rmdir()
+    paths, _ = backend.poll(0)
+    assert str(tmp_path / "b") in paths
+
+
+def test_sync_paths_applies_a_batch(db, tmp_path, monkeypatch):
+    monkeypatch.setattr(scanner, "discard_thumbnails", lambda ids: None)
+    root = tmp_path / "lib"
+    (root / "sub").mkdir(parents=True)
+    # Distinct colours: identical files would be taken for moves.
+    for name, color in (("keep.jpg", "red"), ("edit.jpg", "green"), ("gone.jpg", "blue"),
+                        ("sub/old.jpg", "white")):
+        write_image(root / name, color=color)
+    scanner.scan_folder(str(root), {"jpg"}, db, workers=1)
+
+    write_image(root / "edit.jpg", size=(80, 60))
+    write_image(root / "new.jpg", color="black")
+    (root / "gone.jpg").unlink()
+    (root / "sub" / "old.jpg").unlink()
+    (root / "sub").rmdir()
+    result = scanner.sync_paths(db, str(root), {"jpg"}, None, [
+        str(root / p) for p in ("edit.jpg", "new.jpg", "gone.jpg", "sub", "elsewhere/x.jpg")
+    ] + [os.path.join(str(tmp_path), "outside.jpg")], workers=1)
+
+    db.expire_all()
+    rows = {os.path.basename(p.file_path): p for p in db.query(Photo)}
+    assert sorted(rows) == ["edit.jpg", "keep.jpg", "new.jpg"]
+    assert rows["edit.jpg"].width == 80
+    assert (result["updated"], result["removed"]) == (2, 2)
+
+
+def test_sync_paths_waits_for_a_running_scan(db, tmp_path):
+    with scanner.index_lock:
+        assert scanner.sync_paths(db, str(tmp_path), {"jpg"}, None, [str(tmp_path)]) is None
@@ -3,7 +3,7 @@ import { useNavigate } from 'react-router-dom';
 import { useAppStore } from '../../stores/appStore';
 import { useTranslation } from '../../i18n/useTranslation';
 import { api } from '../../api/client';
-import { isVideo } from '../../utils/media';
+import { isVideo, thumbnailSrc } from '../../utils/media';
 import type { PhotoListResponse } from '../../types';
 
 export function FilterBar() {
@@ -57,7 +57,7 @@ export function FilterBar() {
                   <span className="selection-thumbnail selection-thumbnail-video">&#9654;</span>
                 ) : (
                   <img
-                    src={photo.thumbnail_url}
+                    src={thumbnailSrc(photo.thumbnail_url, 32)}
                     alt={photo.file_name}
                     className="selection-thumbnail"
                   />
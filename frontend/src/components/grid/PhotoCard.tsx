@@ -1,7 +1,9 @@
-import { useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { Link } from 'react-router-dom';
 import { useAppStore } from '../../stores/appStore';
-import { isVideo, formatDuration } from '../../utils/media';
+import { isVideo, formatDuration, thumbnailSize, thumbnailSrc } from '../../utils/media';
+import { fetchRendition } from '../../utils/renditions';
+import { batchedThumbnail } from '../../utils/thumbnailBatch';
 import type { Photo } from '../../types';
 
 interface PhotoCardProps {
@@ -9,11 +11,45 @@ interface PhotoCardProps {
 }
 
 export function PhotoCard({ photo }: PhotoCardProps) {
-  const { selectedPhotoIds, togglePhotoSelection, setLastViewedPhotoId } = useAppStore();
+  const { selectedPhotoIds, togglePhotoSelection, setLastViewedPhotoId, gridColumns } = useAppStore();
   const isSelected = selectedPhotoIds.includes(photo.id);
   const isMaxed = selectedPhotoIds.length >= 4;
   const video = isVideo(photo.extension);
   const [failed, setFailed] = useState(false);
+  const [loaded, setLoaded] = useState(false);
+  const imageRef = useRef<HTMLDivElement>(null);
+  // Cards are cropped to fill a column, so size for the column width.
+  const cssPixels = window.innerWidth / gridColumns;
+  const size = thumbnailSize(cssPixels);
+  // Object URL from the page's batch response or, when that didn't have this
+  // thumbnail, from fetching it on its own; null if neither worked, and the
+  // thumbnail URL is then loaded directly.
+  const [fetched, setFetched] = useState<string | null | undefined>(undefined);
+  useEffect(() => {
+    let cancelled = false;
+    setFetched(undefined);
+    // Cards mounted off screen are only loaded ahead of scrolling, so the
+    // server may render them after the tiles the user is looking at.
+    const rect = imageRef.current?.getBoundingClientRect();
+    const onScreen = !!rect && rect.bottom > 0 && rect.top < window.innerHeight;
+    batchedThumbnail({ id: photo.id, thumbnail_url: photo.thumbnail_url }, size)
+      .then((url) => url ?? fetchRendition(thumbnailSrc(photo.thumbnail_url, cssPixels),
+        onScreen ? 'visible' : 'prefetch'))
+      .then((url) => {
+        if (!cancelled) setFetched(url);
+      });
+    return () => {
+      cancelled = true;
+    };
+  }, [photo.id, photo.thumbnail_url, size]);
+  const src = fetched ?? (fetched === null ? thumbnailSrc(photo.thumbnail_url, cssPixels) : undefined);
+  // A fetched rendition the browser can't decode falls back to the URL.
+  const handleError = () => (fetched ? setFetched(null) : setFailed(true));
+
+  // The stored placeholder fills the tile until the thumbnail has loaded.
+  const placeholderStyle = photo.placeholder && !loaded
+    ? { backgroundImage: `url(${photo.placeholder})` }
+    : undefined;
 
   const sep = photo.file_path.includes('/') ? '/' : '\\';
   const parts = photo.file_path.split(sep);
@@ -29,7 +65,7 @@ export function PhotoCard({ photo }: PhotoCardProps) {
       data-photo-id={photo.id}
       onClick={() => setLastViewedPhotoId(photo.id)}
     >
-      <div className="photo-card-image">
+      <div className="photo-card-image" ref={imageRef}>
         <div
           className="photo-select-area"
           onClick={(e) => {
@@ -54,10 +90,13 @@ export function PhotoCard({ photo }: PhotoCardProps) {
               <div className="photo-card-video-placeholder" />
             ) : (
               <img
-                src={photo.thumbnail_url}
+                src={src}
                 alt={photo.file_name}
                 loading="lazy"
-                onError={() => setFailed(true)}
+                className="photo-card-thumb"
+                style={placeholderStyle}
+                onLoad={() => setLoaded(true)}
+                onError={handleError}
               />
             )}
             <span className="photo-card-play-overlay">&#9654;</span>
@@ -67,10 +106,13 @@ export function PhotoCard({ photo }: PhotoCardProps) {
           </>
         ) : (
           <img
-            src={photo.thumbnail_url}
+            src={src}
             alt={photo.file_name}
             loading="lazy"
-            onError={() => setFailed(true)}
+            className="photo-card-thumb"
+            style={placeholderStyle}
+            onLoad={() => setLoaded(true)}
+            onError={handleError}
           />
         )}
       </div>
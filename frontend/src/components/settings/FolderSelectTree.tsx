@@ -132,7 +132,7 @@ export function FolderSelectTree({ rootFolder, extensions }: FolderSelectTreePro
   const [saving, setSaving] = useState(false);
   const [saved, setSaved] = useState(false);
   const [rescanning, setRescanning] = useState(false);
-  const [rescanProgress, setRescanProgress] = useState<{ processed: number; total: number } | null>(null);
+  const [rescanProgress, setRescanProgress] = useState<{ processed: number; total: number; walk_done: boolean } | null>(null);
   const [rescanResult, setRescanResult] = useState<string | null>(null);
   const [deleting, setDeleting] = useState(false);
   const [deleteProgress, setDeleteProgress] = useState<{ processed: number; total: number } | null>(null);
@@ -220,8 +220,9 @@ export function FolderSelectTree({ rootFolder, extensions }: FolderSelectTreePro
           is_scanning: boolean;
           processed: number;
           total: number;
+          walk_done: boolean;
         }>('/scan/status');
-        setRescanProgress({ processed: status.processed, total: status.total });
+        setRescanProgress({ processed: status.processed, total: status.total, walk_done: status.walk_done });
         if (status.is_scanning) {
           pollTimerRef.current = setTimeout(poll, 500);
         } else {
@@ -346,13 +347,18 @@ export function FolderSelectTree({ rootFolder, extensions }: FolderSelectTreePro
       {rescanProgress && (
         <div className="scan-progress">
           <div className="scan-progress-bar">
-            <div
-              className="scan-progress-fill"
-              style={{ width: rescanProgress.total > 0 ? `${(rescanProgress.processed / rescanProgress.total) * 100}%` : '0%' }}
-            />
+            {rescanProgress.walk_done ? (
+              <div
+                className="scan-progress-fill"
+                style={{ width: rescanProgress.total > 0 ? `${(rescanProgress.processed / rescanProgress.total) * 100}%` : '0%' }}
+              />
+            ) : (
+              <div className="scan-progress-fill scan-progress-indeterminate" />
+            )}
           </div>
           <p className="scan-progress-text">
-            {t('settings.filesProcessed', { processed: rescanProgress.processed, total: rescanProgress.total })}
+            {t(rescanProgress.walk_done ? 'settings.filesProcessed' : 'settings.filesProcessedWalking',
+              { processed: rescanProgress.processed, total: rescanProgress.total })}
           </p>
         </div>
       )}
@@ -33,6 +33,7 @@ export function ScanButton({ rootFolder, onStartScan, onPollStatus, onReset }: S
 
   useEffect(() => {
     fetchPhotoCount();
+    onPollStatus().catch(() => { /* ignore */ });
   }, []);
 
   const handleScan = async () => {
@@ -40,6 +41,15 @@ export function ScanButton({ rootFolder, onStartScan, onPollStatus, onReset }: S
     setScanning(true);
   };
 
+  const handleResume = async () => {
+    await api.post('/scan/resume');
+    setScanning(true);
+  };
+
+  const handleCancel = async () => {
+    await api.post('/scan/cancel');
+  };
+
   const handleReset = async () => {
     if (!confirm(t('settings.resetConfirm'))) return;
     setResetting(true);
@@ -95,6 +105,16 @@ export function ScanButton({ rootFolder, onStartScan, onPollStatus, onReset }: S
         >
           {isScanning ? t('settings.scanning') : t('settings.startScan')}
         </button>
+        {isScanning && (
+          <button className="btn" onClick={handleCancel}>
+            {t('settings.cancelScan')}
+          </button>
+        )}
+        {!isScanning && scanStatus?.resumable && (
+          <button className="btn" onClick={handleResume} disabled={resetting}>
+            {t('settings.resumeScan')}
+          </button>
+        )}
         <button
           className="btn btn-danger"
           onClick={handleReset}
@@ -108,17 +128,23 @@ export function ScanButton({ rootFolder, onStartScan, onPollStatus, onReset }: S
       {isScanning && scanStatus && (
         <div className="scan-progress">
           <div className="scan-progress-bar">
-            <div
-              className="scan-progress-fill"
-              style={{
-                width: scanStatus.total > 0
-                  ? `${(scanStatus.processed / scanStatus.total) * 100}%`
-                  : '0%',
-              }}
-            />
+            {/* Until the walk finishes the total keeps growing, so show no ratio. */}
+            {scanStatus.walk_done ? (
+              <div
+                className="scan-progress-fill"
+                style={{
+                  width: scanStatus.total > 0
+                    ? `${(scanStatus.processed / scanStatus.total) * 100}%`
+                    : '0%',
+                }}
+              />
+            ) : (
+              <div className="scan-progress-fill scan-progress-indeterminate" />
+            )}
           </div>
           <p className="scan-progress-text">
-            {t('settings.filesProcessed', { processed: scanStatus.processed, total: scanStatus.total })}
+            {t(scanStatus.walk_done ? 'settings.filesProcessed' : 'settings.filesProcessedWalking',
+              { processed: scanStatus.processed, total: scanStatus.total })}
           </p>
           {scanStatus.current_file && (
             <p className="scan-current-file">{scanStatus.current_file}</p>
@@ -130,7 +156,17 @@ export function ScanButton({ rootFolder, onStartScan, onPollStatus, onReset }: S
         <p className="error-text">{scanStatus.error}</p>
       )}
 
-      {!isScanning && scanStatus && !scanStatus.error && scanStatus.total > 0 && (
+      {!isScanning && scanStatus?.resumable && (
+        <p className="scan-info-text">
+          {t('settings.scanResumable', { processed: scanStatus.resumable.processed })}
+        </p>
+      )}
+
+      {!isScanning && scanStatus?.cancelled && (
+        <p className="scan-info-text">{t('settings.scanCancelled')}</p>
+      )}
+
+      {!isScanning && scanStatus && !scanStatus.error && !scanStatus.cancelled && scanStatus.total > 0 && (
         <p className="success-text">
           {t('settings.scanComplete', { count: scanStatus.total })}
         </p>
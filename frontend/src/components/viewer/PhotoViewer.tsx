@@ -4,7 +4,8 @@ import { ZoomControls } from './ZoomControls';
 import { ScreenshotButton } from './ScreenshotButton';
 import { useTranslation } from '../../i18n/useTranslation';
 import { useScreenshot } from '../../hooks/useScreenshot';
-import { isVideo } from '../../utils/media';
+import { displaySrc, isVideo } from '../../utils/media';
+import { keptRendition } from '../../utils/renditions';
 
 interface PhotoViewerProps {
   photo: Photo;
@@ -19,6 +20,8 @@ export const PhotoViewer = forwardRef<PhotoViewerHandle, PhotoViewerProps>(funct
   const [position, setPosition] = useState({ x: 0, y: 0 });
   const [isDragging, setIsDragging] = useState(false);
   const [isFullscreen, setIsFullscreen] = useState(false);
+  // Once zoomed in, the original replaces the screen-sized rendition for this photo.
+  const [showOriginal, setShowOriginal] = useState(false);
   const dragStart = useRef({ x: 0, y: 0 });
   const containerRef = useRef<HTMLDivElement>(null);
   const viewerRef = useRef<HTMLDivElement>(null);
@@ -110,8 +113,17 @@ export const PhotoViewer = forwardRef<PhotoViewerHandle, PhotoViewerProps>(funct
   useEffect(() => {
     setScale(1);
     setPosition({ x: 0, y: 0 });
+    setShowOriginal(false);
   }, [photo.id]);
 
+  useEffect(() => {
+    if (scale > 1) setShowOriginal(true);
+  }, [scale]);
+
+  const fullSrc = `/api/images/${photo.id}/full?v=${photo.modified_at}`;
+  const displayUrl = photo.display_url ? displaySrc(photo.display_url) : null;
+  const imageSrc = showOriginal || !displayUrl ? fullSrc : keptRendition(displayUrl) ?? displayUrl;
+
   return (
     <div className="photo-viewer" ref={viewerRef}>
       <div
@@ -128,14 +140,14 @@ export const PhotoViewer = forwardRef<PhotoViewerHandle, PhotoViewerProps>(funct
           <video
             key={photo.id}
             className="photo-viewer-video"
-            src={`/api/images/${photo.id}/full?v=${photo.modified_at}`}
+            src={fullSrc}
             controls
             autoPlay
             playsInline
           />
         ) : (
           <img
-            src={`/api/images/${photo.id}/full?v=${photo.modified_at}`}
+            src={imageSrc}
             alt={photo.file_name}
             style={{
               transform: `translate(${position.x}px, ${position.y}px) scale(${scale})`,
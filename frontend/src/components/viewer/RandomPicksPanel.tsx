@@ -2,7 +2,7 @@ import { useRef, useState, useEffect, useCallback, useImperativeHandle, forwardR
 import type { Photo } from '../../types';
 import { useTranslation } from '../../i18n/useTranslation';
 import { useScreenshot } from '../../hooks/useScreenshot';
-import { isVideo } from '../../utils/media';
+import { displaySrc, isVideo } from '../../utils/media';
 import { ScreenshotButton } from './ScreenshotButton';
 
 /** Per-image zoomable wrapper */
@@ -10,6 +10,8 @@ function ZoomableImage({ photo, onClick }: { photo: Photo; onClick: () => void }
   const [scale, setScale] = useState(1);
   const [position, setPosition] = useState({ x: 0, y: 0 });
   const [isPanning, setIsPanning] = useState(false);
+  // Once zoomed in, the original replaces the screen-sized rendition.
+  const [showOriginal, setShowOriginal] = useState(false);
   const panStart = useRef({ x: 0, y: 0 });
   const containerRef = useRef<HTMLDivElement>(null);
 
@@ -31,6 +33,10 @@ function ZoomableImage({ photo, onClick }: { photo: Photo; onClick: () => void }
     });
   }, []);
 
+  useEffect(() => {
+    if (scale > 1) setShowOriginal(true);
+  }, [scale]);
+
   // Native wheel listener with { passive: false }
   useEffect(() => {
     const el = containerRef.current;
@@ -95,7 +101,9 @@ function ZoomableImage({ photo, onClick }: { photo: Photo; onClick: () => void }
       style={{ cursor: scale > 1 ? (isPanning ? 'grabbing' : 'grab') : 'pointer' }}
     >
       <img
-        src={`/api/images/${photo.id}/full?v=${photo.modified_at}`}
+        src={showOriginal || !photo.display_url
+          ? `/api/images/${photo.id}/full?v=${photo.modified_at}`
+          : displaySrc(photo.display_url)}
         alt={photo.file_name}
         style={{
           transform: `translate(${position.x}px, ${position.y}px) scale(${scale})`,
@@ -72,7 +72,12 @@ const translations = {
   'settings.startScan': { ja: 'スキャン開始', en: 'Start Scan' },
   'settings.scanning': { ja: 'スキャン中...', en: 'Scanning...' },
   'settings.scanComplete': { ja: 'スキャン完了: {count}件処理しました', en: 'Scan complete: {count} files processed' },
+  'settings.cancelScan': { ja: 'スキャン中止', en: 'Cancel Scan' },
+  'settings.scanCancelled': { ja: 'スキャンを中止しました', en: 'Scan cancelled' },
+  'settings.resumeScan': { ja: 'スキャン再開', en: 'Resume Scan' },
+  'settings.scanResumable': { ja: '中断されたスキャンがあります（{processed}件処理済み）', en: 'An interrupted scan can be resumed ({processed} files processed)' },
   'settings.filesProcessed': { ja: '{processed} / {total} 件処理済み', en: '{processed} / {total} files processed' },
+  'settings.filesProcessedWalking': { ja: '{processed} 件処理済み（{total} 件検出、検索中）', en: '{processed} files processed ({total} found, still searching)' },
   'settings.scanInfo': { ja: 'スキャン済み: {count}件', en: 'Scanned: {count} photos' },
   'settings.scanFolder': { ja: 'フォルダ: {path}', en: 'Folder: {path}' },
   'settings.scanNoData': { ja: 'スキャン済みデータなし', en: 'No scanned data' },
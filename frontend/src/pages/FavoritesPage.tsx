@@ -2,7 +2,7 @@ import { useState, useEffect, useCallback, useMemo } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { api } from '../api/client';
 import { useTranslation } from '../i18n/useTranslation';
-import { isVideo } from '../utils/media';
+import { isVideo, thumbnailSrc } from '../utils/media';
 import { LoadingSpinner } from '../components/common/LoadingSpinner';
 import type { Combination } from '../types';
 
@@ -91,7 +91,7 @@ export function FavoritesPage() {
               >
                 {combo.photos.map((photo) => (
                   <div key={photo.id} className="favorite-combo-thumb">
-                    <img src={photo.thumbnail_url} alt={photo.file_name} loading="lazy" />
+                    <img src={thumbnailSrc(photo.thumbnail_url, 180)} alt={photo.file_name} loading="lazy" />
                     {isVideo(photo.extension) && <span className="favorite-combo-play">&#9654;</span>}
                   </div>
                 ))}
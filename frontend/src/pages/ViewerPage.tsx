@@ -8,7 +8,8 @@ import { RandomPicksPanel } from '../components/viewer/RandomPicksPanel';
 import type { RandomPicksPanelHandle } from '../components/viewer/RandomPicksPanel';
 import { LoadingSpinner } from '../components/common/LoadingSpinner';
 import { useTranslation } from '../i18n/useTranslation';
-import { formatDuration } from '../utils/media';
+import { displaySrc, formatDuration } from '../utils/media';
+import { fetchRendition } from '../utils/renditions';
 import type { Photo, NeighborsResponse, PhotoListResponse } from '../types';
 
 export function ViewerPage() {
@@ -19,7 +20,9 @@ export function ViewerPage() {
   const { t } = useTranslation();
 
   const [photo, setPhoto] = useState<Photo | null>(null);
-  const [neighbors, setNeighbors] = useState<NeighborsResponse>({ prev_id: null, next_id: null });
+  const [neighbors, setNeighbors] = useState<NeighborsResponse>({
+    prev_id: null, next_id: null, prev_display_url: null, next_display_url: null,
+  });
   const [loading, setLoading] = useState(true);
   const [randomPicks, setRandomPicks] = useState<Photo[]>([]);
   const [showRandomPicks, setShowRandomPicks] = useState(false);
@@ -42,9 +45,13 @@ export function ViewerPage() {
         // In random mode, compute neighbors from the gallery's loaded photo list
         const list = useAppStore.getState().photos;
         const idx = list.findIndex(p => p.id === Number(id));
+        const prev = idx > 0 ? list[idx - 1] : null;
+        const next = idx >= 0 && idx < list.length - 1 ? list[idx + 1] : null;
         setNeighbors({
-          prev_id: idx > 0 ? list[idx - 1].id : null,
-          next_id: idx >= 0 && idx < list.length - 1 ? list[idx + 1].id : null,
+          prev_id: prev?.id ?? null,
+          next_id: next?.id ?? null,
+          prev_display_url: prev?.display_url ?? null,
+          next_display_url: next?.display_url ?? null,
         });
       } else {
         const neighborParams = new URLSearchParams({
@@ -96,6 +103,14 @@ export function ViewerPage() {
     }
   }, [location.key]);
 
+  // Fetch the neighbors' display images ahead of stepping to them; the
+  // viewer shows the kept copy (see keptRendition).
+  useEffect(() => {
+    for (const url of [neighbors.next_display_url, neighbors.prev_display_url]) {
+      if (url) fetchRendition(displaySrc(url), 'prefetch');
+    }
+  }, [neighbors]);
+
   const goTo = useCallback((id: number | null) => {
     if (id !== null) navigate(`/viewer/${id}`);
   }, [navigate]);
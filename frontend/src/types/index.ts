@@ -12,6 +12,8 @@ export interface Photo {
   taken_at: string | null;
   is_favorite: boolean;
   thumbnail_url: string;
+  display_url: string | null;
+  placeholder: string | null;
 }
 
 export interface PhotoListResponse {
@@ -25,6 +27,8 @@ export interface PhotoListResponse {
 export interface NeighborsResponse {
   prev_id: number | null;
   next_id: number | null;
+  prev_display_url: string | null;
+  next_display_url: string | null;
 }
 
 export interface Combination {
@@ -40,12 +44,23 @@ export interface Settings {
   screenshot_folder: string;
 }
 
+export interface ResumableScan {
+  mode: 'full' | 'quick';
+  state: 'running' | 'cancelled';
+  started_at: string;
+  updated_at: string;
+  processed: number;
+}
+
 export interface ScanStatus {
   is_scanning: boolean;
   total: number;
+  walk_done: boolean;
   processed: number;
   current_file: string;
   error: string | null;
+  cancelled?: boolean;
+  resumable?: ResumableScan | null;
 }
 
 export type SortBy = 'created_at' | 'modified_at' | 'taken_at' | 'file_name' | 'random';
@@ -17,3 +17,33 @@ export function formatDuration(seconds: number | null | undefined): string {
   if (h > 0) return `${h}:${String(m).padStart(2, '0')}:${ss}`;
   return `${m}:${ss}`;
 }
+
+/** Render-order hint for uncached thumbnails: on-screen tiles before ones fetched ahead. */
+export type ThumbnailPriority = 'visible' | 'prefetch';
+
+/** Device pixels needed for an image shown at most `cssPixels` wide/tall. */
+export function thumbnailSize(cssPixels: number): number {
+  return Math.ceil(cssPixels * (window.devicePixelRatio || 1));
+}
+
+/**
+ * Thumbnail URL for an image shown at most `cssPixels` wide/tall. The backend
+ * serves the smallest cached rendition at least that many device pixels.
+ */
+export function thumbnailSrc(thumbnailUrl: string, cssPixels: number): string {
+  const size = thumbnailSize(cssPixels);
+  const sep = thumbnailUrl.includes('?') ? '&' : '?';
+  return `${thumbnailUrl}${sep}size=${size}`;
+}
+
+/**
+ * Viewer image URL sized for this screen in device pixels. The backend serves
+ * a cached, upright rendition at least that large (capped at the original).
+ */
+export function displaySrc(displayUrl: string): string {
+  const dpr = window.devicePixelRatio || 1;
+  const w = Math.ceil(window.screen.width * dpr);
+  const h = Math.ceil(window.screen.height * dpr);
+  const sep = displayUrl.includes('?') ? '&' : '?';
+  return `${displayUrl}${sep}w=${w}&h=${h}`;
+}
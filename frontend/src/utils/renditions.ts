@@ -0,0 +1,68 @@
+// Renditions (thumbnails, display images) fetched with a render priority.
+// An <img> can't tell the server how urgently it needs an uncached rendition,
+// so these are fetched here with the priority in a header, which keeps the
+// URL the same whichever priority asked for it, and handed out as object
+// URLs; a later request for the same URL reuses the kept one.
+
+import type { ThumbnailPriority } from './media';
+
+// Object URLs kept for reuse; the least recently used are revoked beyond this.
+const MAX_KEPT = 300;
+
+// url -> object URL, least recently used first
+const kept = new Map<string, string>();
+// url -> fetch in flight
+const inFlight = new Map<string, Promise<string | null>>();
+
+function keep(url: string, objectUrl: string) {
+  kept.delete(url);
+  kept.set(url, objectUrl);
+  if (kept.size > MAX_KEPT) {
+    const [oldest, oldUrl] = kept.entries().next().value as [string, string];
+    kept.delete(oldest);
+    URL.revokeObjectURL(oldUrl);
+  }
+}
+
+/** The object URL already fetched for `url`, if any. */
+export function keptRendition(url: string): string | undefined {
+  const objectUrl = kept.get(url);
+  if (objectUrl) keep(url, objectUrl);
+  return objectUrl;
+}
+
+/**
+ * Object URL of the rendition at `url`, or null if it couldn't be fetched
+ * (load the URL directly instead). Prefetches are rendered by the server after
+ * the images on screen. The object URL stays owned by this module; callers
+ * must not revoke it.
+ */
+export function fetchRendition(url: string, priority: ThumbnailPriority): Promise<string | null> {
+  const objectUrl = keptRendition(url);
+  if (objectUrl) return Promise.resolve(objectUrl);
+  let pending = inFlight.get(url);
+  if (!pending) {
+    pending = (async () => {
+      try {
+        const res = await fetch(url, {
+          // Explicit types: the server doesn't take */* as WebP/AVIF support.
+          headers: {
+            Accept: 'image/avif,image/webp,image/jpeg',
+            ...(priority === 'prefetch' ? { 'X-Render-Priority': 'prefetch' } : {}),
+          },
+          priority: priority === 'prefetch' ? 'low' : 'auto',
+        });
+        if (!res.ok) return null;
+        const fetched = URL.createObjectURL(await res.blob());
+        keep(url, fetched);
+        return fetched;
+      } catch {
+        return null;
+      } finally {
+        inFlight.delete(url);
+      }
+    })();
+    inFlight.set(url, pending);
+  }
+  return pending;
+}
@@ -0,0 +1,98 @@
+// Grid tiles ask for their thumbnails here first. Requests made in the same
+// tick (one page of cards mounting) are sent as a single /thumbnails/batch
+// call, which returns the renditions the server already has cached. The
+// batch URL names each photo's version, so the browser caches it like a
+// versioned thumbnail URL; within a session, received thumbnails are kept
+// as object URLs and reused when a card mounts again.
+
+// Photos per batch request (the server's limit).
+const BATCH_LIMIT = 200;
+// Object URLs kept for reuse; the least recently used are revoked beyond this.
+const MAX_KEPT = 1000;
+
+type Resolve = (url: string | null) => void;
+
+interface Waiting {
+  version: string;
+  resolvers: Resolve[];
+}
+
+// `${version}|${id}|${size}` -> object URL, least recently used first
+const received = new Map<string, string>();
+
+// size -> photo id -> callers waiting on that thumbnail
+let queued = new Map<number, Map<number, Waiting>>();
+let scheduled = false;
+
+function keep(key: string, url: string) {
+  received.delete(key);
+  received.set(key, url);
+  if (received.size > MAX_KEPT) {
+    const [oldest, oldUrl] = received.entries().next().value as [string, string];
+    received.delete(oldest);
+    URL.revokeObjectURL(oldUrl);
+  }
+}
+
+async function fetchBatch(size: number, waiting: [number, Waiting][]) {
+  let form: FormData | null = null;
+  const items = waiting.map(([id, w]) => `${id}:${w.version}`).join(',');
+  try {
+    const res = await fetch(`/api/thumbnails/batch?size=${size}&items=${encodeURIComponent(items)}`, {
+      // Explicit types: the server doesn't take */* as WebP/AVIF support.
+      headers: { Accept: 'image/avif,image/webp,image/jpeg' },
+    });
+    if (res.ok) form = await res.formData();
+  } catch { /* fall back to single requests */ }
+  for (const [id, w] of waiting) {
+    const part = form?.get(String(id));
+    const url = part instanceof Blob ? URL.createObjectURL(part) : null;
+    if (url) keep(`${w.version}|${id}|${size}`, url);
+    for (const resolve of w.resolvers) resolve(url);
+  }
+}
+
+function flush() {
+  scheduled = false;
+  const batches = queued;
+  queued = new Map();
+  for (const [size, waiting] of batches) {
+    // Sorted, so the same set of photos always makes the same (cached) URLs.
+    const entries = [...waiting].sort(([a], [b]) => a - b);
+    for (let i = 0; i < entries.length; i += BATCH_LIMIT) {
+      fetchBatch(size, entries.slice(i, i + BATCH_LIMIT));
+    }
+  }
+}
+
+/**
+ * Object URL of a photo's cached thumbnail rendition serving `size` device
+ * pixels, or null if the server has none cached (fetch it by URL instead).
+ * The URL stays owned by this module; callers must not revoke it.
+ */
+export function batchedThumbnail(
+  photo: { id: number; thumbnail_url: string },
+  size: number,
+): Promise<string | null> {
+  const version = new URL(photo.thumbnail_url, window.location.origin).searchParams.get('v') ?? '';
+  const key = `${version}|${photo.id}|${size}`;
+  const kept = received.get(key);
+  if (kept) {
+    keep(key, kept);
+    return Promise.resolve(kept);
+  }
+  return new Promise((resolve) => {
+    let waiting = queued.get(size);
+    if (!waiting) {
+      waiting = new Map();
+      queued.set(size, waiting);
+    }
+    const entry = waiting.get(photo.id) ?? { version, resolvers: [] };
+    entry.resolvers.push(resolve);
+    waiting.set(photo.id, entry);
+    if (!scheduled) {
+      scheduled = true;
+      setTimeout(flush, 0);
+    }
+  });
+}
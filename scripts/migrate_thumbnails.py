@@ -0,0 +1,46 @@
+"""
+Local Photo Browser - Thumbnail cache migration
+
+Moves the old one-file-per-thumbnail cache (backend/data/thumbnails/{id}.jpg
+and {id}_{size}.jpg) into the packed thumbnail store, deleting each loose
+file once it is packed. Safe to re-run; stop the app first.
+
+Loose files record neither their source file nor their settings, so the
+app treats packed copies as stale and re-renders each one the first time it
+is requested; migrating only moves the files out of the way.
+
+Usage:
+  py scripts/migrate_thumbnails.py            # import loose files
+  py scripts/migrate_thumbnails.py --compact  # also compact the store afterwards
+"""
+import os
+import sys
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BACKEND_DIR = os.path.join(ROOT_DIR, "backend")
+sys.path.insert(0, BACKEND_DIR)
+
+from config import THUMBNAIL_DIR  # noqa: E402
+from services.thumbstore import store  # noqa: E402
+
+
+def main():
+    print(f"[migrate] Importing thumbnails from {THUMBNAIL_DIR}", flush=True)
+    imported = 0
+    for imported in store.import_loose_files(THUMBNAIL_DIR):
+        print(f"\r[migrate] {imported} file(s) packed", end="", flush=True)
+    print(f"\r[migrate] {imported} file(s) packed", flush=True)
+
+    if "--compact" in sys.argv[1:]:
+        result = store.compact()
+        print(f"[migrate] Compacted {result['segments']} segment(s), "
+              f"reclaimed {result['reclaimed_bytes']} bytes", flush=True)
+
+    stats = store.stats()
+    print(f"[migrate] Store: {stats['entries']} thumbnail(s) in {stats['segments']} segment(s), "
+          f"{stats['bytes']} bytes", flush=True)
+    store.close()
+
+
+if __name__ == "__main__":
+    main()